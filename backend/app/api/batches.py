@@ -0,0 +1,242 @@
+import asyncio
+import uuid
+from collections import Counter
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core import metrics, tracing
+from app.core.database import get_async_db
+from app.api.dependencies import get_current_user_id
+from app.api.jobs import LayoutConfig, ensure_user, resolve_render_profile
+from app.models.batch import Batch
+from app.models.job import Job
+from app.services.batches import batch_runner, UNPLANNED, PLANNED
+from app.services.renderer import RENDER_PROFILES
+
+router = APIRouter()
+
+# Children still being worked on
+ACTIVE_STATUSES = {"queued", "processing", "pipelining", "rendering"}
+
+def _batch_status(statuses: Counter) -> str:
+    if any(statuses[s] for s in ACTIVE_STATUSES):
+        return "processing"
+    if statuses["failed"] == sum(statuses.values()):
+        return "failed"
+    if statuses["cancelled"] == sum(statuses.values()):
+        return "cancelled"
+    if statuses["failed"] or statuses["partial"] or statuses["cancelled"]:
+        return "partial"
+    return "completed"
+
+async def _read_uploads(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    # Sizes from the multipart parser first, then counted while reading in
+    # chunks, so an oversized request is refused before it is all in memory
+    def check(filename: Optional[str], size: int, total: int):
+        if size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"{filename}: files are limited to {settings.UPLOAD_MAX_BYTES} bytes")
+        if total > settings.BATCH_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Batches are limited to {settings.BATCH_MAX_BYTES} bytes")
+
+    total = 0
+    for upload in files:
+        total += upload.size or 0
+        check(upload.filename, upload.size or 0, total)
+
+    uploads = []
+    total = 0
+    for upload in files:
+        chunks = []
+        size = 0
+        while chunk := await upload.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            total += len(chunk)
+            check(upload.filename, size, total)
+            chunks.append(chunk)
+        uploads.append((upload.filename or "", b"".join(chunks)))
+    return uploads
+
+async def _get_batch(db: AsyncSession, batch_id: str, user_id: str) -> Batch:
+    batch = await db.get(Batch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return batch
+
+@router.post("")
+async def create_batch(
+    files: List[UploadFile] = File(...),
+    auto_render: bool = Form(False),
+    render_profile: Optional[str] = Form(None),
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Many documents at once: several files and/or zip archives, one child
+    job per document. Returns as soon as the children exist; extraction
+    (or, with auto_render, the pipelined extract/plan/render) runs on the
+    batch worker pool. Unsupported files are listed in `rejected`.
+    413 if a file is over UPLOAD_MAX_BYTES or the whole request over
+    BATCH_MAX_BYTES; 400 if an archive expands past UPLOAD_MAX_BYTES or
+    the archives together past BATCH_MAX_BYTES.
+    """
+    profile = resolve_render_profile(auto_render, render_profile)
+
+    with tracing.span("create_batch", user_id=user_id, auto_render=auto_render) as s:
+        uploads = await _read_uploads(files)
+        try:
+            documents = await run_in_threadpool(batch_runner.unpack, uploads)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        s.set_attribute("documents", len(documents))
+
+        # Segregate and store every document in the threadpool; the batch
+        # pool is kept for the children's extraction and pipelined runs
+        with metrics.timed("segregation"):
+            outcomes = await asyncio.gather(
+                *(run_in_threadpool(batch_runner.prepare, name, data) for name, data in documents),
+                return_exceptions=True
+            )
+
+        rejected = []
+        accepted = []
+        for (filename, _), outcome in zip(documents, outcomes):
+            if isinstance(outcome, ValueError):
+                rejected.append({"filename": filename, "error": str(outcome)})
+            elif isinstance(outcome, Exception):
+                raise outcome
+            else:
+                accepted.append((filename, outcome))
+        if not accepted:
+            raise HTTPException(status_code=400, detail={"message": "No supported files in batch", "rejected": rejected})
+
+        await ensure_user(db, user_id)
+        batch = Batch(id=str(uuid.uuid4()), user_id=user_id, render_profile=profile, total_jobs=len(accepted))
+        db.add(batch)
+        await db.flush()  # Batch row must exist before its jobs (FK)
+        jobs = [
+            Job(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                batch_id=batch.id,
+                filename=filename,
+                status="queued",
+                total_pages=0,
+                original_file_path=path,
+                file_hash=file_hash,
+                input_type=segregation.input_type,
+                pipeline=segregation.pipeline,
+                requires_review=segregation.requires_review
+            )
+            for filename, (segregation, file_hash, path) in accepted
+        ]
+        db.add_all(jobs)
+        await db.commit()
+        s.set_attribute("batch_id", batch.id)
+
+    batch_runner.start([job.id for job in jobs], LayoutConfig().model_dump(), profile)
+    return {
+        "batch_id": batch.id,
+        "status": "processing",
+        "jobs": [
+            {"job_id": job.id, "filename": job.filename, "input_type": job.input_type}
+            for job in jobs
+        ],
+        "rejected": rejected
+    }
+
+@router.get("/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Aggregate progress: children by status, handwritten page counts
+    summed over the batch, and each child's own progress.
+    """
+    batch = await _get_batch(db, batch_id, user_id)
+    jobs = (await db.execute(
+        select(Job).where(Job.batch_id == batch_id).order_by(Job.filename, Job.id)
+    )).scalars().all()
+
+    statuses = Counter(job.status for job in jobs)
+    pages = {
+        "source": sum(job.total_pages or 0 for job in jobs),
+        "pending": sum(job.pages_pending or 0 for job in jobs),
+        "rendering": sum(job.pages_rendering or 0 for job in jobs),
+        "rendered": sum(job.pages_rendered or 0 for job in jobs),
+        "failed": sum(job.pages_failed or 0 for job in jobs),
+    }
+    finished = sum(count for status, count in statuses.items() if status not in ACTIVE_STATUSES)
+    return {
+        "batch_id": batch.id,
+        "status": _batch_status(statuses),
+        "render_profile": batch.render_profile,
+        "created_at": str(batch.created_at),
+        "jobs_total": len(jobs),
+        "jobs_finished": finished,
+        "jobs_by_status": dict(statuses),
+        "pages": pages,
+        "jobs": [
+            {
+                "job_id": job.id,
+                "filename": job.filename,
+                "status": job.status,
+                "input_type": job.input_type,
+                "total_pages": job.total_pages,
+                "pages_rendered": job.pages_rendered,
+                "pages_failed": job.pages_failed,
+            }
+            for job in jobs
+        ]
+    }
+
+@router.post("/{batch_id}/render")
+async def render_batch(
+    batch_id: str,
+    profile: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Render every child that is ready: extracted children are planned with
+    the default layout and rendered, planned ones submit their unrendered
+    pages. All of it shares the batch render budget (BATCH_RENDER_SLOTS).
+    """
+    profile = profile or settings.DEFAULT_RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown render profile: {profile}")
+
+    batch = await _get_batch(db, batch_id, user_id)
+
+    # Claim the ready children (queued until a pool thread picks them up),
+    # so a repeated request cannot start them twice
+    async def claim(statuses: List[str]) -> List[str]:
+        return (await db.execute(
+            update(Job)
+            .where(Job.batch_id == batch_id, Job.status.in_(statuses))
+            .values(status="queued")
+            .returning(Job.id)
+            .execution_options(synchronize_session=False)
+        )).scalars().all()
+
+    unplanned_ids = await claim(UNPLANNED)
+    planned_ids = await claim(PLANNED)
+    if not unplanned_ids and not planned_ids:
+        raise HTTPException(status_code=400, detail="No jobs in this batch are ready to render")
+    batch.render_profile = profile
+    await db.commit()
+
+    batch_runner.render(unplanned_ids, planned_ids, LayoutConfig().model_dump(), profile)
+    return {
+        "batch_id": batch_id,
+        "status": "rendering",
+        "profile": profile,
+        "jobs": sorted(unplanned_ids + planned_ids)
+    }
@@ -0,0 +1,79 @@
+import re
+from urllib.parse import parse_qs
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api.dependencies import user_id_for_token, is_admin, require_admin
+from app.core import profiling
+
+router = APIRouter()
+
+PROFILE_HEADER = b"x-debug-profile"
+PROFILE_QUERY = "debug_profile"
+PROFILE_ID_HEADER = b"x-debug-profile-id"
+
+def _profile_requested(scope) -> bool:
+    # Only an explicit 1: "X-Debug-Profile: 0" or ?xdebug_profile=1 do not count
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    if query.get(PROFILE_QUERY, [""])[-1] == "1":
+        return True
+    return any(name == PROFILE_HEADER and value.strip() == b"1" for name, value in scope.get("headers", []))
+
+class ProfilingMiddleware:
+    """
+    X-Debug-Profile: 1 (or ?debug_profile=1) from an admin wraps the request
+    and the background work it starts in the sampling profiler. The profile
+    id (the job id once known) comes back in X-Debug-Profile-Id; fetch it
+    from /debug/profiles/{id}. Requests without the flag pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _profile_requested(scope):
+            return await self.app(scope, receive, send)
+
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode()
+        scheme, _, token = authorization.partition(" ")
+        try:
+            if scheme.lower() != "bearer" or not token:
+                raise HTTPException(status_code=401, detail="Not authenticated")
+            user_id = await user_id_for_token(token)
+            if not is_admin(user_id):
+                raise HTTPException(status_code=403, detail="Profiling is admin only")
+        except HTTPException as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code)
+            return await response(scope, receive, send)
+
+        profile = profiling.start(scope["method"], scope["path"], user_id)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                if profile.job_id is None:
+                    profile.job_id = scope.get("path_params", {}).get("job_id")
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, profile.key.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with profiling.activate(profile):
+            await self.app(scope, receive, send_with_profile_id)
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "json",
+    admin_id: str = Depends(require_admin)
+):
+    """
+    Profile by job id (or request id). format=collapsed returns folded
+    stacks for flamegraph.pl / speedscope. Running profiles are partial.
+    """
+    if not re.fullmatch(r"[A-Za-z0-9-]+", profile_id):
+        raise HTTPException(status_code=400, detail="Invalid profile id")
+    profile = profiling.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse("\n".join(profile["collapsed"]) + "\n")
+    return profile
@@ -1,101 +1,175 @@
-import requests
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 from app.core.config import settings
 from app.core.database import get_db
 from app.models.user import User
+from app.core import metrics
 
 security = HTTPBearer()
 
-# Cache JWKS
-JWKS_CACHE = None
-
-def get_jwks():
-    global JWKS_CACHE
-    if JWKS_CACHE is None:
-        jwks_url = f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-        try:
-            response = requests.get(jwks_url)
-            response.raise_for_status()
-            JWKS_CACHE = response.json()
-            print("Fetched JWKS keys")
-        except Exception as e:
-            print(f"Failed to fetch JWKS: {e}")
-            raise HTTPException(status_code=500, detail="Could not verify token configuration")
-    return JWKS_CACHE
-
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+class JwksStore:
+    """
+    Supabase signing keys by kid.
+    Refreshed by a background thread; an unknown kid triggers one
+    synchronous refresh (single-flight, rate limited) for key rotation.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.refresher = None
+
+    def get_key(self, kid: str) -> dict:
+        key = self.keys.get(kid)
+        if key is None:
+            self.refresh(force=False)
+            key = self.keys.get(kid)
+        return key
+
+    def refresh(self, force: bool = True):
+        # Concurrent misses queue on the lock and reuse the first fetch
+        with self.lock:
+            if not force and time.time() - self.fetched_at < settings.JWKS_MIN_REFRESH_SECONDS:
+                return
+            import requests
+            jwks_url = f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+            try:
+                response = requests.get(jwks_url, timeout=5)
+                response.raise_for_status()
+                self.keys = {k["kid"]: k for k in response.json().get("keys", []) if "kid" in k}
+                print(f"Fetched JWKS keys ({len(self.keys)})")
+            except Exception as e:
+                print(f"Failed to fetch JWKS: {e}")
+                if not self.keys:
+                    raise HTTPException(status_code=500, detail="Could not verify token configuration")
+            finally:
+                self.fetched_at = time.time()
+
+    def start_background_refresh(self):
+        if self.refresher or not settings.SUPABASE_URL:
+            return
+        self.refresher = threading.Thread(target=self._refresh_forever, name="jwks-refresh", daemon=True)
+        self.refresher.start()
+
+    def _refresh_forever(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                pass  # Already logged; keep serving the last good keys
+            time.sleep(settings.JWKS_REFRESH_SECONDS)
+
+class VerifiedTokenCache:
+    """
+    sha256(token) -> (user_id, expires_at). Bounded LRU; an entry lives
+    TOKEN_CACHE_TTL_SECONDS but never past the token's own exp.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user_id
+
+    def put(self, token: str, user_id: str, exp):
+        expires_at = time.time() + settings.TOKEN_CACHE_TTL_SECONDS
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        with self.lock:
+            self.entries[self._key(token)] = (user_id, expires_at)
+            self.entries.move_to_end(self._key(token))
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+jwks_store = JwksStore()
+token_cache = VerifiedTokenCache()
+
+def _verify_token(token: str) -> dict:
     """
     Verifies the Supabase JWT.
     Supports HS256 (Secret) and RS256/ES256 (JWKS).
     """
-    token = credentials.credentials
-    try:
-        header = jwt.get_unverified_header(token)
-        alg = header.get('alg')
-        
-        # 1. Verification Key Selection
-        if alg == 'HS256':
-            key = settings.SUPABASE_JWT_SECRET
-        elif alg in ['RS256', 'ES256']:
-            jwks = get_jwks()
-            key = jwks # python-jose handles JWKS dict directly usually, or we pass keys
-            # jose.jwt.decode can accept the JWKS dict in simple cases, 
-            # or we might need to find the specific key. 
-            # python-jose 'decode' usually needs the specific key or full JWKS if it supports it.
-            # Let's try passing the full JWKS dict, python-jose supports it for 'hmac' not always others.
-            # Actually standard python-jose usage for JWKS is:
-            # key = next(k for k in jwks['keys'] if k['kid'] == header['kid'])
-            # But let's try the library's ability to pick from list/dict first or write simple picker.
-            pass # See logic below
-        else:
-            raise HTTPException(status_code=401, detail=f"Unsupported algorithm: {alg}")
-
-        # 2. Decode
-        if alg == 'HS256':
-             payload = jwt.decode(
-                token, 
-                key, 
-                algorithms=[alg],
-                audience="authenticated"
-            )
-        else:
-            # For RS256/ES256 with JWKS
-            # Simple manual key lookup
-            jwks = get_jwks()
-            # python-jose doesn't auto-lookup from a dict in `decode` typically unless configured.
-            # We find the matching key manually.
-            rsa_key = {}
-            for k in jwks['keys']:
-                if k['kid'] == header['kid']:
-                    rsa_key = k
-                    break
-            if not rsa_key:
-                raise HTTPException(status_code=401, detail="Invalid token kid")
-                
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=[alg],
-                audience="authenticated"
-            )
-
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
+    header = jwt.get_unverified_header(token)
+    alg = header.get('alg')
+
+    # 1. Verification Key Selection
+    if alg == 'HS256':
+        key = settings.SUPABASE_JWT_SECRET
+    elif alg in ['RS256', 'ES256']:
+        key = jwks_store.get_key(header.get('kid'))
+        if not key:
+            raise HTTPException(status_code=401, detail="Invalid token kid")
+    else:
+        raise HTTPException(status_code=401, detail=f"Unsupported algorithm: {alg}")
+
+    # 2. Decode
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[alg],
+        audience="authenticated"
+    )
+
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    return await user_id_for_token(credentials.credentials)
+
+async def user_id_for_token(token: str) -> str:
+    """
+    Cached path is a hash + dict lookup on the event loop.
+    Full verification (and any JWKS fetch) runs in the threadpool.
+    """
+    user_id = token_cache.get(token)
+    metrics.cache_lookup("token", user_id is not None)
+    if user_id is not None:
         return user_id
-        
+
+    try:
+        payload = await run_in_threadpool(_verify_token, token)
     except JWTError as e:
         print(f"JWT Verification Error: {str(e)}")
-        # print(f"Token Header: {jwt.get_unverified_header(token)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Validation Failed. Error: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    token_cache.put(token, user_id, payload.get("exp"))
+    return user_id
+
+def is_admin(user_id: str) -> bool:
+    return user_id in {u.strip() for u in settings.PROFILE_ADMIN_USER_IDS.split(",") if u.strip()}
+
+async def require_admin(user_id: str = Depends(get_current_user_id)) -> str:
+    if not is_admin(user_id):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user_id
+
 def get_current_user(
     user_id: str = Depends(get_current_user_id), 
     db: Session = Depends(get_db)
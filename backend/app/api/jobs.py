@@ -1,18 +1,37 @@
 import os
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+import json
+import asyncio
+import hashlib
+import base64
+from datetime import datetime
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db, SessionLocal, AsyncSessionLocal
 from app.api.dependencies import get_current_user_id
 from app.models.job import Job
 from app.models.page import Page
 from app.models.user import User
 from app.services.segregator import segregate_input
+from app.services.extractor import Extractor
 from app.services.planner import PlannerService
-from app.services.renderer import HandwritingRenderer
+from app.core.config import settings
+from app.core import metrics, profiling, tracing
+from app.core.cancellation import JobCancelled
+from app.services.renderer import HandwritingRenderer, RENDER_PROFILES
+from app.services.exporter import PdfExporter
+from app.services.uploads import UploadStore
+from app.services.pipeline import JobPipeline
+from app.services.events import bus
+from app.services.layout import capacity, PAGE_SIZES_MM
 
 router = APIRouter()
 
@@ -30,47 +49,178 @@ class JobStatusResponse(BaseModel):
     created_at: str
     pages: List[PageStatusResponse]
 
+class JobSummaryResponse(BaseModel):
+    job_id: str
+    status: str
+    input_type: str
+    total_pages: int
+    created_at: str
+
+class JobListResponse(BaseModel):
+    jobs: List[JobSummaryResponse]
+    next_cursor: Optional[str] = None
+
+def _encode_cursor(created_at: datetime, job_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), job_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), job_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("", response_model=JobListResponse)
+async def list_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    The user's jobs, newest first. Keyset pagination on
+    (created_at, id) via ix_jobs_user_created: every page costs the same.
+    """
+    query = select(
+        Job.id, Job.status, Job.input_type, Job.total_pages, Job.created_at
+    ).where(Job.user_id == user_id)
+    
+    if cursor:
+        created_at, last_id = _decode_cursor(cursor)
+        query = query.where(tuple_(Job.created_at, Job.id) < tuple_(created_at, last_id))
+    
+    rows = (await db.execute(
+        query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1)
+    )).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
+    
+    return JobListResponse(
+        jobs=[
+            JobSummaryResponse(
+                job_id=r.id,
+                status=r.status,
+                input_type=r.input_type,
+                total_pages=r.total_pages,
+                created_at=str(r.created_at)
+            ) for r in rows
+        ],
+        next_cursor=next_cursor
+    )
+
+def _extract_in_worker(job_id: str, file_bytes: Optional[bytes]):
+    """
+    Extraction is CPU/provider bound and uses the sync session.
+    Runs in the threadpool; returns (status, total_pages).
+    file_bytes=None extracts from the stored file.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        size = len(file_bytes) if file_bytes is not None else os.path.getsize(job.original_file_path)
+        try:
+            with tracing.span("extract", job_id=job_id, input_type=job.input_type, bytes=size) as s:
+                job.total_pages = Extractor.extract_job(job, db, file_bytes)
+                s.set_attribute("pages", job.total_pages)
+        except Exception as e:
+            print(f"Extraction Failed: {e}")
+            job.status = "failed"
+        db.commit()
+        return job.status, job.total_pages
+    finally:
+        db.close()
+
 @router.post("/create")
 async def create_job(
     content: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
     page_count_estimate: int = Form(1),
+    auto_render: bool = Form(False),
+    render_profile: Optional[str] = Form(None),
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # 1. Segregate
-    try:
-        segregation = await segregate_input(content=content, file=file)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    """
+    auto_render=true runs extract, plan (default layout) and render as one
+    pipelined job in the background; progress arrives on /events.
+    """
+    profile = resolve_render_profile(auto_render, render_profile)
 
-    # 2. Sync User
-    user = db.query(User).filter(User.id == user_id).first()
+    with tracing.span("create_job", user_id=user_id, auto_render=auto_render):
+        # 1. Segregate
+        try:
+            with metrics.timed("segregation") as labels:
+                segregation = await segregate_input(content=content, file=file)
+                labels["input_type"] = segregation.input_type
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        file_hash = None
+        original_path = None
+        file_bytes = None
+        if file:
+            file_bytes = await file.read()
+            await file.seek(0)
+            tracing.set_attributes(bytes=len(file_bytes))
+            file_hash, original_path = await run_in_threadpool(UploadStore.save, file_bytes, file.filename)
+
+        return await start_job(db, user_id, segregation, file_bytes, file_hash, original_path, profile)
+
+def resolve_render_profile(auto_render: bool, render_profile: Optional[str]) -> Optional[str]:
+    """
+    Render profile for a pipelined job, or None for extract-only.
+    """
+    if not auto_render:
+        return None
+    profile = render_profile or settings.DEFAULT_RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown render profile: {profile}")
+    return profile
+
+async def ensure_user(db: AsyncSession, user_id: str):
+    """
+    Local users row for a Supabase user, created on first use.
+    """
+    user = await db.get(User, user_id)
     if not user:
         user = User(id=user_id, email=f"{user_id}@placeholder.com")
         db.add(user)
-        db.commit()
+        try:
+            await db.commit()
+        except IntegrityError:
+            # A concurrent first request for the same user created it
+            await db.rollback()
 
-    # 3. Create Job (and save file)
+async def start_job(
+    db: AsyncSession,
+    user_id: str,
+    segregation,
+    file_bytes: Optional[bytes],
+    file_hash: Optional[str],
+    original_path: Optional[str],
+    auto_render_profile: Optional[str] = None
+) -> dict:
+    """
+    Create the job for a stored upload and extract it, or with
+    auto_render_profile start the pipelined extract/plan/render run.
+    Shared by the multipart create endpoint and resumable upload finalize.
+    """
+    # 2. Sync User
+    await ensure_user(db, user_id)
+
+    # 3. Create Job (file already saved, content-addressed)
     job_id = str(uuid.uuid4())
-    original_path = None
-    file_bytes = None
+    tracing.set_attributes(job_id=job_id, input_type=segregation.input_type)
+    profiling.tag_job(job_id)
     
-    if file:
-        file_bytes = await file.read()
-        await file.seek(0)
-        
-        # Save to backend/uploads
-        upload_dir = os.path.join(os.getcwd(), "uploads")
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        clean_name = os.path.basename(file.filename)
-        save_path = os.path.join(upload_dir, f"{job_id}_{clean_name}")
-        
-        with open(save_path, "wb") as f:
-            f.write(file_bytes)
-        
-        original_path = save_path
+    # Same bytes already extracted: reuse its input pages instead of re-running OCR
+    source_job = await UploadStore.find_extracted_job(db, file_hash) if file_hash else None
+    if file_hash:
+        metrics.cache_lookup("extraction", source_job is not None)
         
     job = Job(
         id=job_id,
@@ -78,26 +228,31 @@ async def create_job(
         status="processing",
         total_pages=0,
         original_file_path=original_path,
+        file_hash=file_hash,
         input_type=segregation.input_type,
         pipeline=segregation.pipeline,
         requires_review=segregation.requires_review
     )
     db.add(job)
-    db.flush()
-
-    # 4. Extract (OCR)
-    if file:
-        await file.seek(0) # Reset before extraction
-        
-    from app.services.extractor import Extractor
-    try:
-        pages_count = Extractor.extract_job(job, db, file_bytes)
-        job.total_pages = pages_count
-    except Exception as e:
-        print(f"Extraction Failed: {e}")
-        job.status = "failed"
     
-    db.commit()
+    if source_job:
+        await db.flush()  # Job row must exist before its pages (FK)
+        job.total_pages = await UploadStore.clone_input_pages(db, source_job.id, job)
+        job.status = "extracted"
+        await db.commit()
+        print(f"Job {job_id}: Reused extraction of {source_job.id} ({job.total_pages} pages)")
+        bus.publish(job_id, "stage", {"status": "extracted", "total_pages": job.total_pages})
+    elif auto_render_profile:
+        await db.commit()
+    else:
+        await db.commit()
+        # 4. Extract (OCR) off the event loop
+        job.status, job.total_pages = await run_in_threadpool(_extract_in_worker, job_id, file_bytes)
+    
+    if auto_render_profile:
+        # Reused input pages only need planning and rendering
+        JobPipeline(job_id, LayoutConfig().model_dump(), auto_render_profile, extract=not source_job).start()
+        job.status = "pipelining"
     
     return {
         "job_id": job.id, 
@@ -110,22 +265,126 @@ async def create_job(
         "pages_created": job.total_pages
     }
 
+def _status_etag(job, page_versions) -> str:
+    """
+    Version of a job's status view: job fields plus, per page status,
+    the page count and latest page update.
+    """
+    h = hashlib.sha1(f"{job.status}:{job.total_pages}".encode())
+    for status, count, latest in sorted(page_versions, key=lambda v: str(v[0])):
+        h.update(f"|{status}:{count}:{latest}".encode())
+    return f'W/"{h.hexdigest()[:20]}"'
+
 @router.get("/{job_id}/status", response_model=JobStatusResponse)
-def get_job_status(
+async def get_job_status(
     job_id: str,
+    request: Request,
+    response: Response,
     user_id: str = Depends(get_current_user_id),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    job = db.query(Job).filter(Job.id == job_id, Job.user_id == user_id).first()
+    """
+    Column-projected status (no ORM objects, no page content).
+    Conditional GET: If-None-Match with the last ETag -> 304.
+    """
+    job = (await db.execute(
+        select(
+            Job.id, Job.status, Job.input_type, Job.pipeline,
+            Job.requires_review, Job.total_pages, Job.created_at
+        ).where(Job.id == job_id, Job.user_id == user_id)
+    )).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
+    page_versions = (await db.execute(
+        select(Page.status, func.count(Page.id), func.max(Page.updated_at))
+        .where(Page.job_id == job_id)
+        .group_by(Page.status)
+    )).all()
+    
+    etag = _status_etag(job, page_versions)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    not_modified = request.headers.get("if-none-match") == etag
+    metrics.cache_lookup("status_etag", not_modified)
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    
+    pages = (await db.execute(
+        select(Page.page_number, Page.status)
+        .where(Page.job_id == job_id)
+        .order_by(Page.page_number)
+    )).all()
+    
+    response.headers.update(headers)
     return JobStatusResponse(
         job_id=job.id,
         status=job.status,
+        input_type=job.input_type,
+        pipeline=job.pipeline,
+        requires_review=bool(job.requires_review),
         total_pages=job.total_pages,
         created_at=str(job.created_at),
-        pages=[PageStatusResponse(page_number=p.page_number, status=p.status) for p in job.pages]
+        pages=[PageStatusResponse(page_number=n, status=s) for n, s in pages]
+    )
+
+SSE_KEEPALIVE_SECONDS = 15
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Server-Sent Events: a snapshot, then stage and page transitions as
+    the extractor, planner and renderer commit them. No database
+    connection is held while the stream is open.
+    """
+    # Subscribe before the snapshot so nothing falls in between
+    queue = bus.subscribe(job_id)
+    try:
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(
+                select(Job.status, Job.total_pages).where(Job.id == job_id, Job.user_id == user_id)
+            )).first()
+            if not job:
+                raise HTTPException(status_code=404, detail="Job not found")
+            pages = (await db.execute(
+                select(Page.page_number, Page.page_type, Page.status)
+                .where(Page.job_id == job_id)
+                .order_by(Page.page_type, Page.page_number)
+            )).all()
+    except BaseException:
+        bus.unsubscribe(job_id, queue)
+        raise
+    snapshot = {
+        "status": job.status,
+        "total_pages": job.total_pages,
+        "pages": [
+            {"page_number": p.page_number, "page_type": p.page_type, "status": p.status}
+            for p in pages
+        ]
+    }
+    
+    async def stream():
+        try:
+            yield _sse("snapshot", snapshot)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(message["event"], message["data"])
+        finally:
+            bus.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 class LayoutConfig(BaseModel):
@@ -137,18 +396,30 @@ class LayoutConfig(BaseModel):
     footer_space: int = 30
     line_spacing: str = "normal"
 
+    @field_validator("page_size")
+    @classmethod
+    def known_page_size(cls, value):
+        # capacity() would quietly plan an unknown size as A4
+        if value not in PAGE_SIZES_MM:
+            raise ValueError(f"Unknown page size: {value} (one of {', '.join(PAGE_SIZES_MM)})")
+        return value
+
+    @classmethod
+    def stored(cls, config: Optional[dict]) -> "LayoutConfig":
+        """
+        A job's saved config, unvalidated: configs saved before page_size
+        was checked keep the A4 fallback they were planned with.
+        """
+        return cls.model_construct(**(config or {}))
+
 def requires_replan(old_config: dict, new_config: LayoutConfig) -> bool:
+    """
+    The planner only needs to run again when the page capacity (lines per
+    page, characters per line) changes, not on every layout field change.
+    """
     if not old_config:
         return True
-    
-    # Critical fields that change handwriting capacity
-    critical_fields = ["page_size", "margin_left", "margin_top", "margin_bottom", "header_space", "footer_space", "line_spacing"]
-    
-    for field in critical_fields:
-        if old_config.get(field) != getattr(new_config, field):
-            return True
-            
-    return False
+    return capacity(LayoutConfig.stored(old_config).model_dump()) != capacity(new_config.model_dump())
 
 @router.post("/{job_id}/plan")
 def plan_job(
@@ -182,26 +453,45 @@ def replan_job_endpoint(
     # Check if we need to re-run ChatGPT
     if requires_replan(job.layout_config, config):
         try:
-            pages_count = PlannerService.replan_job(job_id, db, config.model_dump())
+            with tracing.span("replan", job_id=job_id, input_type=job.input_type) as s:
+                pages_count = PlannerService.replan_job(job_id, db, config.model_dump())
+                s.set_attribute("pages", pages_count)
+            metrics.layout_change("replanned")
             return {"status": "replanned", "total_pages": pages_count}
+        except JobCancelled as e:
+            raise HTTPException(status_code=409, detail=str(e))
         except Exception as e:
             print(f"Replan Error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
     else:
-        # Just update config, no API call
+        # Same capacity: the current pages still fit, just update config
+        replan_avoided = LayoutConfig.stored(job.layout_config) != config
+        metrics.layout_change("replan_avoided" if replan_avoided else "unchanged")
         job.layout_config = config.model_dump()
         db.commit()
-        return {"status": "updated_config_only"}
+        return {"status": "updated_config_only", "replan_avoided": replan_avoided}
 
 @router.post("/{job_id}/render")
 def render_job_endpoint(
     job_id: str,
+    mode: str = "diffusion",
+    profile: Optional[str] = None,
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id)
 ):
     """
     Phase 6: Render handwritten pages.
+    mode=diffusion: Replicate predictions, complete asynchronously.
+    mode=preview: instant local layout check, see /pages/{n}/preview.
+    profile=draft|final picks steps and resolution for diffusion mode.
     """
+    if mode not in ["diffusion", "preview"]:
+        raise HTTPException(status_code=400, detail=f"Unknown render mode: {mode}")
+    
+    profile = profile or settings.DEFAULT_RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown render profile: {profile}")
+        
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
@@ -209,61 +499,331 @@ def render_job_endpoint(
     if job.user_id != user_id:
         raise HTTPException(status_code=403, detail="Not authorized")
         
+    if mode == "preview":
+        layout = LayoutConfig.stored(job.layout_config).model_dump()
+        previews = HandwritingRenderer.render_previews(job_id, db, layout)
+        return {"status": "previewed", "pages": previews}
+        
     try:
-        rendered_count = HandwritingRenderer.render_job(job_id, db)
-        return {"status": "rendered", "pages_rendered": rendered_count}
+        with tracing.span("render_job", job_id=job_id, profile=profile, input_type=job.input_type) as s:
+            submitted_count = HandwritingRenderer.render_job(job_id, db, profile=profile)
+            s.set_attribute("pages_submitted", submitted_count)
+        return {"status": "rendering", "profile": profile, "pages_submitted": submitted_count}
+    except JobCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         print(f"Render Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/{job_id}/pages/{page_number}/approve")
-def approve_page(
+@router.post("/{job_id}/upgrade")
+def upgrade_job_endpoint(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Re-render all rendered draft pages at the final profile, keeping their
+    seeds. Approved pages keep the draft they were approved with.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    if job.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+        
+    try:
+        submitted_count = HandwritingRenderer.upgrade_job(job_id, db)
+        return {"status": "rendering", "profile": "final", "pages_submitted": submitted_count}
+    except JobCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        print(f"Upgrade Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Work that runs under the job's cancellation token: queued batch
+# children, pipelined runs and renders. Plain extraction does not check
+# it, so a processing job cannot be cancelled.
+CANCELLABLE_STATUSES = ["queued", "pipelining", "rendering"]
+
+@router.post("/{job_id}/cancel")
+def cancel_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Stop a running render or pipelined run, or a batch child still queued.
+    Pages still queued are never submitted, in-flight pages go back to
+    planned and their Replicate predictions are cancelled in the
+    background; rendered pages are kept. Rendering again resumes the job.
+    409 unless the job is running (CANCELLABLE_STATUSES).
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    if job.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+        
+    if job.status not in CANCELLABLE_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}, not running")
+        
+    with tracing.span("cancel_job", job_id=job_id, previous_status=job.status) as s:
+        result = HandwritingRenderer.cancel_job(job_id, db)
+        s.set_attribute("predictions_cancelling", result["predictions_cancelling"])
+    return {"status": "cancelled", **result}
+
+@router.get("/{job_id}/pages/{page_number}/preview")
+def preview_page(
     job_id: str,
     page_number: int,
     db: Session = Depends(get_db),
     user_id: str = Depends(get_current_user_id)
 ):
     """
-    User approves a rendered page.
+    Local preview image of a handwritten page (PNG).
     """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    if job.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+        
     page = db.query(Page).filter(
         Page.job_id == job_id,
+        Page.page_type == "handwritten",
         Page.page_number == page_number
     ).first()
     
     if not page:
         raise HTTPException(status_code=404, detail="Page not found")
+        
+    layout = LayoutConfig.stored(job.layout_config).model_dump()
+    result = HandwritingRenderer.render_preview_page(page, layout)
+    return Response(content=result.png, media_type="image/png")
+
+async def _get_handwritten_page(db: AsyncSession, job_id: str, page_number: int, user_id: str) -> Page:
+    page = (await db.execute(
+        select(Page).where(
+            Page.job_id == job_id,
+            Page.page_type == "handwritten",
+            Page.page_number == page_number,
+            Page.user_id == user_id
+        )
+    )).scalars().first()
+    
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return page
+
+def _retry_in_worker(page_id: str):
+    # Provider calls block: run with the sync session in the threadpool
+    db = SessionLocal()
+    try:
+        page = db.query(Page).filter(Page.id == page_id).first()
+        HandwritingRenderer.user_retry_page(page, db)
+    finally:
+        db.close()
+
+@router.post("/{job_id}/pages/{page_number}/approve")
+async def approve_page(
+    job_id: str,
+    page_number: int,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    User approves a rendered page.
+    """
+    page = await _get_handwritten_page(db, job_id, page_number, user_id)
     
     if page.status != "rendered":
         raise HTTPException(status_code=400, detail="Page not in rendered state")
         
     page.status = "approved"
-    db.commit()
+    await db.commit()
+    bus.publish(job_id, "page", {"page_number": page_number, "status": "approved"})
     return {"status": "approved", "page_number": page_number}
 
 @router.post("/{job_id}/pages/{page_number}/retry")
-def user_retry_page(
+async def user_retry_page(
     job_id: str,
     page_number: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user_id: str = Depends(get_current_user_id)
 ):
     """
     User requests regeneration. Different seed for variation.
     """
-    page = db.query(Page).filter(
-        Page.job_id == job_id,
-        Page.page_number == page_number
-    ).first()
-    
-    if not page:
-        raise HTTPException(status_code=404, detail="Page not found")
+    page = await _get_handwritten_page(db, job_id, page_number, user_id)
     
     if page.status not in ["rendered", "failed_system"]:
         raise HTTPException(status_code=400, detail="Page cannot be retried")
         
     try:
-        HandwritingRenderer.user_retry_page(page, db)
-        return {"status": "retried", "page_number": page_number}
+        await run_in_threadpool(_retry_in_worker, page.id)
+        return {"status": "rendering", "page_number": page_number}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+MAX_BULK_PAGES = 500
+
+class PageSelection(BaseModel):
+    """
+    Pages for a bulk action: a list ([1, 2, 5]) or ranges ("1-10,14").
+    """
+    pages: Union[List[int], str]
+
+    @field_validator("pages")
+    @classmethod
+    def expand_ranges(cls, value):
+        numbers = set()
+        parts = value.split(",") if isinstance(value, str) else [str(n) for n in value]
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+            first, dash, last = part.partition("-")
+            try:
+                # "1-" and "-3" are truncated ranges, not single pages
+                first, last = int(first), int(last if dash else first)
+            except ValueError:
+                raise ValueError(f"Invalid page range: {part}")
+            if first < 1 or last < first:
+                raise ValueError(f"Invalid page range: {part}")
+            if len(numbers) + last - first + 1 > MAX_BULK_PAGES:
+                raise ValueError(f"At most {MAX_BULK_PAGES} pages per request")
+            numbers.update(range(first, last + 1))
+        if not numbers:
+            raise ValueError("No pages selected")
+        return sorted(numbers)
+
+async def _select_handwritten_pages(
+    db: AsyncSession, job_id: str, page_numbers: List[int], user_id: str, allowed: List[str], action: str
+) -> list:
+    """
+    (id, page_number) of the selected pages, checked in one query:
+    404 if any is missing, 400 if any is not in an allowed status.
+    """
+    rows = (await db.execute(
+        select(Page.id, Page.page_number, Page.status).where(
+            Page.job_id == job_id,
+            Page.page_type == "handwritten",
+            Page.page_number.in_(page_numbers),
+            Page.user_id == user_id
+        ).order_by(Page.page_number)
+    )).all()
+    
+    found = {page_number for _, page_number, _ in rows}
+    missing = [n for n in page_numbers if n not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Pages not found: {_page_list(missing)}")
+    invalid = [page_number for _, page_number, status in rows if status not in allowed]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Pages cannot be {action}: {_page_list(invalid)}")
+    return [(page_id, page_number) for page_id, page_number, _ in rows]
+
+def _page_list(page_numbers: List[int]) -> str:
+    return ", ".join(str(n) for n in page_numbers)
+
+@router.post("/{job_id}/pages/approve")
+async def approve_pages(
+    job_id: str,
+    selection: PageSelection,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Approve many rendered pages in one statement. All or nothing.
+    """
+    pages = await _select_handwritten_pages(db, job_id, selection.pages, user_id, ["rendered"], "approved")
+    
+    approved = (await db.execute(
+        update(Page)
+        .where(Page.id.in_([page_id for page_id, _ in pages]), Page.status == "rendered")
+        .values(status="approved")
+        .returning(Page.page_number)
+        .execution_options(synchronize_session=False)
+    )).scalars().all()
+    await db.commit()
+    for page_number in sorted(approved):
+        bus.publish(job_id, "page", {"page_number": page_number, "status": "approved"})
+    return {"status": "approved", "pages": sorted(approved)}
+
+@router.post("/{job_id}/pages/retry")
+async def retry_pages(
+    job_id: str,
+    selection: PageSelection,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    User retry (new seed, same profile) for many pages, submitted as one batch.
+    """
+    pages = await _select_handwritten_pages(
+        db, job_id, selection.pages, user_id, ["rendered", "failed_system"], "retried"
+    )
+    
+    try:
+        submitted_count = await run_in_threadpool(
+            HandwritingRenderer.submit_pages, job_id, [page_id for page_id, _ in pages], True
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "rendering", "pages": [n for _, n in pages], "pages_submitted": submitted_count}
+
+@router.post("/{job_id}/pages/render")
+async def render_pages(
+    job_id: str,
+    selection: PageSelection,
+    profile: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Render selected planned (or failed) pages, submitted as one batch.
+    """
+    profile = profile or settings.DEFAULT_RENDER_PROFILE
+    if profile not in RENDER_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown render profile: {profile}")
+    
+    pages = await _select_handwritten_pages(
+        db, job_id, selection.pages, user_id, ["planned", "failed_system"], "rendered"
+    )
+    
+    try:
+        submitted_count = await run_in_threadpool(
+            HandwritingRenderer.submit_pages, job_id, [page_id for page_id, _ in pages], False, profile
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "rendering", "profile": profile, "pages": [n for _, n in pages], "pages_submitted": submitted_count}
+
+@router.get("/{job_id}/export")
+async def export_job_pdf(
+    job_id: str,
+    db: Session = Depends(get_db),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Download all approved handwritten pages as one PDF sized to the
+    job's page_size.
+    """
+    job = await run_in_threadpool(db.get, Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+        
+    if job.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+        
+    try:
+        path = await PdfExporter.export_job(job, db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Export Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+        
+    return FileResponse(path, media_type="application/pdf", filename=f"swrite_{job_id}.pdf")
@@ -0,0 +1,134 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core import metrics, tracing
+from app.core.database import get_async_db
+from app.api.dependencies import get_current_user_id
+from app.api.jobs import start_job, resolve_render_profile
+from app.services.segregator import segregate_file
+from app.services.uploads import UploadStore, UploadNotFound, UploadOffsetMismatch
+
+router = APIRouter()
+
+class UploadInitRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None # Whole-file checksum, verified on finalize
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int
+    chunk_size: int
+
+def _status(session: dict) -> UploadStatusResponse:
+    return UploadStatusResponse(
+        upload_id=session["upload_id"],
+        filename=session["filename"],
+        size=session["size"],
+        offset=session["offset"],
+        chunk_size=settings.UPLOAD_CHUNK_SIZE
+    )
+
+def _raise_for(e: Exception):
+    if isinstance(e, UploadNotFound):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if isinstance(e, UploadOffsetMismatch):
+        # Client resumes from the offset we actually hold
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "offset": e.offset},
+            headers={"Upload-Offset": str(e.offset)}
+        )
+    if isinstance(e, ValueError):
+        raise HTTPException(status_code=400, detail=str(e))
+    raise e
+
+@router.post("", response_model=UploadStatusResponse)
+async def init_upload(
+    body: UploadInitRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Start a resumable upload. Send the file as PUT chunks of at most
+    chunk_size bytes, then POST /finalize to create the job.
+    """
+    try:
+        session = await run_in_threadpool(UploadStore.init_upload, user_id, body.filename, body.size, body.sha256)
+    except Exception as e:
+        _raise_for(e)
+    return _status(session)
+
+@router.get("/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload(
+    upload_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Resume point after a dropped connection: continue from `offset`.
+    """
+    try:
+        session = await run_in_threadpool(UploadStore.upload_status, upload_id, user_id)
+    except Exception as e:
+        _raise_for(e)
+    return _status(session)
+
+@router.put("/{upload_id}", response_model=UploadStatusResponse)
+async def put_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    x_chunk_sha256: str = Header(...),
+    user_id: str = Depends(get_current_user_id)
+):
+    """
+    Raw chunk body at `offset`, with its SHA-256 (hex) in X-Chunk-SHA256.
+    """
+    data = bytearray()
+    async for piece in request.stream():
+        data.extend(piece)
+        if len(data) > settings.UPLOAD_CHUNK_SIZE:
+            raise HTTPException(status_code=413, detail=f"Chunks are limited to {settings.UPLOAD_CHUNK_SIZE} bytes")
+
+    try:
+        session = await run_in_threadpool(
+            UploadStore.write_chunk, upload_id, user_id, offset, bytes(data), x_chunk_sha256
+        )
+    except Exception as e:
+        _raise_for(e)
+    return _status(session)
+
+@router.post("/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    auto_render: bool = False,
+    render_profile: Optional[str] = None,
+    user_id: str = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Complete upload -> job. Same options and response as POST /jobs/create.
+    Segregation and extraction read the assembled file from disk.
+    """
+    profile = resolve_render_profile(auto_render, render_profile)
+    with tracing.span("finalize_upload", upload_id=upload_id, user_id=user_id, auto_render=auto_render):
+        try:
+            file_hash, path, filename = await run_in_threadpool(UploadStore.finalize_upload, upload_id, user_id)
+        except Exception as e:
+            _raise_for(e)
+
+        tracing.set_attributes(bytes=os.path.getsize(path))
+        try:
+            with metrics.timed("segregation") as labels:
+                segregation = await run_in_threadpool(segregate_file, filename, path)
+                labels["input_type"] = segregation.input_type
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return await start_job(db, user_id, segregation, None, file_hash, path, profile)
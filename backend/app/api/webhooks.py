@@ -0,0 +1,76 @@
+import base64
+import hashlib
+import hmac
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.page import Page
+from app.services.renderer import HandwritingRenderer
+from app.services.page_writes import page_writes
+from app.core import tracing
+
+router = APIRouter()
+
+def verify_replicate_signature(headers, body: bytes) -> bool:
+    """
+    Replicate signs webhooks Standard-Webhooks style:
+    HMAC-SHA256 over "{webhook-id}.{webhook-timestamp}.{body}".
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not webhook_id or not timestamp or not signatures:
+        return False
+
+    secret = settings.REPLICATE_WEBHOOK_SECRET
+    if secret.startswith("whsec_"):
+        secret = secret[len("whsec_"):]
+    key = base64.b64decode(secret)
+
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+
+    # Header holds space separated "v1,<signature>" entries
+    for entry in signatures.split():
+        _, _, signature = entry.partition(",")
+        if hmac.compare_digest(signature, expected):
+            return True
+    return False
+
+def _complete_prediction(prediction: dict) -> bool:
+    db = SessionLocal()
+    try:
+        with tracing.span("webhook.replicate", prediction_id=prediction.get("id")):
+            page = db.query(Page).filter(Page.prediction_id == prediction.get("id")).first()
+            if not page and page_writes.flush():
+                # Fast predictions can complete before their submit is flushed
+                page = db.query(Page).filter(Page.prediction_id == prediction.get("id")).first()
+            if not page:
+                print(f"Webhook: Unknown prediction {prediction.get('id')}")
+                return False
+            HandwritingRenderer.complete_prediction(page, prediction, db)
+            return True
+    finally:
+        db.close()
+
+@router.post("/replicate")
+async def replicate_webhook(request: Request):
+    """
+    Phase 6: Replicate completion webhook.
+    """
+    body = await request.body()
+
+    if settings.REPLICATE_WEBHOOK_SECRET and not verify_replicate_signature(request.headers, body):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        prediction = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    # Storage relay is blocking (httpx + Supabase), keep it off the event loop
+    matched = await run_in_threadpool(_complete_prediction, prediction)
+    return {"status": "ok", "matched": matched}
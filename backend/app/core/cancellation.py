@@ -0,0 +1,132 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+# Cooperative job cancellation.
+#
+# Work on a job (a render run, a replan, a pipelined run) runs inside
+# scope(job_id), which makes a CancelToken current for the thread; tracing.wrap
+# carries it into pool tasks like the active profile. Provider calls and
+# page loops call check(), which raises JobCancelled once the job has been
+# cancelled after the token was created. Work started after a cancel (the
+# user renders again) is not affected.
+#
+# Cancels are recorded per process. The cancel endpoint records it locally
+# and publishes a "cancelling" stage event; every worker's event bus feeds it
+# back in through observe().
+
+# Cancels older than this no longer stop anything still running
+CANCEL_TTL_SECONDS = 6 * 3600
+
+_current: ContextVar[Optional["CancelToken"]] = ContextVar("swrite_cancel_token", default=None)
+
+class JobCancelled(Exception):
+    def __init__(self, job_id: str):
+        super().__init__(f"Job {job_id} was cancelled")
+        self.job_id = job_id
+
+class _Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled_at = {}  # job id -> time.time() of the latest cancel
+        self.listeners: List[Callable[[], None]] = []
+
+    def cancel(self, job_id: str, at: float):
+        with self.lock:
+            if at <= self.cancelled_at.get(job_id, 0):
+                return
+            self.cancelled_at[job_id] = at
+            expired = [j for j, t in self.cancelled_at.items() if at - t > CANCEL_TTL_SECONDS]
+            for j in expired:
+                del self.cancelled_at[j]
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener()
+
+    def since(self, job_id: str, started: float) -> bool:
+        return self.cancelled_at.get(job_id, 0) >= started
+
+_registry = _Registry()
+
+class CancelToken:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started = time.time()
+
+    @property
+    def cancelled(self) -> bool:
+        return _registry.since(self.job_id, self.started)
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+@contextmanager
+def scope(job_id: str):
+    """
+    Make a token for job_id current until exit. Nested scopes for the same
+    job keep the outer token (and so the outer start time).
+    """
+    token = _current.get()
+    if token is not None and token.job_id == job_id:
+        yield token
+        return
+    token = CancelToken(job_id)
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+@contextmanager
+def activate(token: Optional[CancelToken]):
+    """
+    Make a captured token current in this thread (see tracing.wrap).
+    """
+    if token is None:
+        yield
+        return
+    reset = _current.set(token)
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+def current() -> Optional[CancelToken]:
+    return _current.get()
+
+def cancelled() -> bool:
+    token = _current.get()
+    return token is not None and token.cancelled
+
+def check():
+    """
+    Raise JobCancelled if the current work's job has been cancelled.
+    Free when no token is current.
+    """
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+def cancel(job_id: str, at: Optional[float] = None):
+    """
+    Cancel everything on job_id that started before `at` (default now).
+    """
+    _registry.cancel(job_id, at or time.time())
+
+def on_cancel(listener: Callable[[], None]):
+    """
+    Call listener (no arguments, must not block) after every new cancel,
+    e.g. to wake threads queued for a slot.
+    """
+    with _registry.lock:
+        _registry.listeners.append(listener)
+
+def observe(message: dict):
+    """
+    Feed a job event in: a "cancelling" stage event records the cancel.
+    """
+    if message.get("event") == "stage" and message.get("data", {}).get("status") == "cancelling":
+        cancel(message["job_id"], message.get("ts"))
@@ -24,6 +24,94 @@ class Settings(BaseSettings):
     DATABASE_URL: str = ""
     SUPABASE_JWT_SECRET: str = ""
 
+    # Auth caches
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+    JWKS_REFRESH_SECONDS: int = 600
+    JWKS_MIN_REFRESH_SECONDS: int = 30 # Floor between kid-miss refreshes
+
+    # Connection pools (each engine; Postgres only)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statement cache. Set 0 behind Supabase's
+    # transaction pooler (pgbouncer), which cannot share prepared statements.
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Replicate - Async predictions
+    # Public URL of POST /webhooks/replicate. Empty = rely on the poller only.
+    REPLICATE_WEBHOOK_URL: str = ""
+    REPLICATE_WEBHOOK_SECRET: str = ""
+    RENDER_POLL_INTERVAL_SECONDS: int = 30
+    RENDER_POLL_STALE_SECONDS: int = 120
+    DEFAULT_RENDER_PROFILE: str = "final" # draft, final
+    # Page status writes from the renderer are coalesced into one UPDATE per flush
+    PAGE_WRITE_FLUSH_MS: int = 200
+    PAGE_WRITE_BATCH_SIZE: int = 100 # Flush early once this many pages are waiting
+
+    # Provider quotas (requests per minute across all workers)
+    OPENAI_RPM: int = 60
+    VISION_RPM: int = 600
+    REPLICATE_RPM: int = 600
+    SUPABASE_RPM: int = 1000
+    PROVIDER_BURST: int = 5
+    WORKER_COUNT: int = 1 # Quotas are split evenly between workers
+    PROVIDER_ACQUIRE_TIMEOUT_SECONDS: int = 120
+    PROVIDER_DEFAULT_BACKOFF_SECONDS: int = 5
+    PROVIDER_STATE_SYNC_SECONDS: float = 2.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: int = 30
+
+    # Priority scheduler for shared provider capacity (per worker)
+    SCHEDULER_RENDER_SLOTS: int = 4 # Concurrent Replicate submits
+    SCHEDULER_PLAN_SLOTS: int = 2 # Concurrent planner calls
+    SCHEDULER_AGING_SECONDS: int = 30 # Bulk work waiting this long ranks as interactive
+
+    # Pipelined jobs (extract, plan and render overlap page by page)
+    PIPELINE_WINDOW_PAGES: int = 2 # Source pages per planner call
+    PIPELINE_RASTER_WORKERS: int = 2
+    PIPELINE_PROVIDER_WORKERS: int = 4 # OCR and planner calls in flight
+    PIPELINE_RENDER_WORKERS: int = 4 # Prediction submissions in flight
+
+    # Tracing: "" (off), console, file, otlp
+    TRACE_EXPORTER: str = ""
+    TRACE_FILE: str = "traces.jsonl"
+    TRACE_SERVICE_NAME: str = "swrite-backend"
+    TRACE_SAMPLE_RATIO: float = 1.0
+
+    # Per-request sampling profiler: X-Debug-Profile header or ?debug_profile=1,
+    # honoured for these user ids only (comma-separated; empty = off)
+    PROFILE_ADMIN_USER_IDS: str = ""
+    PROFILE_DIR: str = "profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: int = 5
+    PROFILE_MAX_SECONDS: int = 600 # Stop sampling a profile after this long
+    PROFILE_KEEP: int = 50 # Profiles kept in memory (finished ones are also on disk)
+
+    # Batch submissions (many files or a zip, one child job per file)
+    BATCH_MAX_FILES: int = 100
+    BATCH_MAX_BYTES: int = 1024 * 1024 * 1024 # Whole request, archives counted compressed
+    BATCH_WORKERS: int = 4 # Children extracted/pipelined at once (per worker)
+    BATCH_RENDER_SLOTS: int = 2 # Render submits in flight per batch (per worker)
+
+    # Job progress events: memory (single worker) or postgres (LISTEN/NOTIFY)
+    EVENT_BACKEND: str = "memory"
+
+    # PDF export
+    EXPORT_DIR: str = "exports"
+    EXPORT_FETCH_CONCURRENCY: int = 4 # Pages held in memory at once
+
+    # Preview renderer (TTF/OTF handwriting font; system fallbacks if empty)
+    PREVIEW_FONT_PATH: str = ""
+
+    # Uploads (content-addressed by SHA-256; unreferenced blobs GC'd after the grace period)
+    UPLOAD_DIR: str = "uploads"
+    UPLOAD_GC_GRACE_SECONDS: int = 3600
+    UPLOAD_CHUNK_SIZE: int = 8 * 1024 * 1024 # Max bytes per resumable chunk PUT
+    UPLOAD_MAX_BYTES: int = 512 * 1024 * 1024
+    UPLOAD_SESSION_TTL_SECONDS: int = 86400 # Unfinished resumable uploads
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -11,12 +13,50 @@ if "postgresql" not in SQLALCHEMY_DATABASE_URL and "sqlite" not in SQLALCHEMY_DA
     # Fallback to local sqlite for now to prevent startup crash until configured
     SQLALCHEMY_DATABASE_URL = "sqlite:///./swrite.db"
 
+IS_SQLITE = "sqlite" in SQLALCHEMY_DATABASE_URL
+
+def _pool_kwargs() -> dict:
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def _async_engine_args(url: str):
+    """
+    Same database, async driver: asyncpg for Postgres, aiosqlite for SQLite.
+    asyncpg takes SSL and statement cache settings as connect args, not
+    libpq query params.
+    """
+    parsed = make_url(url)
+    if IS_SQLITE:
+        return parsed.set(drivername="sqlite+aiosqlite"), {"check_same_thread": False}
+
+    connect_args = {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    query = dict(parsed.query)
+    sslmode = query.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = "require"
+    query["prepared_statement_cache_size"] = str(settings.DB_STATEMENT_CACHE_SIZE)
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+# Sync engine: background workers, services, scripts
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **_pool_kwargs()
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: hot request paths
+_async_url, _async_connect_args = _async_engine_args(SQLALCHEMY_DATABASE_URL)
+async_engine = create_async_engine(_async_url, connect_args=_async_connect_args, **_pool_kwargs())
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +65,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
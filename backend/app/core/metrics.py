@@ -0,0 +1,116 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core import tracing
+
+# Prometheus metrics. With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR
+# to a shared empty directory so /metrics aggregates every worker.
+
+# Stages: segregation, rasterization, ocr, planner, render_submit, storage_upload, db_commit
+STAGE_SECONDS = Histogram(
+    "swrite_stage_seconds", "Time spent per pipeline stage",
+    ["stage", "input_type", "provider"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+IN_FLIGHT = Gauge(
+    "swrite_in_flight", "Stage work currently running", ["stage"], multiprocess_mode="livesum"
+)
+PAGES_PROCESSED = Counter(
+    "swrite_pages_processed_total", "Pages through a stage (extracted, planned, rendered)",
+    ["stage", "input_type"]
+)
+CACHE_HITS = Counter("swrite_cache_hits_total", "Cache hits", ["cache"])
+CACHE_MISSES = Counter("swrite_cache_misses_total", "Cache misses", ["cache"])
+LAYOUT_CHANGES = Counter(
+    "swrite_layout_changes_total", "Layout updates by outcome",
+    ["outcome"] # replanned, replan_avoided (same capacity), unchanged
+)
+PROVIDER_ERRORS = Counter(
+    "swrite_provider_errors_total", "Failed provider calls",
+    ["provider", "kind"] # kind: throttled, server, client, unavailable
+)
+
+@contextmanager
+def timed(stage: str, input_type: str = "", provider: str = ""):
+    """
+    Time a block into swrite_stage_seconds, count it as in flight and
+    trace it as a span named after the stage.
+    Labels can be filled in inside the block (e.g. once input_type is known):
+
+        with timed("segregation") as labels:
+            result = ...
+            labels["input_type"] = result.input_type
+    """
+    labels = {"input_type": input_type or "", "provider": provider or ""}
+    IN_FLIGHT.labels(stage).inc()
+    started = time.perf_counter()
+    with tracing.span(stage) as current:
+        try:
+            yield labels
+        finally:
+            STAGE_SECONDS.labels(stage, labels["input_type"] or "", labels["provider"] or "").observe(
+                time.perf_counter() - started
+            )
+            IN_FLIGHT.labels(stage).dec()
+            for key, value in labels.items():
+                if value:
+                    current.set_attribute(key, value)
+
+def count_pages(stage: str, input_type: str, count: int = 1):
+    if count:
+        PAGES_PROCESSED.labels(stage, input_type or "").inc(count)
+
+def cache_lookup(cache: str, hit: bool):
+    (CACHE_HITS if hit else CACHE_MISSES).labels(cache).inc()
+
+def layout_change(outcome: str):
+    LAYOUT_CHANGES.labels(outcome).inc()
+
+def provider_error(provider: str, status) -> None:
+    if status == 429:
+        kind = "throttled"
+    elif status is None or status >= 500:
+        kind = "server"
+    else:
+        kind = "client"
+    PROVIDER_ERRORS.labels(provider, kind).inc()
+
+def render_latest():
+    """
+    (body, content type) for the /metrics endpoint.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+# DB commit time (and a db.commit span) for every session,
+# sync and async (through its sync_session)
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["commit_started"] = time.perf_counter()
+    session.info["commit_span"] = tracing.tracer.start_span("db.commit")
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("commit_started", None)
+    if started is not None:
+        STAGE_SECONDS.labels("db_commit", "", "").observe(time.perf_counter() - started)
+    commit_span = session.info.pop("commit_span", None)
+    if commit_span is not None:
+        commit_span.end()
+
+@event.listens_for(Session, "after_rollback")
+def _commit_failed(session):
+    session.info.pop("commit_started", None)
+    commit_span = session.info.pop("commit_span", None)
+    if commit_span is not None:
+        commit_span.set_attribute("rolled_back", True)
+        commit_span.end()
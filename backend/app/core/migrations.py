@@ -0,0 +1,124 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+# Versioned schema changes for existing (Supabase Postgres) databases.
+# Append only; never edit a released version. Statements must be idempotent.
+MIGRATIONS = [
+    (1, "render_predictions", [
+        "ALTER TABLE pages ADD COLUMN IF NOT EXISTS prediction_id VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_pages_prediction_id ON pages (prediction_id)",
+        "ALTER TABLE pages ADD COLUMN IF NOT EXISTS prediction_submitted_at TIMESTAMPTZ",
+        "ALTER TABLE pages ADD COLUMN IF NOT EXISTS system_attempts INTEGER DEFAULT 0",
+    ]),
+    (2, "render_profiles", [
+        "ALTER TABLE pages ADD COLUMN IF NOT EXISTS render_profile VARCHAR",
+        "UPDATE pages SET render_profile = 'final' WHERE render_seed IS NOT NULL AND render_profile IS NULL",
+    ]),
+    (3, "page_updated_at", [
+        "ALTER TABLE pages ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now()",
+    ]),
+    (4, "hot_query_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_pages_job_type_number ON pages (job_id, page_type, page_number)",
+        "CREATE INDEX IF NOT EXISTS ix_pages_job_status_updated ON pages (job_id, status, updated_at)",
+        "CREATE INDEX IF NOT EXISTS ix_pages_job_unrendered ON pages (job_id, page_number) "
+        "WHERE page_type = 'handwritten' AND status NOT IN ('rendered', 'approved')",
+        "CREATE INDEX IF NOT EXISTS ix_pages_rendering_submitted ON pages (prediction_submitted_at) "
+        "WHERE status = 'rendering'",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_user_created ON jobs (user_id, created_at, id)",
+        "ANALYZE pages",
+        "ANALYZE jobs",
+    ]),
+    (5, "job_file_hash", [
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS file_hash VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_file_hash ON jobs (file_hash)",
+    ]),
+    (6, "job_page_counters", [
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS pages_pending INTEGER DEFAULT 0",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS pages_rendering INTEGER DEFAULT 0",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS pages_rendered INTEGER DEFAULT 0",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS pages_failed INTEGER DEFAULT 0",
+        "UPDATE jobs SET "
+        "pages_pending = c.pending, pages_rendering = c.rendering, "
+        "pages_rendered = c.rendered, pages_failed = c.failed "
+        "FROM (SELECT job_id, "
+        "count(*) FILTER (WHERE status NOT IN ('rendering', 'rendered', 'approved', 'failed_system')) AS pending, "
+        "count(*) FILTER (WHERE status = 'rendering') AS rendering, "
+        "count(*) FILTER (WHERE status IN ('rendered', 'approved')) AS rendered, "
+        "count(*) FILTER (WHERE status = 'failed_system') AS failed "
+        "FROM pages WHERE page_type = 'handwritten' GROUP BY job_id) AS c "
+        "WHERE jobs.id = c.job_id",
+    ]),
+    (7, "batches", [
+        "CREATE TABLE IF NOT EXISTS batches ("
+        "id VARCHAR PRIMARY KEY, user_id VARCHAR NOT NULL REFERENCES users (id), "
+        "render_profile VARCHAR, total_jobs INTEGER DEFAULT 0, created_at TIMESTAMPTZ DEFAULT now())",
+        "CREATE INDEX IF NOT EXISTS ix_batches_id ON batches (id)",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS batch_id VARCHAR REFERENCES batches (id)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_batch_id ON jobs (batch_id)",
+        "ALTER TABLE jobs ADD COLUMN IF NOT EXISTS filename VARCHAR",
+    ]),
+    (8, "provider_state", [
+        "CREATE TABLE IF NOT EXISTS provider_state ("
+        "provider VARCHAR PRIMARY KEY, blocked_until DOUBLE PRECISION DEFAULT 0, "
+        "circuit_open_until DOUBLE PRECISION DEFAULT 0, updated_at TIMESTAMPTZ DEFAULT now())",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("schema_migrations"):
+            return 0
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+def migrate(engine: Engine, base) -> int:
+    """
+    Bring the schema to LATEST_VERSION. Returns the number of versions applied.
+
+    Fresh database (no jobs table): create_all from the models, which
+    already match the latest version, then stamp every version.
+    Existing database: apply each pending version in its own transaction.
+    """
+    with engine.begin() as conn:
+        fresh = not inspect(conn).has_table("jobs")
+        _ensure_version_table(conn)
+
+    if fresh:
+        print("Migrations: Fresh database, creating schema from models...")
+        base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            for version, name, _ in MIGRATIONS:
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                    {"v": version, "n": name}
+                )
+        return len(MIGRATIONS)
+
+    if engine.dialect.name == "sqlite":
+        # Versions are written for Postgres (ADD COLUMN IF NOT EXISTS etc.)
+        print("Migrations: Existing SQLite dev database. Delete it to recreate from the models.")
+        return 0
+
+    applied = 0
+    start = current_version(engine)
+    for version, name, statements in MIGRATIONS:
+        if version <= start:
+            continue
+        print(f"Migrations: Applying {version:04d}_{name}...")
+        with engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                {"v": version, "n": name}
+            )
+        applied += 1
+    return applied
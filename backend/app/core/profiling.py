@@ -0,0 +1,285 @@
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from app.core.config import settings
+
+# Opt-in sampling profiler for one request and the background work it
+# spawns (see app/api/debug.py for the switch and the endpoint).
+#
+# A profile is carried in a context variable. Threads working for it are
+# registered while they run a tracing span or a tracing.wrap'd function,
+# and a single sampler thread records their stacks every
+# PROFILE_SAMPLE_INTERVAL_MS. With no profile active the only cost is one
+# context variable lookup per span.
+#
+# The event loop thread is sampled for the whole request, so its samples
+# include whatever else ran on the loop at the same time.
+
+_current: ContextVar[Optional["Profile"]] = ContextVar("swrite_profile", default=None)
+
+class Profile:
+    def __init__(self, method: str, path: str, user_id: str):
+        self.id = str(uuid.uuid4())
+        self.job_id = None
+        self.method = method
+        self.path = path
+        self.user_id = user_id
+        self.started = time.time()
+        self.finished = None
+        self.truncated = False
+        self.samples = Counter()  # (thread name, frame, frame, ...) -> count
+        self.refs = 0
+
+    @property
+    def key(self) -> str:
+        return self.job_id or self.id
+
+    def to_dict(self) -> dict:
+        with _sampler.lock:
+            samples = Counter(self.samples)
+        functions_self, functions_total, threads = Counter(), Counter(), Counter()
+        for stack, count in samples.items():
+            threads[stack[0]] += count
+            if len(stack) > 1:
+                functions_self[stack[-1]] += count
+            for frame in set(stack[1:]):
+                functions_total[frame] += count
+        total = sum(samples.values())
+        return {
+            "id": self.key,
+            "request_id": self.id,
+            "job_id": self.job_id,
+            "request": {"method": self.method, "path": self.path, "user_id": self.user_id},
+            "started_at": self.started,
+            "duration_seconds": round((self.finished or time.time()) - self.started, 3),
+            "running": self.finished is None,
+            "truncated": self.truncated,
+            "interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+            "samples": total,
+            "threads": dict(threads.most_common()),
+            "top": [
+                {"function": name, "self": count, "total": functions_total[name]}
+                for name, count in functions_self.most_common(30)
+            ],
+            # Collapsed stacks (flamegraph.pl / speedscope input)
+            "collapsed": [f"{';'.join(stack)} {count}" for stack, count in samples.most_common()],
+        }
+
+class _Sampler:
+    def __init__(self):
+        self.threads = {}  # thread id -> [Profile, ...] (one entry per attach)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.profiles = OrderedDict()  # key -> Profile, running and recent
+
+    def attach(self, profile: Profile):
+        tid = threading.get_ident()
+        with self.lock:
+            self.threads.setdefault(tid, []).append(profile)
+            profile.refs += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self.thread.start()
+
+    def detach(self, profile: Profile):
+        tid = threading.get_ident()
+        with self.lock:
+            attached = self.threads.get(tid, [])
+            if profile in attached:
+                attached.remove(profile)
+            if not attached:
+                self.threads.pop(tid, None)
+        self.release(profile)
+
+    def retain(self, profile: Profile):
+        with self.lock:
+            profile.refs += 1
+
+    def release(self, profile: Profile):
+        with self.lock:
+            profile.refs -= 1
+            done = profile.refs == 0 and profile.finished is None
+            if done:
+                profile.finished = time.time()
+        if done:
+            _save(profile)
+
+    def register(self, profile: Profile):
+        with self.lock:
+            self.profiles[profile.id] = profile
+            while len(self.profiles) > settings.PROFILE_KEEP:
+                self.profiles.popitem(last=False)
+
+    def find(self, key: str) -> list:
+        """
+        In-memory profiles for a request id or job id, oldest first.
+        """
+        with self.lock:
+            return [p for p in self.profiles.values() if key in (p.id, p.job_id)]
+
+    def _run(self):
+        interval = settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            now = time.time()
+            with self.lock:
+                if not self.threads:
+                    self.thread = None
+                    return
+                for tid, attached in list(self.threads.items()):
+                    frame = frames.get(tid)
+                    if frame is None:
+                        continue
+                    stack = (names.get(tid, str(tid)),) + _stack(frame)
+                    for profile in set(attached):
+                        if now - profile.started > settings.PROFILE_MAX_SECONDS:
+                            profile.truncated = True
+                            continue
+                        profile.samples[stack] += 1
+
+_sampler = _Sampler()
+
+def _stack(frame) -> tuple:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+def _short_path(path: str) -> str:
+    index = path.rfind("site-packages" + os.sep)
+    if index != -1:
+        return path[index + len("site-packages") + 1:]
+    index = path.rfind(os.sep + "app" + os.sep)
+    if index != -1:
+        return path[index + 1:]
+    return os.path.basename(path)
+
+# On disk: PROFILE_DIR/<job id>/<request id>.json, or PROFILE_DIR/<request id>.json
+# for requests that never touched a job
+
+def _save(profile: Profile):
+    directory = os.path.join(settings.PROFILE_DIR, profile.job_id or "")
+    path = os.path.join(directory, f"{profile.id}.json")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(profile.to_dict(), f)
+        os.replace(tmp_path, path)
+        print(f"Profiler: Saved profile {profile.key}/{profile.id}")
+    except OSError as e:
+        print(f"Profiler: Failed to save profile {profile.id}: {e}")
+
+def _saved_for_job(job_id: str) -> list:
+    directory = os.path.join(settings.PROFILE_DIR, job_id)
+    if not os.path.isdir(directory):
+        return []
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+    return sorted(paths, key=os.path.getmtime)
+
+def start(method: str, path: str, user_id: str) -> Profile:
+    profile = Profile(method, path, user_id)
+    _sampler.register(profile)
+    return profile
+
+def current() -> Optional[Profile]:
+    return _current.get()
+
+def tag_job(job_id: str):
+    """
+    Key the current profile (if any) by the job it belongs to.
+    """
+    profile = _current.get()
+    if profile is not None and profile.job_id is None:
+        profile.job_id = job_id
+
+def retain() -> Optional[Profile]:
+    """
+    The current profile, kept open until a matching activate(..., retained=True)
+    exits: hand-off to a thread that has not started yet.
+    """
+    profile = _current.get()
+    if profile is not None:
+        _sampler.retain(profile)
+    return profile
+
+def release(profile: Optional[Profile]):
+    """
+    Give back a retain() whose hand-off never ran.
+    """
+    if profile is not None:
+        _sampler.release(profile)
+
+@contextmanager
+def activate(profile: Optional[Profile], retained: bool = False):
+    """
+    Make profile current in this thread/task and sample the thread until exit.
+    The profile finishes when its last active scope exits.
+    """
+    if profile is None:
+        yield
+        return
+    token = _current.set(profile)
+    _sampler.attach(profile)
+    try:
+        yield
+    finally:
+        _sampler.detach(profile)
+        if retained:
+            _sampler.release(profile)
+        _current.reset(token)
+
+@contextmanager
+def attached():
+    """
+    Sample this thread for the current profile, if there is one.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    _sampler.attach(profile)
+    try:
+        yield
+    finally:
+        _sampler.detach(profile)
+
+def load(key: str) -> Optional[dict]:
+    """
+    Profile by request id, or the latest profile of a job by job id
+    (with the request ids of all its profiles). Running profiles come
+    from memory, finished ones from memory or disk.
+    """
+    in_memory = _sampler.find(key)
+    on_disk = _saved_for_job(key)
+    if not on_disk:
+        candidates = [os.path.join(settings.PROFILE_DIR, f"{key}.json")]
+        candidates += glob.glob(os.path.join(settings.PROFILE_DIR, "*", f"{key}.json"))
+        on_disk = [path for path in candidates if os.path.exists(path)]
+
+    request_ids = [os.path.basename(path)[:-len(".json")] for path in on_disk]
+    request_ids += [p.id for p in in_memory if p.id not in request_ids]
+    if in_memory:
+        profile = in_memory[-1].to_dict()
+    elif on_disk:
+        try:
+            with open(on_disk[-1]) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return None
+    else:
+        return None
+    profile["job_profiles"] = request_ids
+    return profile
@@ -0,0 +1,139 @@
+import functools
+import json
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from opentelemetry import context as otel_context, trace
+from app.core.config import settings
+from app.core import cancellation, profiling
+
+# Spans across create_job -> Extractor -> PlannerService -> HandwritingRenderer.
+# TRACE_EXPORTER: "" (off), "console", "file" (JSON lines in TRACE_FILE)
+# or "otlp" (needs opentelemetry-exporter-otlp-proto-http; endpoint from
+# the standard OTEL_EXPORTER_OTLP_* environment variables).
+
+tracer = trace.get_tracer("swrite")
+_configured = False
+
+def setup():
+    """
+    Install the SDK tracer provider once. Without an exporter the API's
+    no-op tracer stays in place and spans cost next to nothing.
+    """
+    global _configured
+    if _configured or not settings.TRACE_EXPORTER:
+        return
+    _configured = True
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    if settings.TRACE_EXPORTER == "console":
+        exporter = ConsoleSpanExporter()
+    elif settings.TRACE_EXPORTER == "file":
+        exporter = _JsonLinesExporter(settings.TRACE_FILE)
+    elif settings.TRACE_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("Tracing: opentelemetry-exporter-otlp-proto-http not installed. Tracing disabled.")
+            return
+        exporter = OTLPSpanExporter()
+    else:
+        print(f"Tracing: Unknown TRACE_EXPORTER '{settings.TRACE_EXPORTER}'. Tracing disabled.")
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACE_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO))
+    )
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    print(f"Tracing: Exporting spans ({settings.TRACE_EXPORTER})")
+
+class _JsonLinesExporter:
+    """
+    One JSON span per line; works offline. Duck-types SpanExporter.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+        lines = [json.dumps(json.loads(span.to_json())) + "\n" for span in spans]
+        with self.lock, open(self.path, "a") as f:
+            f.writelines(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000):
+        return True
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Child span of whatever is current:
+
+        with tracing.span("extract", job_id=job.id, bytes=len(file_bytes)) as s:
+            ...
+            s.set_attribute("pages", len(pages))
+    """
+    with tracer.start_as_current_span(name) as current, profiling.attached():
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
+
+def set_attributes(**attributes):
+    current = trace.get_current_span()
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key, value)
+
+def wrap(fn):
+    """
+    Carry the caller's span context (and active profile and cancel token,
+    if any) into a thread (threading.Thread does not copy it):
+
+        threading.Thread(target=tracing.wrap(self.run)).start()
+
+    The wrapped function must be called exactly once, or the profile is
+    never finished; use submit() for executor tasks, which may never run.
+    """
+    captured = otel_context.get_current()
+    profile = profiling.retain()
+    cancel_token = cancellation.current()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        token = otel_context.attach(captured)
+        try:
+            with profiling.activate(profile, retained=True), cancellation.activate(cancel_token):
+                return fn(*args, **kwargs)
+        finally:
+            otel_context.detach(token)
+
+    run.discard = lambda: profiling.release(profile)
+    return run
+
+def submit(pool, fn, *args) -> Future:
+    """
+    pool.submit(fn, *args) with wrap(fn). A task cancelled before it ran
+    (shutdown(cancel_futures=True)) gives back the profile it retained:
+
+        tracing.submit(pool, self.render_page, page_id)
+    """
+    task = wrap(fn)
+    try:
+        future = pool.submit(task, *args)
+    except BaseException:
+        task.discard()
+        raise
+    future.add_done_callback(lambda f: f.cancelled() and task.discard())
+    return future
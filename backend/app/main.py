@@ -1,14 +1,55 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import engine, Base
-from app.api import jobs
+from app.core.config import settings
+from app.core import metrics, tracing
+from app.core.database import SessionLocal
+from app.api import jobs, uploads, webhooks, debug, batches
+from app.services.renderer import HandwritingRenderer
+from app.services.events import bus
+from app.services.page_writes import page_writes
+from app.services.scheduler import scheduler
+from app.api.dependencies import jwks_store
 
-# Create tables (For Phase 1 w/ SQLite or if we need to auto-create in Postgres)
-# In production with Supabase, usage of Alembic is better, but this works for prototype.
-Base.metadata.create_all(bind=engine)
+# Schema is not touched at import: run `python -m scripts.migrate` before
+# starting workers (the Docker image does this on start).
 
-app = FastAPI(title="swrite.ai Backend")
+tracing.setup()
 
+def _poll_renders_once():
+    db = SessionLocal()
+    try:
+        with tracing.span("render.poll"):
+            return HandwritingRenderer.poll_pending(db)
+    finally:
+        db.close()
+
+async def _render_poll_loop():
+    # Fallback for Replicate webhooks that never arrived
+    while True:
+        await asyncio.sleep(settings.RENDER_POLL_INTERVAL_SECONDS)
+        try:
+            completed = await run_in_threadpool(_poll_renders_once)
+            if completed:
+                print(f"Render Poller: Completed {completed} predictions.")
+        except Exception as e:
+            print(f"Render Poller Error: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    bus.start_listener()
+    jwks_store.start_background_refresh()
+    poller = asyncio.create_task(_render_poll_loop())
+    yield
+    poller.cancel()
+    # Staged page statuses must not be lost with the worker
+    await run_in_threadpool(page_writes.flush)
+
+app = FastAPI(title="swrite.ai Backend", lifespan=lifespan)
+
+app.add_middleware(debug.ProfilingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -21,4 +62,18 @@ app.add_middleware(
 async def health_check():
     return {"status": "ok", "service": "swrite.ai backend"}
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render_latest()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/scheduler")
+async def scheduler_stats():
+    # Queue depth and wait times per work class, per provider gate
+    return scheduler.stats()
+
 app.include_router(jobs.router, prefix="/jobs", tags=["Jobs"])
+app.include_router(uploads.router, prefix="/uploads", tags=["Uploads"])
+app.include_router(batches.router, prefix="/batches", tags=["Batches"])
+app.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
+app.include_router(debug.router, prefix="/debug", tags=["Debug"])
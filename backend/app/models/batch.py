@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class Batch(Base):
+    __tablename__ = "batches"
+
+    id = Column(String, primary_key=True, index=True) # UUID
+    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    render_profile = Column(String, nullable=True) # Set once the batch renders
+    total_jobs = Column(Integer, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,13 +1,20 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, JSON, Boolean
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, JSON, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # Keyset listing of a user's jobs, newest first
+        Index("ix_jobs_user_created", "user_id", "created_at", "id"),
+    )
 
     id = Column(String, primary_key=True, index=True) # UUID
     user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    batch_id = Column(String, ForeignKey("batches.id"), nullable=True, index=True) # Multi-document batch
+    filename = Column(String, nullable=True) # Name of the uploaded file (batch members)
     
     status = Column(String, default="created") # created, processing, completed, failed
     input_type = Column(String, nullable=False) # text_pdf, scanned_pdf, image_handwritten
@@ -15,10 +22,19 @@ class Job(Base):
     requires_review = Column(Boolean, default=False)
     
     total_pages = Column(Integer, default=0)
+    # Handwritten pages per render state, kept by PageStatusWriter
+    pages_pending = Column(Integer, default=0) # planned (not submitted yet)
+    pages_rendering = Column(Integer, default=0)
+    pages_rendered = Column(Integer, default=0) # rendered or approved
+    pages_failed = Column(Integer, default=0) # failed_system
     original_file_path = Column(String, nullable=True) # Path to stored file for Vision
+    file_hash = Column(String, nullable=True, index=True) # SHA-256 of the upload (dedup)
     layout_config = Column(JSON, nullable=True) # Phase 5: Margins, Spacing
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set here, with microseconds, so it binds in the stored format: on
+    # SQLite server now() has whole seconds and the list_jobs cursor
+    # (created_at, id) would compare below its own row
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
     
     # Relationships
     user = relationship("User")
@@ -1,10 +1,31 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Text, JSON
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Text, JSON, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
+UNRENDERED_HANDWRITTEN = "page_type = 'handwritten' AND status NOT IN ('rendered', 'approved')"
+RENDERING = "status = 'rendering'"
+
 class Page(Base):
     __tablename__ = "pages"
+    __table_args__ = (
+        # Pages of one type for a job, in order (planner, renderer, export, approve/retry)
+        Index("ix_pages_job_type_number", "job_id", "page_type", "page_number"),
+        # Status view / ETag: per-status counts and latest update
+        Index("ix_pages_job_status_updated", "job_id", "status", "updated_at"),
+        # Handwritten pages still to render
+        Index(
+            "ix_pages_job_unrendered", "job_id", "page_number",
+            postgresql_where=text(UNRENDERED_HANDWRITTEN),
+            sqlite_where=text(UNRENDERED_HANDWRITTEN)
+        ),
+        # Render poller: in-flight predictions by age
+        Index(
+            "ix_pages_rendering_submitted", "prediction_submitted_at",
+            postgresql_where=text(RENDERING),
+            sqlite_where=text(RENDERING)
+        ),
+    )
 
     id = Column(String, primary_key=True, index=True) # UUID
     job_id = Column(String, ForeignKey("jobs.id"), nullable=False)
@@ -22,7 +43,12 @@ class Page(Base):
     image_url = Column(String, nullable=True) # Rendered handwriting image
     render_seed = Column(Integer, nullable=True) # Deterministic seed
     render_attempts = Column(Integer, default=0) # Retry count
+    render_profile = Column(String, nullable=True) # draft, final
+    prediction_id = Column(String, nullable=True, index=True) # In-flight Replicate prediction
+    prediction_submitted_at = Column(DateTime(timezone=True), nullable=True)
+    system_attempts = Column(Integer, default=0) # System retries for the current render
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     job = relationship("Job", back_populates="pages")
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class ProviderState(Base):
+    __tablename__ = "provider_state"
+
+    # Shared throttle/circuit state so every worker backs off together
+    provider = Column(String, primary_key=True) # openai, vision, replicate, supabase
+    blocked_until = Column(Float, default=0) # Epoch seconds (429 / Retry-After)
+    circuit_open_until = Column(Float, default=0) # Epoch seconds (breaker tripped)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
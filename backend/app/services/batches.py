@@ -0,0 +1,165 @@
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core import cancellation, tracing
+from app.core.cancellation import JobCancelled
+from app.models.job import Job
+from app.services.extractor import Extractor
+from app.services.pipeline import JobPipeline
+from app.services.renderer import HandwritingRenderer
+from app.services.segregator import segregate_bytes, SegregationResult
+from app.services.uploads import UploadStore
+from app.services.events import bus
+
+# Child jobs a batch render picks up: extracted ones are planned and
+# rendered, planned ones have their unrendered pages submitted
+UNPLANNED = ["extracted"]
+PLANNED = ["planned", "partial"]
+
+def _skipped_member(name: str) -> bool:
+    # Directories, macOS resource forks and dotfiles
+    parts = name.split("/")
+    return name.endswith("/") or parts[0] == "__MACOSX" or parts[-1].startswith(".")
+
+class BatchRunner:
+    """
+    Multi-document batches: one child job per file. Extraction and
+    pipelined runs of every batch share one pool of BATCH_WORKERS threads,
+    so a class uploading 40 assignments does not start 40 pipelines at
+    once. Segregation (prepare) is short and runs in the request's
+    threadpool instead, so it never waits behind those runs. Rendering additionally shares the batch's
+    render budget (scheduler.batch_slot, see HandwritingRenderer).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def submit(self, fn, *args) -> Future:
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(settings.BATCH_WORKERS, thread_name_prefix="batch")
+        return tracing.submit(self.pool, fn, *args)
+
+    @staticmethod
+    def unpack(files: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+        """
+        (filename, bytes) per document, zip archives expanded.
+        Raises ValueError for a bad archive, too many files, an archive
+        expanding past UPLOAD_MAX_BYTES or all of them past BATCH_MAX_BYTES.
+        """
+        documents = []
+        expanded = 0  # Over every archive in the request
+        for filename, data in files:
+            if not filename.lower().endswith(".zip"):
+                documents.append((filename, data))
+                continue
+            try:
+                with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                    members = [m for m in archive.infolist() if not _skipped_member(m.filename)]
+                    # Sizes from the central directory: refuse before inflating anything
+                    size = sum(m.file_size for m in members)
+                    if size > settings.UPLOAD_MAX_BYTES:
+                        raise ValueError(f"{filename}: archive expands past {settings.UPLOAD_MAX_BYTES} bytes")
+                    expanded += size
+                    if expanded > settings.BATCH_MAX_BYTES:
+                        raise ValueError(f"Archives in a batch expand past {settings.BATCH_MAX_BYTES} bytes")
+                    if len(documents) + len(members) > settings.BATCH_MAX_FILES:
+                        raise ValueError(f"At most {settings.BATCH_MAX_FILES} files per batch")
+                    documents += [(os.path.basename(m.filename), archive.read(m)) for m in members]
+            except zipfile.BadZipFile:
+                raise ValueError(f"{filename}: not a valid zip archive")
+        if not documents:
+            raise ValueError("No files in batch")
+        if len(documents) > settings.BATCH_MAX_FILES:
+            raise ValueError(f"At most {settings.BATCH_MAX_FILES} files per batch")
+        return documents
+
+    @staticmethod
+    def prepare(filename: str, data: bytes) -> Tuple[SegregationResult, str, str]:
+        """
+        Segregate one document and store its bytes.
+        Returns (segregation, file_hash, path). ValueError if unsupported.
+        """
+        with tracing.span("batch.prepare", bytes=len(data)) as s:
+            segregation = segregate_bytes(filename, data)
+            s.set_attribute("input_type", segregation.input_type)
+            file_hash, path = UploadStore.save(data, filename)
+        return segregation, file_hash, path
+
+    def start(self, job_ids: List[str], layout_config: dict, profile: Optional[str]):
+        """
+        Extract every child, or with a profile run its pipelined
+        extract/plan/render, as pool threads free up.
+        """
+        for job_id in job_ids:
+            if profile:
+                self._submit_run(job_id, self._run_pipeline, job_id, layout_config, profile, True)
+            else:
+                self._submit_run(job_id, self._extract, job_id)
+
+    def render(self, unplanned_ids: List[str], planned_ids: List[str], layout_config: dict, profile: str):
+        """
+        Plan and render the unplanned children (their input pages exist),
+        submit the unrendered pages of the planned ones.
+        """
+        for job_id in unplanned_ids:
+            self._submit_run(job_id, self._run_pipeline, job_id, layout_config, profile, False)
+        for job_id in planned_ids:
+            self._submit_run(job_id, self._render, job_id, profile)
+
+    def _submit_run(self, job_id: str, fn, *args):
+        # Token taken now: cancelling a child still waiting for a pool
+        # thread keeps it from starting
+        with cancellation.scope(job_id):
+            self.submit(fn, *args)
+
+    @staticmethod
+    def _run_pipeline(job_id: str, layout_config: dict, profile: str, extract: bool):
+        # On this pool thread, not a thread of its own (JobPipeline.start)
+        JobPipeline(job_id, layout_config, profile, extract=extract).run()
+
+    @staticmethod
+    def _extract(job_id: str):
+        db = SessionLocal()
+        job = db.query(Job).filter(Job.id == job_id).first()
+        try:
+            cancellation.check()
+            job.status = "processing"
+            db.commit()
+            bus.publish(job_id, "stage", {"status": "processing"})
+            size = os.path.getsize(job.original_file_path)
+            with tracing.span("extract", job_id=job_id, input_type=job.input_type, bytes=size) as s:
+                # From the stored file, not read into memory here
+                job.total_pages = Extractor.extract_job(job, db)
+                s.set_attribute("pages", job.total_pages)
+            db.commit()
+        except JobCancelled:
+            # Cancelled while waiting for a pool thread; cancel_job set the status
+            pass
+        except Exception as e:
+            print(f"Batch: Extraction of {job_id} failed - {e}")
+            if job.status != "failed":
+                job.status = "failed"
+                db.commit()
+                bus.publish(job_id, "stage", {"status": "failed", "error": str(e)})
+        finally:
+            db.close()
+
+    @staticmethod
+    def _render(job_id: str, profile: str):
+        db = SessionLocal()
+        try:
+            with tracing.span("render_job", job_id=job_id, profile=profile) as s:
+                s.set_attribute("pages_submitted", HandwritingRenderer.render_job(job_id, db, profile=profile))
+        except Exception as e:
+            print(f"Batch: Render of {job_id} failed - {e}")
+        finally:
+            db.close()
+
+batch_runner = BatchRunner()
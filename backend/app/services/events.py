@@ -0,0 +1,114 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.database import engine
+from app.core import cancellation
+
+NOTIFY_CHANNEL = "swrite_job_events"
+SUBSCRIBER_QUEUE_SIZE = 256
+
+def _offer(queue: asyncio.Queue, message: dict):
+    # Slow consumers lose events rather than stall publishers
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+class JobEventBus:
+    """
+    Job progress pub/sub for the SSE endpoint.
+
+    EVENT_BACKEND=memory: publish() delivers straight to this process's
+    subscribers. EVENT_BACKEND=postgres: publish() issues pg_notify and a
+    LISTEN thread in every worker delivers to its own subscribers, so a
+    stream on worker A sees renders completed on worker B.
+
+    Events are published after the DB commit they describe. Every
+    delivered event also goes to cancellation.observe, which is how a
+    cancel reaches the workers running the job.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)  # job_id -> {(queue, loop)}
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[job_id].add((queue, asyncio.get_running_loop()))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self.lock:
+            subs = self.subscribers.get(job_id)
+            if not subs:
+                return
+            subs.difference_update({s for s in subs if s[0] is queue})
+            if not subs:
+                del self.subscribers[job_id]
+
+    def publish(self, job_id: str, event: str, data: dict):
+        """
+        Safe to call from any thread. Never raises.
+        """
+        message = {"job_id": job_id, "event": event, "data": data, "ts": time.time()}
+        try:
+            if settings.EVENT_BACKEND == "postgres":
+                with engine.connect() as conn:
+                    conn.execute(
+                        text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": NOTIFY_CHANNEL, "payload": json.dumps(message)}
+                    )
+                    conn.commit()
+            else:
+                self._dispatch(message)
+        except Exception as e:
+            print(f"Events: Publish failed for Job {job_id}: {e}")
+
+    def _dispatch(self, message: dict):
+        cancellation.observe(message)
+        with self.lock:
+            subs = list(self.subscribers.get(message["job_id"], ()))
+        for queue, loop in subs:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+    def start_listener(self):
+        if settings.EVENT_BACKEND != "postgres" or self.listener:
+            return
+        self.listener = threading.Thread(target=self._listen_forever, name="job-events-listener", daemon=True)
+        self.listener.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Events: Listener error, reconnecting: {e}")
+                time.sleep(2)
+
+    def _listen(self):
+        conn = engine.raw_connection()
+        try:
+            dbapi_conn = conn.driver_connection
+            dbapi_conn.autocommit = True
+            cursor = dbapi_conn.cursor()
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL};")
+            print("Events: Listening for job events (postgres)")
+            while True:
+                if select.select([dbapi_conn], [], [], 5) == ([], [], []):
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    notify = dbapi_conn.notifies.pop(0)
+                    self._dispatch(json.loads(notify.payload))
+        finally:
+            # Never hand a LISTENing connection back to the pool
+            conn.invalidate()
+
+bus = JobEventBus()
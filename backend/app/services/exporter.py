@@ -0,0 +1,282 @@
+import asyncio
+import glob
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import zlib
+from typing import List, Optional
+import httpx
+from PIL import Image
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core import metrics
+from app.models.job import Job
+from app.models.page import Page
+from app.services.layout import page_size_pt
+
+class PdfImage:
+    """
+    An image ready to embed as a PDF XObject.
+    JPEG (DCTDecode) and 8-bit non-interlaced gray/RGB PNG (FlateDecode +
+    PNG predictors) are passed through byte-for-byte; anything else is
+    decoded once and stored as raw Flate.
+    """
+
+    def __init__(self, width: int, height: int, color_space: str, data: bytes, filter_: str, decode_parms: str = ""):
+        self.width = width
+        self.height = height
+        self.color_space = color_space
+        self.data = data
+        self.filter = filter_
+        self.decode_parms = decode_parms
+
+    @staticmethod
+    def from_bytes(raw: bytes) -> "PdfImage":
+        if raw[:2] == b"\xff\xd8":
+            image = PdfImage._from_jpeg(raw)
+        elif raw[:8] == b"\x89PNG\r\n\x1a\n":
+            image = PdfImage._from_png(raw)
+        else:
+            image = None
+        return image or PdfImage._reencode(raw)
+
+    @staticmethod
+    def _from_jpeg(raw: bytes) -> Optional["PdfImage"]:
+        i = 2
+        while i + 9 < len(raw):
+            if raw[i] != 0xFF:
+                return None
+            marker = raw[i + 1]
+            length = struct.unpack(">H", raw[i + 2:i + 4])[0]
+            # SOFn frame header (C4/C8/CC are DHT/JPG/DAC, not frames)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", raw[i + 5:i + 9])
+                components = raw[i + 9]
+                color_space = {1: "DeviceGray", 3: "DeviceRGB"}.get(components)
+                if not color_space:
+                    return None  # CMYK/Adobe quirks: let PIL handle it
+                return PdfImage(width, height, color_space, raw, "DCTDecode")
+            i += 2 + length
+        return None
+
+    @staticmethod
+    def _from_png(raw: bytes) -> Optional["PdfImage"]:
+        i = 8
+        idat = []
+        header = None
+        while i + 8 <= len(raw):
+            length = struct.unpack(">I", raw[i:i + 4])[0]
+            chunk_type = raw[i + 4:i + 8]
+            chunk = raw[i + 8:i + 8 + length]
+            if chunk_type == b"IHDR":
+                header = struct.unpack(">IIBBBBB", chunk)
+            elif chunk_type == b"IDAT":
+                idat.append(chunk)
+            elif chunk_type == b"tRNS":
+                return None  # Transparency needs an SMask
+            elif chunk_type == b"IEND":
+                break
+            i += 12 + length
+
+        if not header or not idat:
+            return None
+        width, height, bit_depth, color_type, _, _, interlace = header
+        colors = {0: 1, 2: 3}.get(color_type)
+        if bit_depth != 8 or interlace != 0 or not colors:
+            return None
+        return PdfImage(
+            width, height,
+            "DeviceGray" if colors == 1 else "DeviceRGB",
+            b"".join(idat),
+            "FlateDecode",
+            f"/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent 8 /Columns {width} >>"
+        )
+
+    @staticmethod
+    def _reencode(raw: bytes) -> "PdfImage":
+        with Image.open(io.BytesIO(raw)) as img:
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                background = Image.new("RGB", img.size, "white")
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            elif img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            color_space = "DeviceGray" if img.mode == "L" else "DeviceRGB"
+            return PdfImage(img.width, img.height, color_space, zlib.compress(img.tobytes()), "FlateDecode")
+
+class PdfStreamWriter:
+    """
+    Minimal append-only PDF writer: one full-bleed image per page.
+    Only object offsets are kept in memory, never page data.
+
+    Object layout: 1 = Catalog, 2 = Pages (written last), then
+    3 objects per page (Page, Contents, Image).
+    """
+
+    def __init__(self, fileobj, page_width: float, page_height: float):
+        self.f = fileobj
+        self.page_width = page_width
+        self.page_height = page_height
+        self.offsets = {}
+        self.page_refs = []
+        self.next_obj = 3
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, num: int, body: bytes, stream: bytes = None):
+        self.offsets[num] = self.f.tell()
+        self.f.write(f"{num} 0 obj\n".encode())
+        self.f.write(body)
+        if stream is not None:
+            self.f.write(b"\nstream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_page(self, image: PdfImage):
+        page_num, contents_num, image_num = self.next_obj, self.next_obj + 1, self.next_obj + 2
+        self.next_obj += 3
+
+        # Fit the image inside the page, centred, keeping aspect ratio
+        scale = min(self.page_width / image.width, self.page_height / image.height)
+        draw_w, draw_h = image.width * scale, image.height * scale
+        x = (self.page_width - draw_w) / 2
+        y = (self.page_height - draw_h) / 2
+
+        self._write_object(page_num, (
+            f"<< /Type /Page /Parent 2 0 R "
+            f"/MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_num} 0 R >> >> "
+            f"/Contents {contents_num} 0 R >>"
+        ).encode())
+
+        contents = f"q {draw_w:.2f} 0 0 {draw_h:.2f} {x:.2f} {y:.2f} cm /Im0 Do Q".encode()
+        self._write_object(contents_num, f"<< /Length {len(contents)} >>".encode(), contents)
+
+        self._write_object(image_num, (
+            f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+            f"/ColorSpace /{image.color_space} /BitsPerComponent 8 /Filter /{image.filter} "
+            f"{image.decode_parms} /Length {len(image.data)} >>"
+        ).encode(), image.data)
+
+        self.page_refs.append(page_num)
+
+    def close(self):
+        kids = " ".join(f"{n} 0 R" for n in self.page_refs)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_refs)} >>".encode())
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self.f.tell()
+        size = self.next_obj
+        self.f.write(f"xref\n0 {size}\n".encode())
+        self.f.write(b"0000000000 65535 f \n")
+        for num in range(1, size):
+            self.f.write(f"{self.offsets[num]:010d} 00000 n \n".encode())
+        self.f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+class PdfExporter:
+    """
+    Assembles approved handwritten pages into one print-ready PDF.
+    Cached on disk per job until any exported page changes.
+    """
+
+    @staticmethod
+    def approved_pages(job_id: str, db: Session) -> List[Page]:
+        return db.query(Page).filter(
+            Page.job_id == job_id,
+            Page.page_type == "handwritten",
+            Page.status == "approved"
+        ).order_by(Page.page_number).all()
+
+    @staticmethod
+    def fingerprint(page_size: str, pages: List[Page]) -> str:
+        h = hashlib.sha256(page_size.encode())
+        for p in pages:
+            h.update(f"|{p.id}:{p.page_number}:{p.image_url}:{p.render_attempts}:{p.render_profile}".encode())
+        return h.hexdigest()[:32]
+
+    @staticmethod
+    async def export_job(job: Job, db: Session) -> str:
+        """
+        Returns the path of the job's PDF, building it if the cache is stale.
+        Queries and file writes run in worker threads; only the image
+        downloads run on the event loop.
+        """
+        pages = await asyncio.to_thread(PdfExporter.approved_pages, job.id, db)
+        if not pages:
+            raise ValueError("No approved pages to export.")
+
+        page_size = (job.layout_config or {}).get("page_size", "A4")
+        path = await asyncio.to_thread(PdfExporter._cached_path, job.id, page_size, pages)
+        if path:
+            print(f"Exporter: Cache hit for Job {job.id}")
+            return path
+
+        print(f"Exporter: Building {len(pages)} pages for Job {job.id}")
+        image_urls = [p.image_url for p in pages]
+        export_dir = os.path.join(os.getcwd(), settings.EXPORT_DIR, job.id)
+        path = os.path.join(export_dir, f"{PdfExporter.fingerprint(page_size, pages)}.pdf")
+        # A temp file per export: concurrent exports of a job must not share one
+        tmp = await asyncio.to_thread(tempfile.NamedTemporaryFile, dir=export_dir, suffix=".pdf.tmp", delete=False)
+        try:
+            with tmp:
+                await PdfExporter._write_pdf(tmp, image_urls, *page_size_pt(page_size))
+            await asyncio.to_thread(os.replace, tmp.name, path)
+        finally:
+            if os.path.exists(tmp.name):
+                os.remove(tmp.name)
+
+        await asyncio.to_thread(PdfExporter._drop_stale, export_dir, path)
+        return path
+
+    @staticmethod
+    def _cached_path(job_id: str, page_size: str, pages: List[Page]) -> Optional[str]:
+        export_dir = os.path.join(os.getcwd(), settings.EXPORT_DIR, job_id)
+        os.makedirs(export_dir, exist_ok=True)
+        path = os.path.join(export_dir, f"{PdfExporter.fingerprint(page_size, pages)}.pdf")
+        cached = os.path.exists(path)
+        metrics.cache_lookup("export", cached)
+        return path if cached else None
+
+    @staticmethod
+    def _drop_stale(export_dir: str, path: str):
+        # Exports of older page versions
+        for stale in glob.glob(os.path.join(export_dir, "*.pdf")):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass  # Another export got there first
+
+    @staticmethod
+    async def _write_pdf(f, image_urls: List[str], page_width: float, page_height: float):
+        """
+        Sliding window: up to EXPORT_FETCH_CONCURRENCY downloads in flight,
+        pages written strictly in order as soon as their turn comes.
+        """
+        writer = await asyncio.to_thread(PdfStreamWriter, f, page_width, page_height)
+        window = max(settings.EXPORT_FETCH_CONCURRENCY, 1)
+
+        async with httpx.AsyncClient(timeout=60) as client:
+            async def fetch(url: str) -> PdfImage:
+                response = await client.get(url)
+                if response.status_code != 200:
+                    raise Exception(f"Failed to download page image: {response.status_code}")
+                return await asyncio.to_thread(PdfImage.from_bytes, response.content)
+
+            pending = [asyncio.create_task(fetch(url)) for url in image_urls[:window]]
+            try:
+                for i in range(len(image_urls)):
+                    image = await pending[i]
+                    pending[i] = None  # Release the page once written
+                    await asyncio.to_thread(writer.add_page, image)
+                    if i + window < len(image_urls):
+                        pending.append(asyncio.create_task(fetch(image_urls[i + window])))
+            finally:
+                for task in pending:
+                    if task and not task.done():
+                        task.cancel()
+
+        await asyncio.to_thread(writer.close)
@@ -2,27 +2,35 @@ import io
 import uuid
 import json
 import os
+from typing import Optional, Union
 from sqlalchemy.orm import Session
 from app.models.job import Job
 from app.models.page import Page
-from pypdf import PdfReader
-from google.cloud import vision
+from app.services.ratelimit import limiter
+from app.services.events import bus
+from app.core import cancellation, metrics, tracing
 
 # Real Google OCR Service
 class GoogleOCR:
     @staticmethod
-    def process_file(file_bytes: bytes, is_pdf: bool = False):
+    def process_file(source: Union[bytes, str], is_pdf: bool = False, input_type: str = None):
         """
-        Calls Google Cloud Vision API.
+        Calls Google Cloud Vision API. source is the file's bytes, or for
+        a PDF its path (rasterized from disk, never read into memory).
         Returns: list of dicts { "content": str, "source": str }
         """
+        from google.cloud import vision
+        input_type = input_type or ("scanned_pdf" if is_pdf else "image_handwritten")
         client = vision.ImageAnnotatorClient()
         
         # 1. Image Processing
         if not is_pdf:
-            image = vision.Image(content=file_bytes)
+            image = vision.Image(content=source)
             # Use DOCUMENT_TEXT_DETECTION for dense text/handwriting
-            response = client.document_text_detection(image=image)
+            cancellation.check()
+            with metrics.timed("ocr", input_type, "vision"), limiter.guard("vision"):
+                tracing.set_attributes(bytes=len(source))
+                response = client.document_text_detection(image=image)
             
             if response.error.message:
                 raise Exception(f"Google Vision Error: {response.error.message}")
@@ -37,23 +45,28 @@ class GoogleOCR:
             
         # 2. PDF Processing
         else:
-            from pdf2image import convert_from_bytes
+            from pdf2image import convert_from_bytes, convert_from_path
             from app.core.config import POPPLER_PATH
             
             try:
-                images = convert_from_bytes(file_bytes, poppler_path=POPPLER_PATH)
+                with metrics.timed("rasterization", input_type, "poppler"):
+                    if isinstance(source, str):
+                        images = convert_from_path(source, poppler_path=POPPLER_PATH)
+                    else:
+                        images = convert_from_bytes(source, poppler_path=POPPLER_PATH)
             except Exception as e:
                 raise Exception(f"Failed to rasterize PDF for OCR: {e}. Is Poppler installed?")
 
             results = []
-            for img in images:
+            for page_number, img in enumerate(images, 1):
                 # Convert PIL image to bytes
                 img_byte_arr = io.BytesIO()
                 img.save(img_byte_arr, format='JPEG')
                 content = img_byte_arr.getvalue()
                 
                 # Recursive call treating it as an image
-                page_result = GoogleOCR.process_file(content, is_pdf=False)
+                with tracing.span("extract.page", page_number=page_number, bytes=len(content)):
+                    page_result = GoogleOCR.process_file(content, is_pdf=False, input_type=input_type)
                 # Override source to reflect it came from a PDF
                 page_result[0]["source"] = "google_ocr_pdf_page"
                 results.extend(page_result)
@@ -63,21 +76,24 @@ class GoogleOCR:
 
 class Extractor:
     @staticmethod
-    def extract_job(job: Job, db: Session, file_bytes: bytes):
+    def extract_job(job: Job, db: Session, file_bytes: Optional[bytes] = None):
         """
         Route the job to the correct pipeline based on input_type.
+        Without file_bytes, PDFs are read from the job's stored file
+        (large uploads are never held in memory).
         """
         print(f"Extractor: Starting extraction for Job {job.id} ({job.input_type})")
         
         pages_data = []
+        source = file_bytes if file_bytes is not None else job.original_file_path
 
         try:
             if job.input_type == "text_pdf":
-                pages_data = Extractor._pipeline_text_pdf(file_bytes)
+                pages_data = Extractor._pipeline_text_pdf(source)
             elif job.input_type == "scanned_pdf":
-                pages_data = Extractor._pipeline_scanned_pdf(file_bytes)
+                pages_data = Extractor._pipeline_scanned_pdf(source)
             elif job.input_type == "image_handwritten":
-                pages_data = Extractor._pipeline_image_handwritten(file_bytes)
+                pages_data = Extractor._pipeline_image_handwritten(source)
             else:
                 raise ValueError(f"Unknown input_type: {job.input_type}")
                 
@@ -98,21 +114,25 @@ class Extractor:
             job.status = "extracted" 
             db.commit()
             print(f"Extractor: Saved {len(pages_data)} pages.")
+            metrics.count_pages("extracted", job.input_type, len(pages_data))
+            bus.publish(job.id, "stage", {"status": "extracted", "total_pages": len(pages_data)})
             return len(pages_data)
 
         except Exception as e:
             print(f"Extraction Failed: {e}")
             job.status = "failed"
             db.commit()
+            bus.publish(job.id, "stage", {"status": "failed", "error": str(e)})
             raise e
 
     @staticmethod
-    def _pipeline_text_pdf(file_bytes: bytes) -> list:
+    def _pipeline_text_pdf(source: Union[bytes, str]) -> list:
         """
         Pipeline A: pypdf Extraction.
         """
+        from pypdf import PdfReader
         pages_output = []
-        reader = PdfReader(io.BytesIO(file_bytes))
+        reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
         
         for page in reader.pages:
             text = page.extract_text()
@@ -124,9 +144,13 @@ class Extractor:
         return pages_output
 
     @staticmethod
-    def _pipeline_scanned_pdf(file_bytes: bytes) -> list:
-        return GoogleOCR.process_file(file_bytes, is_pdf=True)
+    def _pipeline_scanned_pdf(source: Union[bytes, str]) -> list:
+        return GoogleOCR.process_file(source, is_pdf=True)
 
     @staticmethod
-    def _pipeline_image_handwritten(file_bytes: bytes) -> list:
-        return GoogleOCR.process_file(file_bytes, is_pdf=False)
+    def _pipeline_image_handwritten(source: Union[bytes, str]) -> list:
+        if isinstance(source, str):
+            # Vision takes the image bytes either way
+            with open(source, "rb") as f:
+                source = f.read()
+        return GoogleOCR.process_file(source, is_pdf=False)
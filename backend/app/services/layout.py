@@ -0,0 +1,81 @@
+from typing import NamedTuple, Tuple
+
+# Physical page sizes (width, height) in millimetres
+PAGE_SIZES_MM = {
+    "A4": (210.0, 297.0),
+    "A5": (148.0, 210.0),
+    "Letter": (215.9, 279.4),
+}
+
+# LayoutConfig margins/spaces are CSS pixels (96 per inch)
+LAYOUT_DPI = 96
+
+# Nominal handwriting size (CSS px) and line pitch multipliers
+HANDWRITING_SIZE_PX = 22
+LINE_SPACING = {
+    "tight": 1.3,
+    "normal": 1.6,
+    "relaxed": 2.0,
+}
+
+def page_size_px(page_size: str, dpi: float = LAYOUT_DPI) -> Tuple[int, int]:
+    """
+    Page dimensions in pixels at the given DPI. Unknown sizes fall back to A4.
+    """
+    width_mm, height_mm = PAGE_SIZES_MM.get(page_size, PAGE_SIZES_MM["A4"])
+    return round(width_mm / 25.4 * dpi), round(height_mm / 25.4 * dpi)
+
+def page_size_pt(page_size: str) -> Tuple[float, float]:
+    """
+    Page dimensions in PDF points (1/72 inch).
+    """
+    width_mm, height_mm = PAGE_SIZES_MM.get(page_size, PAGE_SIZES_MM["A4"])
+    return width_mm / 25.4 * 72, height_mm / 25.4 * 72
+
+def line_height_px(line_spacing: str) -> int:
+    return round(HANDWRITING_SIZE_PX * LINE_SPACING.get(line_spacing, LINE_SPACING["normal"]))
+
+def render_size_px(page_size: str, dpi: float, multiple: int = 64) -> Tuple[int, int]:
+    """
+    Diffusion output size for a page: page_size_px snapped to the
+    model's latent grid. A4 @ 120 DPI -> 1024x1408.
+    """
+    width, height = page_size_px(page_size, dpi)
+    return (
+        max(multiple, round(width / multiple) * multiple),
+        max(multiple, round(height / multiple) * multiple)
+    )
+
+class Capacity(NamedTuple):
+    lines_per_page: int
+    chars_per_line: int
+
+# Average handwriting advance per character (CSS px)
+AVERAGE_CHAR_WIDTH_PX = HANDWRITING_SIZE_PX * 0.5
+
+# Per page size: (width, height) at LAYOUT_DPI and the line pitch for each spacing
+CAPACITY_TABLE = {
+    page_size: (page_size_px(page_size), {spacing: line_height_px(spacing) for spacing in LINE_SPACING})
+    for page_size in PAGE_SIZES_MM
+}
+
+def capacity(layout_config: dict) -> Capacity:
+    """
+    How much handwriting a LayoutConfig fits on a page. The planner's page
+    split depends on nothing else, so two configs with the same capacity
+    plan the same pages. Content box as in PreviewRenderer (the right
+    margin mirrors the left one). Unknown sizes and spacings fall back
+    like page_size_px and line_height_px.
+    """
+    (width, height), pitches = CAPACITY_TABLE.get(layout_config["page_size"], CAPACITY_TABLE["A4"])
+    line_height = pitches.get(layout_config["line_spacing"], pitches["normal"])
+    content_width = width - 2 * layout_config["margin_left"]
+    content_height = (
+        height
+        - layout_config["margin_top"] - layout_config["header_space"]
+        - layout_config["margin_bottom"] - layout_config["footer_space"]
+    )
+    return Capacity(
+        lines_per_page=max(content_height // line_height, 0),
+        chars_per_line=max(int(content_width // AVERAGE_CHAR_WIDTH_PX), 0)
+    )
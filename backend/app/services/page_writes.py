@@ -0,0 +1,226 @@
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm.attributes import set_committed_value
+from app.core.config import settings
+from app.core.database import engine
+from app.core import metrics
+from app.models.job import Job
+from app.models.page import Page
+from app.services.events import bus
+
+# Page columns a render status transition can change
+PAGE_FIELDS = [
+    "status",
+    "prediction_id",
+    "prediction_submitted_at",
+    "image_url",
+    "render_seed",
+    "render_profile",
+    "render_attempts",
+    "system_attempts",
+]
+
+COUNTERS = ["pages_pending", "pages_rendering", "pages_rendered", "pages_failed"]
+
+# Rows per statement (SQLite allows 32766 bound parameters per statement)
+MAX_ROWS_PER_STATEMENT = 500
+
+def counter_for(status: str) -> str:
+    if status == "rendering":
+        return "pages_rendering"
+    if status in ("rendered", "approved"):
+        return "pages_rendered"
+    if status == "failed_system":
+        return "pages_failed"
+    return "pages_pending"
+
+def job_status(pending: int, rendering: int, failed: int) -> str:
+    """
+    Job status from its handwritten page counters. JOB_STATUS_SQL is the
+    same rule for the batched UPDATE.
+    """
+    if rendering > 0:
+        return "rendering"
+    if pending == 0 and failed == 0:
+        return "rendered"
+    return "partial"
+
+# Pipelined jobs are still planning; JobPipeline.finish sets their status.
+# Cancelled jobs stay cancelled until new work resumes them
+# (HandwritingRenderer._mark_rendering and _submit_prediction).
+JOB_STATUS_SQL = (
+    "CASE WHEN jobs.status IN ('pipelining', 'cancelled') THEN jobs.status "
+    "WHEN jobs.pages_rendering + {rendering} > 0 THEN 'rendering' "
+    "WHEN jobs.pages_pending + {pending} = 0 AND jobs.pages_failed + {failed} = 0 THEN 'rendered' "
+    "ELSE 'partial' END"
+)
+
+def _values(conn, columns: dict, rows: list):
+    """
+    "(VALUES (...), ...) AS v" for rows of {column: value}, its bind
+    parameters, and the expression that reads each column back from v.
+    columns maps names to SQLAlchemy types. SQLite cannot alias VALUES
+    columns (they are column1..N) and Postgres needs casts to type them.
+    """
+    names = list(columns)
+    params = [
+        bindparam(f"{name}_{i}", row[name], type_=columns[name])
+        for i, row in enumerate(rows) for name in names
+    ]
+    tuples = ", ".join(
+        "(" + ", ".join(f":{name}_{i}" for name in names) + ")" for i in range(len(rows))
+    )
+    if conn.dialect.name == "postgresql":
+        clause = f"(VALUES {tuples}) AS v ({', '.join(names)})"
+        columns_sql = {
+            name: f"CAST(v.{name} AS {type_.compile(dialect=conn.dialect)})" for name, type_ in columns.items()
+        }
+    else:
+        clause = f"(VALUES {tuples}) AS v"
+        columns_sql = {name: f"v.column{n}" for n, name in enumerate(names, 1)}
+    return clause, params, columns_sql
+
+class PageStatusWriter:
+    """
+    Write-behind buffer for page render status.
+
+    The renderer stages transitions here instead of committing each page.
+    A background thread flushes every PAGE_WRITE_FLUSH_MS (sooner once
+    PAGE_WRITE_BATCH_SIZE pages are waiting): one multi-row
+    UPDATE ... FROM (VALUES ...) for the pages, one for the job counters
+    and statuses, in a single transaction. The last staged values of a
+    page win.
+
+    Page and job events are published after the flush commits, so a
+    client never sees a status the database does not have yet. Anything
+    that looks pages up by what was just staged (webhook by prediction
+    id, job status) calls flush() first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Flushes apply in staging order
+        self.rows = {}  # page id -> {field: value}
+        self.deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))  # job id -> counter deltas
+        self.events = []  # (job id, page event data)
+        self.flushing = {}  # rows of the flush in progress
+        self.thread = None
+
+    def set_status(self, page: Page, status: str, **fields):
+        """
+        Stage a status change (and any other PAGE_FIELDS) for the page.
+        The ORM object is updated in place but not marked dirty: its
+        session will not write it.
+        """
+        loaded_status = page.status
+        fields["status"] = status
+        row = {name: fields.get(name, getattr(page, name)) for name in PAGE_FIELDS}
+        row["id"] = page.id
+        for name in PAGE_FIELDS:
+            set_committed_value(page, name, row[name])
+
+        with self.lock:
+            staged = self.rows.get(page.id) or self.flushing.get(page.id)
+            previous = staged["status"] if staged else loaded_status
+            self.rows[page.id] = row
+            if counter_for(previous) != counter_for(status):
+                self.deltas[page.job_id][counter_for(previous)] -= 1
+                self.deltas[page.job_id][counter_for(status)] += 1
+            self.events.append((page.job_id, {
+                "page_number": page.page_number,
+                "status": status,
+                "render_profile": row["render_profile"],
+                "image_url": row["image_url"]
+            }))
+            full = len(self.rows) >= settings.PAGE_WRITE_BATCH_SIZE
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="page-writes", daemon=True)
+                self.thread.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write everything staged so far. Returns the number of pages written.
+        On failure the rows go back into the buffer for the next flush.
+        """
+        with self.flush_lock:
+            with self.lock:
+                rows, deltas, events = self.rows, self.deltas, self.events
+                self.rows, self.deltas, self.events = {}, defaultdict(lambda: dict.fromkeys(COUNTERS, 0)), []
+                self.flushing = rows
+            if not rows:
+                return 0
+            try:
+                with metrics.timed("page_writes"), engine.begin() as conn:
+                    changed = self._write(conn, list(rows.values()), deltas)
+            except Exception:
+                with self.lock:
+                    for page_id, row in rows.items():
+                        self.rows.setdefault(page_id, row)
+                    for job_id, delta in deltas.items():
+                        for counter, value in delta.items():
+                            self.deltas[job_id][counter] += value
+                    self.events = events + self.events
+                raise
+            finally:
+                with self.lock:
+                    self.flushing = {}
+
+        for job_id, data in events:
+            bus.publish(job_id, "page", data)
+        for job_id, status in changed:
+            bus.publish(job_id, "stage", {"status": status})
+        return len(rows)
+
+    def _write(self, conn, rows: list, deltas: dict) -> list:
+        page_columns = {"id": Page.__table__.c.id.type}
+        page_columns.update({name: Page.__table__.c[name].type for name in PAGE_FIELDS})
+        for start in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+            clause, params, v = _values(conn, page_columns, rows[start:start + MAX_ROWS_PER_STATEMENT])
+            assignments = ", ".join(f"{name} = {v[name]}" for name in PAGE_FIELDS)
+            # Raw SQL skips the ORM's onupdate: set updated_at (status ETags use it)
+            conn.execute(text(
+                f"UPDATE pages SET {assignments}, updated_at = CURRENT_TIMESTAMP "
+                f"FROM {clause} WHERE pages.id = {v['id']}"
+            ).bindparams(*params))
+
+        job_rows = [{"id": job_id, **delta} for job_id, delta in deltas.items() if any(delta.values())]
+        if not job_rows:
+            return []
+        job_ids = [row["id"] for row in job_rows]
+        before = dict(conn.execute(
+            text("SELECT id, status FROM jobs WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": job_ids}
+        ).all())
+
+        job_columns = {"id": Job.__table__.c.id.type}
+        job_columns.update({name: Job.__table__.c[name].type for name in COUNTERS})
+        for start in range(0, len(job_rows), MAX_ROWS_PER_STATEMENT):
+            clause, params, v = _values(conn, job_columns, job_rows[start:start + MAX_ROWS_PER_STATEMENT])
+            assignments = ", ".join(f"{name} = jobs.{name} + {v[name]}" for name in COUNTERS)
+            status_sql = JOB_STATUS_SQL.format(
+                pending=v["pages_pending"], rendering=v["pages_rendering"], failed=v["pages_failed"]
+            )
+            conn.execute(text(
+                f"UPDATE jobs SET {assignments}, status = {status_sql} "
+                f"FROM {clause} WHERE jobs.id = {v['id']}"
+            ).bindparams(*params))
+
+        after = conn.execute(
+            text("SELECT id, status FROM jobs WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            {"ids": job_ids}
+        ).all()
+        return [(job_id, status) for job_id, status in after if before.get(job_id) != status]
+
+    def _run(self):
+        while True:
+            time.sleep(settings.PAGE_WRITE_FLUSH_MS / 1000)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Page Writes: Flush failed, will retry - {e}")
+
+page_writes = PageStatusWriter()
@@ -0,0 +1,309 @@
+import io
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from PIL import Image
+from app.core.config import settings, POPPLER_PATH
+from app.core.database import SessionLocal
+from app.models.job import Job
+from app.models.page import Page
+from app.services.extractor import GoogleOCR
+from app.services.planner import PlannerService
+from app.services.renderer import HandwritingRenderer
+from app.services.events import bus
+from app.services.scheduler import INTERACTIVE, BULK
+from app.core import cancellation, metrics, tracing
+from app.core.cancellation import JobCancelled
+
+class JobPipeline:
+    """
+    Runs a job as a DAG of page-level tasks instead of stage by stage:
+
+        rasterize(n) -> extract(n)                        input page n
+        rasterize(window) -> plan(window) -> render(page)  each planned page
+
+    A planning window starts as soon as its source pages are rasterized,
+    and each planned page is submitted for rendering as soon as its window
+    is saved, so extraction, planning and rendering overlap. Planner calls
+    run concurrently; windows are saved in order to keep handwritten page
+    numbers sequential.
+
+    The run is cancellable (see app/core/cancellation.py): every task checks
+    the job's token before it starts, and a cancelled run stops without
+    touching the job status, which the cancel itself sets.
+
+    The stage methods (rasterize, extract_page, plan_window, save_window,
+    render_page) are the unit of work; scripts/bench_pipeline.py times the
+    scheduler with simulated stages.
+    """
+
+    def __init__(self, job_id: str, layout_config: dict, profile: str = "final", extract: bool = True):
+        self.job_id = job_id
+        self.layout_config = layout_config
+        self.profile = profile
+        self.extract = extract
+        self.file_path = None
+        self.input_type = None
+        self.user_id = None
+        self.reader_lock = threading.Lock()
+        self.reader = None
+
+    def start(self):
+        # The thread continues the caller's trace (create_job); a cancel
+        # before it gets going still stops it
+        with cancellation.scope(self.job_id):
+            threading.Thread(target=tracing.wrap(self.run), name=f"pipeline-{self.job_id}", daemon=True).start()
+
+    def run(self):
+        with cancellation.scope(self.job_id), tracing.span(
+            "pipeline", job_id=self.job_id, profile=self.profile, extract=self.extract
+        ):
+            self._run()
+
+    def _run(self):
+        started = time.time()
+        pools = []
+        try:
+            cancellation.check()
+            page_count = self.load_job()
+            window_size = max(1, settings.PIPELINE_WINDOW_PAGES)
+            windows = [
+                list(range(first, min(first + window_size, page_count + 1)))
+                for first in range(1, page_count + 1, window_size)
+            ]
+
+            raster_pool = ThreadPoolExecutor(settings.PIPELINE_RASTER_WORKERS, thread_name_prefix="pipeline-raster")
+            provider_pool = ThreadPoolExecutor(settings.PIPELINE_PROVIDER_WORKERS, thread_name_prefix="pipeline-provider")
+            render_pool = ThreadPoolExecutor(settings.PIPELINE_RENDER_WORKERS, thread_name_prefix="pipeline-render")
+            pools = [raster_pool, provider_pool, render_pool]
+
+            # Page images are dropped once every task that reads them is done
+            rasters = {n: tracing.submit(raster_pool, self.rasterize, n) for n in range(1, page_count + 1)}
+            readers = {n: (2 if self.extract else 1) for n in rasters}
+            readers_lock = threading.Lock()
+
+            def release(pages):
+                with readers_lock:
+                    for n in pages:
+                        readers[n] -= 1
+                        if readers[n] == 0:
+                            rasters.pop(n, None)
+
+            def extract_task(n):
+                try:
+                    cancellation.check()
+                    image = rasters[n].result()
+                    with tracing.span("extract.page", page_number=n, bytes=len(image)):
+                        self.extract_page(n, image)
+                finally:
+                    release([n])
+
+            def plan_task(window):
+                try:
+                    cancellation.check()
+                    images = [rasters[n].result() for n in window]
+                    with tracing.span(
+                        "plan.window", first_page=window[0], last_page=window[-1], bytes=sum(len(i) for i in images)
+                    ) as s:
+                        contents = self.plan_window(images, window[0] == 1)
+                        s.set_attribute("pages", len(contents))
+                        return contents
+                finally:
+                    release(window)
+
+            # Submitted window by window so the provider pool works front to back
+            extracts = []
+            plans = []
+            for window in windows:
+                if self.extract:
+                    extracts += [tracing.submit(provider_pool, extract_task, n) for n in window]
+                plans.append(tracing.submit(provider_pool, plan_task, window))
+
+            renders = []
+            next_page = 1
+            for window, plan in zip(windows, plans):
+                contents = plan.result()
+                cancellation.check()
+                page_ids = self.save_window(next_page, contents)
+                print(f"Pipeline {self.job_id}: Source pages {window[0]}-{window[-1]} -> {len(page_ids)} handwritten pages")
+                next_page += len(page_ids)
+                renders += [tracing.submit(render_pool, self.render_page, page_id) for page_id in page_ids]
+
+            for future in extracts + renders:
+                future.result()
+
+            self.finish(page_count)
+            print(f"Pipeline {self.job_id}: Done in {time.time() - started:.1f}s ({next_page - 1} pages submitted)")
+        except JobCancelled:
+            print(f"Pipeline {self.job_id}: Cancelled after {time.time() - started:.1f}s")
+            self.stopped()
+        except Exception as e:
+            print(f"Pipeline {self.job_id}: FAILED - {e}")
+            self.fail(e)
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- Stages ---
+
+    def load_job(self) -> int:
+        """
+        Mark the job as pipelining and return its source page count.
+        """
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == self.job_id).first()
+            if not job or not job.original_file_path:
+                raise Exception("Job has no original file path.")
+            self.file_path = job.original_file_path
+            self.input_type = job.input_type
+            self.user_id = job.user_id
+
+            if self.file_path.lower().endswith(".pdf"):
+                from pypdf import PdfReader
+                self.reader = PdfReader(self.file_path)
+                page_count = len(self.reader.pages)
+            else:
+                page_count = 1
+
+            job.layout_config = self.layout_config
+            job.status = "pipelining"
+            db.commit()
+        finally:
+            db.close()
+        bus.publish(self.job_id, "stage", {"status": "pipelining", "source_pages": page_count})
+        return page_count
+
+    def rasterize(self, page_number: int) -> bytes:
+        with metrics.timed("rasterization", self.input_type, "poppler"):
+            if self.reader is not None:
+                from pdf2image import convert_from_path
+                img = convert_from_path(
+                    self.file_path, first_page=page_number, last_page=page_number, poppler_path=POPPLER_PATH
+                )[0]
+            else:
+                img = Image.open(self.file_path)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG")
+            return buf.getvalue()
+
+    def extract_page(self, page_number: int, image: bytes):
+        if self.input_type == "text_pdf":
+            with self.reader_lock:
+                content = self.reader.pages[page_number - 1].extract_text()
+            source = "pypdf"
+        else:
+            content = GoogleOCR.process_file(image, is_pdf=False, input_type=self.input_type)[0]["content"]
+            source = "google_ocr_pdf_page" if self.reader is not None else "google_ocr_image"
+
+        db = SessionLocal()
+        try:
+            db.add(Page(
+                id=str(uuid.uuid4()),
+                job_id=self.job_id,
+                user_id=self.user_id,
+                page_number=page_number,
+                status="completed",
+                content=content,
+                source=source,
+                structure_map={}
+            ))
+            db.commit()
+        finally:
+            db.close()
+        metrics.count_pages("extracted", self.input_type)
+        bus.publish(self.job_id, "page", {"page_type": "input", "page_number": page_number, "status": "completed"})
+
+    def plan_window(self, images: List[bytes], first_window: bool = False) -> List[str]:
+        # The first window holds the pages the user sees first
+        return PlannerService.plan_window(
+            [PlannerService.image_to_base64(image) for image in images],
+            self.layout_config,
+            self.user_id,
+            INTERACTIVE if first_window else BULK,
+            self.input_type
+        )
+
+    def save_window(self, first_page_number: int, contents: List[str]) -> List[str]:
+        """
+        Insert one window's handwritten pages. Returns their ids.
+        """
+        page_ids = [str(uuid.uuid4()) for _ in contents]
+        db = SessionLocal()
+        try:
+            db.add_all([
+                Page(
+                    id=page_id,
+                    job_id=self.job_id,
+                    user_id=self.user_id,
+                    page_number=first_page_number + i,
+                    page_type="handwritten",
+                    content=content,
+                    char_count=len(content),
+                    source="gpt4o_vision_layout_engine",
+                    status="planned"
+                )
+                for i, (page_id, content) in enumerate(zip(page_ids, contents))
+            ])
+            db.query(Job).filter(Job.id == self.job_id).update(
+                {Job.pages_pending: Job.pages_pending + len(page_ids)}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        metrics.count_pages("planned", self.input_type, len(page_ids))
+        for i in range(len(page_ids)):
+            bus.publish(self.job_id, "page", {"page_number": first_page_number + i, "status": "planned"})
+        return page_ids
+
+    def render_page(self, page_id: str):
+        db = SessionLocal()
+        try:
+            page = db.query(Page).filter(Page.id == page_id).first()
+            HandwritingRenderer.render_page(page, db, profile=self.profile)
+        except JobCancelled:
+            raise
+        except Exception as e:
+            # Page is already failed_system; the job finishes as partial
+            print(f"Pipeline {self.job_id}: Render submit failed - {e}")
+        finally:
+            db.close()
+
+    def finish(self, source_pages: int):
+        cancellation.check()
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == self.job_id).first()
+            if self.extract:
+                job.total_pages = source_pages
+            job.status = "planned"
+            db.commit()
+            HandwritingRenderer._refresh_job_status(self.job_id, db)
+        finally:
+            db.close()
+
+    def stopped(self):
+        # load_job may have set pipelining after the cancel did its update
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == self.job_id, Job.status == "pipelining").update(
+                {Job.status: "cancelled"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def fail(self, error: Exception):
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == self.job_id).first()
+            if job:
+                job.status = "failed"
+                db.commit()
+        finally:
+            db.close()
+        bus.publish(self.job_id, "stage", {"status": "failed", "error": str(error)})
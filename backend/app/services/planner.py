@@ -8,8 +8,11 @@ from app.core.config import settings, POPPLER_PATH
 from sqlalchemy.orm import Session
 from app.models.job import Job
 from app.models.page import Page
-from openai import OpenAI
-from pdf2image import convert_from_path
+from app.services.ratelimit import limiter, ProviderUnavailable
+from app.services.events import bus
+from app.services.page_writes import page_writes
+from app.services.scheduler import scheduler, INTERACTIVE
+from app.core import cancellation, metrics, tracing
 from PIL import Image
 
 # Default Handwriting Reference (Generic Cursive)
@@ -39,11 +42,13 @@ class PlannerService:
             
         # 2. Convert Source to Images (Base64)
         print(f"Planner: Loading file {file_path}...")
-        source_images_b64 = PlannerService._file_to_base64_images(file_path)
+        with metrics.timed("rasterization", job.input_type, "poppler"):
+            source_images_b64 = PlannerService._file_to_base64_images(file_path)
         print(f"Planner: Converted to {len(source_images_b64)} images.")
         
-        # 3. Call OpenAI (Vision Compiler)
-        plan_json = PlannerService._call_gpt4o_vision(source_images_b64, DEFAULT_REF_IMAGE)
+        # 3. Call OpenAI (Vision Compiler); the user is waiting on this request
+        with scheduler.slot("plan", INTERACTIVE, job.user_id):
+            plan_json = PlannerService._call_gpt4o_vision(source_images_b64, DEFAULT_REF_IMAGE, input_type=job.input_type)
         print("Planner: Received Vision Response.")
         
         # 4. Save Output Pages
@@ -81,6 +86,8 @@ class PlannerService:
         job.status = "planned"
         db.commit()
         print(f"Planner: Saved {len(created_pages)} output pages.")
+        metrics.count_pages("planned", job.input_type, len(created_pages))
+        bus.publish(job_id, "stage", {"status": "planned", "total_pages": len(created_pages)})
         return len(created_pages)
 
     @staticmethod
@@ -93,6 +100,7 @@ class PlannerService:
         # Determine type
         lower_path = file_path.lower()
         if lower_path.endswith(".pdf"):
+            from pdf2image import convert_from_path
             images = convert_from_path(file_path)
             # Limit pages for V1 to prevent token overflow (e.g., max 5)
             # User constraint: "Compiler". But 20 page PDF might fail API limits.
@@ -115,11 +123,33 @@ class PlannerService:
                 
         return b64_list
 
+    @staticmethod
+    def image_to_base64(jpeg_bytes: bytes) -> str:
+        return base64.b64encode(jpeg_bytes).decode("utf-8")
+
+    @staticmethod
+    def plan_window(
+        source_images_b64: List[str], layout_config: dict, user_id: str, work_class: str, input_type: str = ""
+    ) -> List[str]:
+        """
+        Plan a window of source pages on its own (pipelined jobs).
+        Returns the handwritten page contents in order.
+        """
+        with scheduler.slot("plan", work_class, user_id):
+            plan_json = PlannerService._call_gpt4o_vision(source_images_b64, DEFAULT_REF_IMAGE, layout_config, input_type)
+        return [p.get("content", "") for p in plan_json.get("pages", [])]
+
     @staticmethod
     def replan_job(job_id: str, db: Session, layout_config: dict):
         """
         Phase 5: Re-Plan based on Layout Constraints.
+        Raises JobCancelled if the job is cancelled before the new pages are saved.
         """
+        with cancellation.scope(job_id):
+            return PlannerService._replan_job(job_id, db, layout_config)
+
+    @staticmethod
+    def _replan_job(job_id: str, db: Session, layout_config: dict):
         print(f"Planner: Re-planning Job {job_id} with layout: {layout_config}")
         
         # 1. Get Job & File
@@ -132,13 +162,19 @@ class PlannerService:
             raise Exception(f"File not found on disk: {file_path}")
             
         # 2. Convert Source
-        source_images_b64 = PlannerService._file_to_base64_images(file_path)
+        with metrics.timed("rasterization", job.input_type, "poppler"):
+            source_images_b64 = PlannerService._file_to_base64_images(file_path)
         
-        # 3. Call OpenAI (Layout Engine)
-        plan_json = PlannerService._call_gpt4o_vision(source_images_b64, DEFAULT_REF_IMAGE, layout_config)
+        # 3. Call OpenAI (Layout Engine); the user is waiting on this request
+        with scheduler.slot("plan", INTERACTIVE, job.user_id):
+            plan_json = PlannerService._call_gpt4o_vision(source_images_b64, DEFAULT_REF_IMAGE, layout_config, job.input_type)
         
         # 4. Replace Pages
         # Type: "handwritten" (Phase 5 requirement)
+        # A cancel during the call keeps the current pages
+        cancellation.check()
+        # Staged writes for the old pages must not land on the new counters
+        page_writes.flush()
         db.query(Page).filter(
             Page.job_id == job_id, 
             Page.page_type.in_(["output", "handwritten"])
@@ -165,16 +201,22 @@ class PlannerService:
         # Update Job Config
         job.layout_config = layout_config
         job.status = "planned"
+        job.pages_pending = len(created_pages)
+        job.pages_rendering = job.pages_rendered = job.pages_failed = 0
         db.commit()
+        metrics.count_pages("planned", job.input_type, len(created_pages))
+        bus.publish(job_id, "stage", {"status": "planned", "total_pages": len(created_pages)})
         return len(created_pages)
 
     @staticmethod
-    def _call_gpt4o_vision(source_b64s: List[str], ref_image_url: str, layout_config: dict = None) -> dict:
+    def _call_gpt4o_vision(source_b64s: List[str], ref_image_url: str, layout_config: dict = None, input_type: str = "") -> dict:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise Exception("OPENAI_API_KEY not set.")
             
-        client = OpenAI(api_key=api_key)
+        # Retries are owned by the provider limiter, not the SDK
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key, max_retries=0)
         
         # 1. System Prompt (Phase 5)
         system_prompt = """
@@ -263,17 +305,26 @@ Return ONLY JSON.
         
         last_error = None
         for attempt in range(2):
+            cancellation.check()
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_content}
-                    ],
-                    response_format={"type": "json_object"},
-                    max_tokens=4000,
-                    temperature=0
-                )
+                with metrics.timed("planner", input_type, "openai"), limiter.guard("openai"):
+                    response = client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_content}
+                        ],
+                        response_format={"type": "json_object"},
+                        max_tokens=4000,
+                        temperature=0
+                    )
+                    usage = getattr(response, "usage", None)
+                    if usage:
+                        tracing.set_attributes(
+                            prompt_tokens=usage.prompt_tokens,
+                            completion_tokens=usage.completion_tokens,
+                            source_images=len(source_b64s)
+                        )
                 
                 content_str = response.choices[0].message.content
                 data = json.loads(content_str)
@@ -283,6 +334,9 @@ Return ONLY JSON.
                     
                 return data
                 
+            except ProviderUnavailable:
+                # Circuit open / quota exhausted: fail fast, no retry storm
+                raise
             except Exception as e:
                 print(f"Planner visual attempt {attempt+1} failed: {e}")
                 last_error = e
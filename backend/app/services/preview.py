@@ -0,0 +1,106 @@
+import io
+import random
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List
+from PIL import Image, ImageDraw, ImageFont
+from app.core.config import settings
+from app.services.layout import HANDWRITING_SIZE_PX, page_size_px, line_height_px, capacity
+
+# Tried in order when PREVIEW_FONT_PATH is not set
+HANDWRITING_FONTS = [
+    "Caveat-Regular.ttf",
+    "IndieFlower-Regular.ttf",
+    "ComicNeue-Regular.ttf",
+    "segoepr.ttf",  # Segoe Print (Windows)
+    "comic.ttf",    # Comic Sans (Windows)
+    "DejaVuSans.ttf",
+]
+
+INK_COLOR = (25, 35, 95)
+RULE_COLOR = (205, 220, 240)
+
+@dataclass
+class PreviewResult:
+    png: bytes
+    lines_used: int
+    lines_available: int
+    overflow: bool
+
+@lru_cache(maxsize=8)
+def _load_font(size: int):
+    candidates = [settings.PREVIEW_FONT_PATH] if settings.PREVIEW_FONT_PATH else []
+    for name in candidates + HANDWRITING_FONTS:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+class PreviewRenderer:
+    """
+    Local, CPU-only stand-in for the diffusion render.
+    Same text, same LayoutConfig, same seed -> same image, in milliseconds.
+    It shows pagination and layout, not the final handwriting.
+    """
+
+    @staticmethod
+    def render_page(text: str, layout_config: dict, seed: int) -> PreviewResult:
+        width, height = page_size_px(layout_config["page_size"])
+        line_height = line_height_px(layout_config["line_spacing"])
+        font = _load_font(HANDWRITING_SIZE_PX)
+
+        # Content box (right margin mirrors the left one)
+        left = layout_config["margin_left"]
+        right = width - layout_config["margin_left"]
+        top = layout_config["margin_top"] + layout_config["header_space"]
+
+        lines = PreviewRenderer._wrap(text or "", font, right - left)
+        lines_available = capacity(layout_config).lines_per_page
+
+        img = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(img)
+        rng = random.Random(seed)
+
+        for i in range(lines_available):
+            y = top + (i + 1) * line_height
+            draw.line([(left, y), (right, y)], fill=RULE_COLOR, width=1)
+
+        for i, line in enumerate(lines[:lines_available]):
+            # Baseline sits on the ruled line; each line drifts a little
+            baseline = top + (i + 1) * line_height - 4 + rng.uniform(-1.5, 1.5)
+            x = left + rng.uniform(0, 3)
+            for word in line.split(" "):
+                if word:
+                    draw.text(
+                        (x + rng.uniform(-0.8, 0.8), baseline + rng.uniform(-1.2, 1.2)),
+                        word, font=font, fill=INK_COLOR, anchor="ls"
+                    )
+                x += font.getlength(word + " ") * rng.uniform(0.97, 1.05)
+
+        buf = io.BytesIO()
+        img.save(buf, format="PNG", compress_level=1)
+        return PreviewResult(
+            png=buf.getvalue(),
+            lines_used=len(lines),
+            lines_available=lines_available,
+            overflow=len(lines) > lines_available
+        )
+
+    @staticmethod
+    def _wrap(text: str, font, max_width: float) -> List[str]:
+        """
+        Greedy word wrap. Source line breaks are preserved.
+        """
+        lines = []
+        for paragraph in text.split("\n"):
+            current = ""
+            for word in paragraph.split():
+                candidate = f"{current} {word}" if current else word
+                if current and font.getlength(candidate) > max_width:
+                    lines.append(current)
+                    current = word
+                else:
+                    current = candidate
+            lines.append(current)
+        return lines
@@ -0,0 +1,201 @@
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from app.core.config import settings
+from app.core import metrics
+from app.core.database import SessionLocal
+from app.models.provider_state import ProviderState
+
+class ProviderUnavailable(Exception):
+    """
+    Raised instead of calling a provider whose circuit is open
+    (or whose quota window did not free up in time). Do not retry.
+    """
+    pass
+
+class ProviderGate:
+    """
+    Token bucket + circuit breaker for one external provider.
+
+    - Rate: PROVIDER_RPM / WORKER_COUNT, halved on every 429 and
+      recovered additively on success (AIMD).
+    - Retry-After / 429 blocks the provider for everyone until the window ends.
+    - CIRCUIT_FAILURE_THRESHOLD consecutive failures open the circuit for
+      CIRCUIT_RESET_SECONDS; the next call after that is a half-open probe.
+    - Block and circuit deadlines are mirrored to the provider_state table
+      so all workers back off together.
+    """
+
+    def __init__(self, name: str, rpm: int):
+        self.name = name
+        self.base_rate = max(rpm / max(settings.WORKER_COUNT, 1), 1) / 60.0
+        self.rate = self.base_rate
+        self.capacity = float(settings.PROVIDER_BURST)
+        self.tokens = self.capacity
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.circuit_open_until = 0.0
+        self.failures = 0
+        self.synced_at = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        deadline = time.time() + settings.PROVIDER_ACQUIRE_TIMEOUT_SECONDS
+
+        while True:
+            self._pull_shared()
+            with self.lock:
+                now = time.time()
+                if self.circuit_open_until > now:
+                    raise ProviderUnavailable(
+                        f"{self.name} circuit open for {self.circuit_open_until - now:.0f}s"
+                    )
+
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    self._refill()
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+
+            if now + wait > deadline:
+                raise ProviderUnavailable(f"{self.name} quota wait exceeds {settings.PROVIDER_ACQUIRE_TIMEOUT_SECONDS}s")
+            time.sleep(min(wait, settings.PROVIDER_STATE_SYNC_SECONDS))
+
+    def on_success(self):
+        with self.lock:
+            self.failures = 0
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+    def on_throttled(self, retry_after: float = None):
+        backoff = retry_after if retry_after is not None else settings.PROVIDER_DEFAULT_BACKOFF_SECONDS
+        with self.lock:
+            self.rate = max(self.base_rate * 0.1, self.rate / 2)
+            self.tokens = 0
+            self.blocked_until = max(self.blocked_until, time.time() + backoff)
+        print(f"RateLimit: {self.name} throttled, backing off {backoff:.1f}s (rate {self.rate * 60:.1f}/min)")
+        self._push_shared()
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures < settings.CIRCUIT_FAILURE_THRESHOLD:
+                return
+            self.circuit_open_until = time.time() + settings.CIRCUIT_RESET_SECONDS
+            # Half-open: a single failed probe re-opens immediately
+            self.failures = settings.CIRCUIT_FAILURE_THRESHOLD - 1
+        print(f"RateLimit: {self.name} circuit OPEN for {settings.CIRCUIT_RESET_SECONDS}s")
+        self._push_shared()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _pull_shared(self):
+        if time.time() - self.synced_at < settings.PROVIDER_STATE_SYNC_SECONDS:
+            return
+        self.synced_at = time.time()
+        db = SessionLocal()
+        try:
+            state = db.get(ProviderState, self.name)
+            if state:
+                with self.lock:
+                    self.blocked_until = max(self.blocked_until, state.blocked_until or 0)
+                    self.circuit_open_until = max(self.circuit_open_until, state.circuit_open_until or 0)
+        except Exception as e:
+            print(f"RateLimit: Could not read shared state for {self.name}: {e}")
+        finally:
+            db.close()
+
+    def _push_shared(self):
+        db = SessionLocal()
+        try:
+            state = db.get(ProviderState, self.name)
+            if not state:
+                state = ProviderState(provider=self.name, blocked_until=0, circuit_open_until=0)
+                db.add(state)
+            state.blocked_until = max(state.blocked_until or 0, self.blocked_until)
+            state.circuit_open_until = max(state.circuit_open_until or 0, self.circuit_open_until)
+            db.commit()
+        except Exception as e:
+            print(f"RateLimit: Could not write shared state for {self.name}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+class ProviderLimiter:
+    def __init__(self):
+        self.gates = {
+            "openai": ProviderGate("openai", settings.OPENAI_RPM),
+            "vision": ProviderGate("vision", settings.VISION_RPM),
+            "replicate": ProviderGate("replicate", settings.REPLICATE_RPM),
+            "supabase": ProviderGate("supabase", settings.SUPABASE_RPM),
+        }
+
+    @contextmanager
+    def guard(self, provider: str):
+        """
+        Wrap exactly one provider call:
+
+            with limiter.guard("openai"):
+                response = client.chat.completions.create(...)
+        """
+        gate = self.gates[provider]
+        try:
+            gate.acquire()
+        except ProviderUnavailable:
+            metrics.PROVIDER_ERRORS.labels(provider, "unavailable").inc()
+            raise
+        try:
+            yield
+        except Exception as e:
+            status, retry_after = _classify_error(e)
+            metrics.provider_error(provider, status)
+            if status == 429:
+                gate.on_throttled(retry_after)
+            elif status is None or status >= 500:
+                gate.on_failure()
+            raise
+        else:
+            gate.on_success()
+
+def _classify_error(e: Exception):
+    """
+    Pull (HTTP status, Retry-After seconds) out of the assorted SDK errors:
+    openai (status_code), replicate (status), google.api_core (code),
+    httpx.HTTPStatusError (response.status_code).
+    """
+    response = getattr(e, "response", None)
+    status = None
+    for candidate in (
+        getattr(e, "status_code", None),
+        getattr(e, "status", None),
+        getattr(e, "code", None),
+        getattr(response, "status_code", None),
+    ):
+        if isinstance(candidate, int):
+            status = int(candidate)
+            break
+
+    retry_after = None
+    headers = getattr(response, "headers", None)
+    if headers is not None:
+        retry_after = _parse_retry_after(headers.get("retry-after"))
+    return status, retry_after
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except Exception:
+        return None
+
+limiter = ProviderLimiter()
@@ -1,157 +1,526 @@
 import os
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import List
 import httpx
-import replicate
 from sqlalchemy.orm import Session
 from app.models.job import Job
 from app.models.page import Page
 from app.core.config import settings
+from app.core.database import SessionLocal
+from app.services.ratelimit import limiter, ProviderUnavailable
+from app.services.preview import PreviewRenderer, PreviewResult
+from app.services.layout import render_size_px
+from app.services.events import bus
+from app.services.page_writes import page_writes, job_status
+from app.services.scheduler import scheduler, INTERACTIVE, BULK
+from app.core import cancellation, metrics, tracing
+from app.core.cancellation import JobCancelled
 
 # Supabase Storage Config
 SUPABASE_URL = settings.SUPABASE_URL
 SUPABASE_KEY = settings.SUPABASE_KEY
 STORAGE_BUCKET = "rendered-pages"  # Create this bucket in Supabase
 
+RENDER_MODEL = "stability-ai/stable-diffusion-3.5-medium"
+MAX_SYSTEM_RETRIES = 2
+
+# Render profiles. Output size = job page size at the profile DPI.
+# Seeds do not depend on the profile, so a final re-render of a draft
+# keeps its composition.
+RENDER_PROFILES = {
+    "draft": {"num_inference_steps": 12, "dpi": 72},   # A4 -> 576x832
+    "final": {"num_inference_steps": 28, "dpi": 120},  # A4 -> 1024x1408
+}
+
 class HandwritingRenderer:
     """
     Phase 6: Dumb, deterministic factory.
     Systems retry failures. Humans retry preferences.
+
+    Rendering is asynchronous: render_page only creates a Replicate
+    prediction and records its id on the Page. Completion arrives through
+    the webhook endpoint (or poll_pending as a fallback) and is handled
+    by complete_prediction.
+
+    Page status changes go through page_writes (batched, see
+    PageStatusWriter); job status follows from its page counters.
+
+    Runs are cancellable (cancel_job): the job's token is checked between
+    pages and before each Replicate call.
     """
     
     @staticmethod
-    def render_job(job_id: str, db: Session) -> int:
+    def render_job(job_id: str, db: Session, profile: str = "final") -> int:
         """
-        Render all unrendered handwritten pages for a job.
-        Sequential. No parallelism.
+        Submit all unrendered handwritten pages for a job.
+        Returns the number of predictions created. Raises JobCancelled if
+        the job is cancelled part way.
         """
+        with cancellation.scope(job_id):
+            return HandwritingRenderer._render_job(job_id, db, profile)
+    
+    @staticmethod
+    def _render_job(job_id: str, db: Session, profile: str) -> int:
         print(f"Renderer: Starting job {job_id}")
         
         job = db.query(Job).filter(Job.id == job_id).first()
         if not job:
             raise Exception("Job not found.")
             
+        # Done pages are excluded by the query (ix_pages_job_unrendered)
         pages = db.query(Page).filter(
             Page.job_id == job_id,
-            Page.page_type == "handwritten"
+            Page.page_type == "handwritten",
+            Page.status.notin_(["rendered", "approved"])
         ).order_by(Page.page_number).all()
+        if pages:
+            HandwritingRenderer._mark_rendering(job_id, db)
         
-        rendered_count = 0
+        submitted_count = 0
         
         for page in pages:
-            if page.status in ["rendered", "approved"]:
-                print(f"  Page {page.page_number}: Already done. Skipping.")
+            if page.status == "rendering":
+                print(f"  Page {page.page_number}: Already in flight. Skipping.")
                 continue
+            cancellation.check()
                 
             try:
-                HandwritingRenderer.render_page(page, db)
-                rendered_count += 1
+                HandwritingRenderer.render_page(page, db, profile=profile)
+                submitted_count += 1
+            except JobCancelled:
+                raise
             except Exception as e:
                 print(f"  Page {page.page_number}: FAILED - {e}")
-                # Status already set to failed_system in render_page
+                # Status already set to failed_system in _submit_prediction
+        
+        # One write for the whole job, then the job status from its counters
+        HandwritingRenderer._refresh_job_status(job_id, db)
         
-        # Update Job
-        all_pages = db.query(Page).filter(
+        print(f"Renderer: Submitted {submitted_count} pages.")
+        return submitted_count
+    
+    @staticmethod
+    def render_previews(job_id: str, db: Session, layout_config: dict) -> List[dict]:
+        """
+        Preview mode: lay out every handwritten page locally (PIL, no
+        Replicate). Page status is left alone; images are served on demand.
+        """
+        pages = db.query(Page).filter(
             Page.job_id == job_id,
             Page.page_type == "handwritten"
-        ).all()
+        ).order_by(Page.page_number).all()
         
-        all_done = all(p.status in ["rendered", "approved"] for p in all_pages)
-        job.status = "rendered" if all_done else "partial"
-        db.commit()
+        previews = []
+        for page in pages:
+            result = HandwritingRenderer.render_preview_page(page, layout_config)
+            previews.append({
+                "page_number": page.page_number,
+                "lines_used": result.lines_used,
+                "lines_available": result.lines_available,
+                "overflow": result.overflow
+            })
+        return previews
+    
+    @staticmethod
+    def render_preview_page(page: Page, layout_config: dict) -> PreviewResult:
+        seed = HandwritingRenderer._generate_seed(page)
+        return PreviewRenderer.render_page(page.content, layout_config, seed)
+    
+    @staticmethod
+    def upgrade_job(job_id: str, db: Session) -> int:
+        """
+        One-click draft -> final: re-render every rendered draft page at
+        the final profile with the seed it was drafted with. Approved
+        pages are left alone: a re-render would come back as rendered and
+        drop the user's approval.
+        """
+        with cancellation.scope(job_id):
+            return HandwritingRenderer._upgrade_job(job_id, db)
+    
+    @staticmethod
+    def _upgrade_job(job_id: str, db: Session) -> int:
+        pages = db.query(Page).filter(
+            Page.job_id == job_id,
+            Page.page_type == "handwritten",
+            Page.render_profile == "draft",
+            Page.status == "rendered"
+        ).order_by(Page.page_number).all()
+        if pages:
+            HandwritingRenderer._mark_rendering(job_id, db)
+        
+        submitted_count = 0
+        for page in pages:
+            cancellation.check()
+            print(f"  Upgrading Page {page.page_number} to final...")
+            page.render_profile = "final"
+            page.render_attempts += 1
+            page.system_attempts = 0
+            try:
+                HandwritingRenderer._submit_prediction(page, db)
+                submitted_count += 1
+            except JobCancelled:
+                raise
+            except Exception as e:
+                print(f"  Page {page.page_number}: FAILED - {e}")
         
-        print(f"Renderer: Finished. Rendered {rendered_count} pages.")
-        return rendered_count
+        HandwritingRenderer._refresh_job_status(job_id, db)
+        return submitted_count
     
     @staticmethod
-    def render_page(page: Page, db: Session, is_user_retry: bool = False):
+    def render_page(page: Page, db: Session, is_user_retry: bool = False, profile: str = "final"):
         """
-        Render a single page. System auto-retries for failures only.
+        Start rendering a single page. Returns once the prediction exists.
         """
-        print(f"  Rendering Page {page.page_number}...")
-        page.status = "rendering"
-        db.commit()
+        if profile not in RENDER_PROFILES:
+            raise ValueError(f"Unknown render profile: {profile}")
+        print(f"  Rendering Page {page.page_number} ({profile})...")
         
-        # Step 1: Lock Seed
-        seed = HandwritingRenderer._generate_seed(page, is_user_retry)
-        page.render_seed = seed
-        page.render_attempts += 1
-        
-        # Step 2: Build Prompt
-        prompt = HandwritingRenderer._build_prompt(page.content)
-        
-        # Step 3: Build Payload
-        payload = {
-            "prompt": prompt,
-            "width": 1024,
-            "height": 1408,
-            "seed": seed,
-            "num_inference_steps": 28,
-            "guidance_scale": 7.5,
-            "negative_prompt": (
-                "printed font, typeset text, decorations, "
-                "calligraphy, artistic style, blur, skewed lines"
-            )
-        }
+        with cancellation.scope(page.job_id), tracing.span(
+            "render.page", job_id=page.job_id, page_number=page.page_number,
+            profile=profile, user_retry=is_user_retry, chars=page.char_count
+        ):
+            # Step 1: Lock Seed
+            seed = HandwritingRenderer._generate_seed(page, is_user_retry)
+            page.render_seed = seed
+            page.render_profile = profile
+            page.render_attempts += 1
+            page.system_attempts = 0
+            
+            # Step 2: Create prediction (system retries reuse the seed)
+            HandwritingRenderer._submit_prediction(page, db, HandwritingRenderer._work_class(page, is_user_retry))
+    
+    @staticmethod
+    def complete_prediction(page: Page, prediction: dict, db: Session):
+        """
+        Handle a finished prediction (webhook or poller).
+        Success: relay the image to Supabase and mark the page rendered.
+        Failure: system retry with the same seed until attempts run out.
+        """
+        with tracing.span(
+            "render.complete", job_id=page.job_id, page_number=page.page_number,
+            prediction_id=prediction.get("id"), prediction_status=prediction.get("status")
+        ):
+            HandwritingRenderer._complete_prediction(page, prediction, db)
+    
+    @staticmethod
+    def _complete_prediction(page: Page, prediction: dict, db: Session):
+        status = prediction.get("status")
+        
+        if page.status != "rendering" or page.prediction_id != prediction.get("id"):
+            # Duplicate or stale delivery
+            return
+        if status in ["starting", "processing"]:
+            return
         
-        # Step 4: Call Replicate (with system retry for hard failures)
-        max_system_retries = 2
-        last_error = None
+        print(f"  Completing Page {page.page_number} ({status})...")
+        error = prediction.get("error")
         
-        for attempt in range(max_system_retries):
+        if status == "succeeded":
             try:
-                print(f"    System Attempt {attempt + 1}...")
-                
-                output = replicate.run(
-                    "stability-ai/stable-diffusion-3.5-medium",
-                    input=payload
-                )
+                image_url = HandwritingRenderer._extract_image_url(prediction.get("output"))
                 
-                # Validate: Image exists
-                if not output or (isinstance(output, list) and len(output) == 0):
-                    raise SystemError("Empty output from Replicate.")
-                
-                image_url = output[0] if isinstance(output, list) else output
-                
-                if not image_url or not isinstance(image_url, str):
-                    raise SystemError("Invalid image URL from Replicate.")
-                
-                # Step 5: Upload to Supabase Storage
+                # Upload to Supabase Storage
                 stored_url = HandwritingRenderer._upload_to_supabase(
                     image_url, 
                     page.job_id, 
                     page.page_number
                 )
                 
-                # Step 6: Persist
-                page.image_url = stored_url
-                page.status = "rendered"  # Awaits user approval
-                db.commit()
+                # Persist (awaits user approval)
+                page_writes.set_status(page, "rendered", image_url=stored_url)
+                metrics.count_pages("rendered", page.job.input_type)
                 print(f"    Success: {stored_url[:60]}...")
                 return
                 
-            except SystemError as e:
-                # System failure - auto retry allowed
-                print(f"    System Failure: {e}")
-                last_error = e
-                # Continue to next attempt
+            except Exception as e:
+                error = e
+        
+        print(f"    System Failure: {error}")
+        try:
+            HandwritingRenderer._submit_prediction(page, db, last_error=error)
+        except Exception as e:
+            print(f"  Page {page.page_number}: FAILED - {e}")
+    
+    @staticmethod
+    def poll_pending(db: Session) -> int:
+        """
+        Fallback for missed webhooks: ask Replicate about predictions that
+        have been in flight longer than RENDER_POLL_STALE_SECONDS.
+        Without a webhook URL every in-flight page is polled.
+        """
+        import replicate
+        # Pages submitted since the last flush are only in the write buffer
+        page_writes.flush()
+        query = db.query(Page).filter(
+            Page.status == "rendering",
+            Page.prediction_id.isnot(None)
+        )
+        if settings.REPLICATE_WEBHOOK_URL:
+            stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.RENDER_POLL_STALE_SECONDS)
+            query = query.filter(Page.prediction_submitted_at < stale_before)
+        
+        completed = 0
+        for page in query.all():
+            try:
+                with limiter.guard("replicate"):
+                    prediction = replicate.predictions.get(page.prediction_id)
+            except ProviderUnavailable as e:
+                print(f"  Poll Skipped: {e}")
+                break
+            except Exception as e:
+                print(f"  Poll Error (page {page.page_number}): {e}")
+                continue
+            
+            if prediction.status in ["starting", "processing"]:
+                continue
                 
+            HandwritingRenderer.complete_prediction(page, {
+                "id": prediction.id,
+                "status": prediction.status,
+                "output": prediction.output,
+                "error": prediction.error
+            }, db)
+            completed += 1
+            
+        return completed
+    
+    @staticmethod
+    def user_retry_page(page: Page, db: Session):
+        """
+        User-initiated retry. Different seed for variation, same profile.
+        """
+        print(f"  User Retry: Page {page.page_number}...")
+        profile = page.render_profile or settings.DEFAULT_RENDER_PROFILE
+        HandwritingRenderer.render_page(page, db, is_user_retry=True, profile=profile)
+    
+    @staticmethod
+    def submit_pages(job_id: str, page_ids: List[str], is_user_retry: bool = False, profile: str = None) -> int:
+        """
+        Render a batch of the job's pages (bulk retry/render). Submissions run
+        PIPELINE_RENDER_WORKERS at a time, each with its own session, and
+        queue in the scheduler together; their status writes go out in one
+        flush. profile=None keeps each page's profile.
+        Returns the number of predictions created.
+        """
+        def submit(page_id: str) -> bool:
+            db = SessionLocal()
+            try:
+                page = db.query(Page).filter(Page.id == page_id).first()
+                page_profile = profile or page.render_profile or settings.DEFAULT_RENDER_PROFILE
+                HandwritingRenderer.render_page(page, db, is_user_retry=is_user_retry, profile=page_profile)
+                return True
+            except JobCancelled:
+                return False
             except Exception as e:
-                # Unexpected error - still a system failure
-                print(f"    Unexpected Error: {e}")
+                # Status already set to failed_system in _submit_prediction
+                print(f"  Page {page_id}: FAILED - {e}")
+                return False
+            finally:
+                db.close()
+        
+        db = SessionLocal()
+        try:
+            HandwritingRenderer._mark_rendering(job_id, db)
+        finally:
+            db.close()
+        
+        with cancellation.scope(job_id), \
+                ThreadPoolExecutor(settings.PIPELINE_RENDER_WORKERS, thread_name_prefix="render-batch") as pool:
+            futures = [tracing.submit(pool, submit, page_id) for page_id in page_ids]
+            submitted_count = sum(future.result() for future in futures)
+        
+        page_writes.flush()
+        return submitted_count
+    
+    @staticmethod
+    def _work_class(page: Page, is_user_retry: bool = False) -> str:
+        # User retries and the first page (what the user looks at first)
+        # go ahead of bulk pages in the render queue
+        return INTERACTIVE if is_user_retry or page.page_number == 1 else BULK
+    
+    @staticmethod
+    def _submit_prediction(page: Page, db: Session, work_class: str = None, last_error=None):
+        """
+        Create a Replicate prediction for the page's locked seed.
+        Counts against the system retry budget of the current render.
+        Waits for a render slot in the priority scheduler first. A cancel
+        leaves the page as it is and raises JobCancelled.
+        last_error: why the previous prediction failed (system retries),
+        reported if the budget is already spent.
+        """
+        import replicate
+        work_class = work_class or HandwritingRenderer._work_class(page)
+        payload = HandwritingRenderer._build_payload(page)
+        if page.job.status == "cancelled" and not cancellation.cancelled():
+            # New work after a cancel: the job status follows its pages again
+            HandwritingRenderer._refresh_job_status(page.job_id, db, resume=True)
+        
+        while page.system_attempts < MAX_SYSTEM_RETRIES:
+            page.system_attempts += 1
+            try:
+                print(f"    System Attempt {page.system_attempts}...")
+                
+                with scheduler.batch_slot(page.job.batch_id), scheduler.slot("render", work_class, page.user_id):
+                    cancellation.check()
+                    with metrics.timed("render_submit", page.job.input_type, "replicate"), \
+                            limiter.guard("replicate"):
+                        prediction = replicate.predictions.create(
+                            model=RENDER_MODEL,
+                            input=payload,
+                            **HandwritingRenderer._webhook_params()
+                        )
+                if cancellation.cancelled():
+                    # Cancelled while the prediction was being created:
+                    # cancel_job may already have swept the job's pages
+                    HandwritingRenderer._cancel_prediction(prediction.id)
+                    raise JobCancelled(page.job_id)
+                
+                page_writes.set_status(
+                    page, "rendering",
+                    prediction_id=prediction.id,
+                    prediction_submitted_at=datetime.now(timezone.utc)
+                )
+                print(f"    Submitted prediction {prediction.id}")
+                return
+                
+            except JobCancelled:
+                raise
+            except ProviderUnavailable as e:
+                # Circuit open: fail fast instead of burning retries
+                print(f"    Provider Unavailable: {e}")
+                last_error = e
+                break
+            except Exception as e:
+                print(f"    Submit Error: {e}")
                 last_error = e
         
         # All system attempts failed
-        page.status = "failed_system"
-        db.commit()
+        page_writes.set_status(page, "failed_system")
         raise Exception(f"Page {page.page_number} failed (system): {last_error}")
     
     @staticmethod
-    def user_retry_page(page: Page, db: Session):
+    def cancel_job(job_id: str, db: Session) -> dict:
         """
-        User-initiated retry. Different seed for variation.
+        Stop all work on a job. Runs and replans (in any worker) stop at
+        their next check and queued submits leave the scheduler; in-flight
+        pages go back to planned at once and their predictions are
+        cancelled on Replicate in the background, where possible. Rendered
+        pages are kept. The job stays cancelled until new work is submitted.
         """
-        print(f"  User Retry: Page {page.page_number}...")
-        HandwritingRenderer.render_page(page, db, is_user_retry=True)
+        # This worker at once, the others through the event bus
+        cancellation.cancel(job_id)
+        bus.publish(job_id, "stage", {"status": "cancelling"})
+        
+        # Release the pages first: a late webhook for a released prediction
+        # no longer finds its page, so the Replicate cancels can wait
+        page_writes.flush()
+        pages = db.query(Page).filter(
+            Page.job_id == job_id,
+            Page.page_type == "handwritten",
+            Page.status == "rendering"
+        ).all()
+        prediction_ids = [page.prediction_id for page in pages if page.prediction_id]
+        for page in pages:
+            page_writes.set_status(page, "planned", prediction_id=None, prediction_submitted_at=None)
+        page_writes.flush()
+        
+        job = db.query(Job).filter(Job.id == job_id).populate_existing().first()
+        job.status = "cancelled"
+        db.commit()
+        bus.publish(job_id, "stage", {"status": "cancelled"})
+        
+        if prediction_ids:
+            pool = ThreadPoolExecutor(
+                min(len(prediction_ids), settings.PIPELINE_RENDER_WORKERS), thread_name_prefix="render-cancel"
+            )
+            for prediction_id in prediction_ids:
+                tracing.submit(pool, HandwritingRenderer._cancel_prediction, prediction_id)
+            pool.shutdown(wait=False)
+        print(f"Renderer: Cancelled job {job_id} ({len(pages)} pages released, {len(prediction_ids)} predictions cancelling)")
+        return {"predictions_cancelling": len(prediction_ids), "pages_released": len(pages)}
+    
+    @staticmethod
+    def _cancel_prediction(prediction_id: str) -> bool:
+        import replicate
+        try:
+            with limiter.guard("replicate"):
+                replicate.predictions.cancel(prediction_id)
+            return True
+        except Exception as e:
+            # Already finished, or Replicate is unreachable
+            print(f"    Cancel of prediction {prediction_id} failed: {e}")
+            return False
+    
+    @staticmethod
+    def _build_payload(page: Page) -> dict:
+        profile = RENDER_PROFILES[page.render_profile or "final"]
+        page_size = (page.job.layout_config or {}).get("page_size", "A4")
+        width, height = render_size_px(page_size, profile["dpi"])
+        return {
+            "prompt": HandwritingRenderer._build_prompt(page.content),
+            "width": width,
+            "height": height,
+            "seed": page.render_seed,
+            "num_inference_steps": profile["num_inference_steps"],
+            "guidance_scale": 7.5,
+            "negative_prompt": (
+                "printed font, typeset text, decorations, "
+                "calligraphy, artistic style, blur, skewed lines"
+            )
+        }
+    
+    @staticmethod
+    def _webhook_params() -> dict:
+        if not settings.REPLICATE_WEBHOOK_URL:
+            return {}
+        return {
+            "webhook": settings.REPLICATE_WEBHOOK_URL,
+            "webhook_events_filter": ["completed"]
+        }
+    
+    @staticmethod
+    def _extract_image_url(output) -> str:
+        # Validate: Image exists
+        if not output or (isinstance(output, list) and len(output) == 0):
+            raise SystemError("Empty output from Replicate.")
+        
+        image_url = output[0] if isinstance(output, list) else output
+        
+        if not image_url or not isinstance(image_url, str):
+            raise SystemError("Invalid image URL from Replicate.")
+        return image_url
+    
+    @staticmethod
+    def _mark_rendering(job_id: str, db: Session):
+        # Submits can wait for render slots before any page is rendering:
+        # the job is rendering (and cancellable) from the start.
+        # _refresh_job_status settles it once the submits are done.
+        updated = db.query(Job).filter(
+            Job.id == job_id, Job.status.notin_(["pipelining", "rendering"])
+        ).update({Job.status: "rendering"}, synchronize_session=False)
+        db.commit()
+        if updated:
+            bus.publish(job_id, "stage", {"status": "rendering"})
+    
+    @staticmethod
+    def _refresh_job_status(job_id: str, db: Session, resume: bool = False):
+        # Counters are current once the write buffer is flushed
+        page_writes.flush()
+        job = db.query(Job).filter(Job.id == job_id).populate_existing().first()
+        if not job or job.status == "pipelining":
+            # Pipelined jobs are still planning; JobPipeline.finish sets the status
+            return
+        if job.status == "cancelled" and not resume:
+            # Only new work resumes a cancelled job (_mark_rendering, _submit_prediction)
+            return
+        
+        previous = job.status
+        job.status = job_status(job.pages_pending, job.pages_rendering, job.pages_failed)
+        db.commit()
+        if job.status != previous:
+            bus.publish(job_id, "stage", {"status": job.status})
     
     @staticmethod
     def _generate_seed(page: Page, include_attempt: bool = False) -> int:
@@ -194,11 +563,15 @@ Text:
         Returns the public URL.
         """
         # Download image from Replicate
-        response = httpx.get(image_url)
+        with limiter.guard("replicate"):
+            response = httpx.get(image_url)
+            if response.status_code == 429 or response.status_code >= 500:
+                response.raise_for_status()
         if response.status_code != 200:
             raise SystemError(f"Failed to download image: {response.status_code}")
         
         image_bytes = response.content
+        tracing.set_attributes(bytes=len(image_bytes))
         
         if len(image_bytes) == 0:
             raise SystemError("Downloaded image is empty (0 bytes).")
@@ -213,7 +586,10 @@ Text:
             "x-upsert": "true"  # Overwrite if exists
         }
         
-        upload_response = httpx.post(upload_url, content=image_bytes, headers=headers)
+        with metrics.timed("storage_upload", provider="supabase"), limiter.guard("supabase"):
+            upload_response = httpx.post(upload_url, content=image_bytes, headers=headers)
+            if upload_response.status_code == 429 or upload_response.status_code >= 500:
+                upload_response.raise_for_status()
         
         if upload_response.status_code not in [200, 201]:
             raise SystemError(f"Supabase upload failed: {upload_response.text}")
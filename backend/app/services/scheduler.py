@@ -0,0 +1,215 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from app.core.config import settings
+from app.core import cancellation
+
+# Work classes, most urgent first
+INTERACTIVE = "interactive" # User retries, first pages, synchronous replans
+BULK = "bulk" # Remaining pages of render and pipeline runs
+WORK_CLASSES = [INTERACTIVE, BULK]
+
+class _Waiter:
+    __slots__ = ("work_class", "user_id", "enqueued_at")
+
+    def __init__(self, work_class: str, user_id: str):
+        self.work_class = work_class
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+
+class PriorityGate:
+    """
+    A fixed number of slots for one kind of provider work, handed out by
+    priority instead of arrival order:
+
+    1. Fair share: while other users wait, a user holding
+       ceil(slots / active users) slots is served last.
+    2. Class: interactive before bulk. A bulk waiter older than
+       SCHEDULER_AGING_SECONDS counts as interactive, so nothing starves.
+    3. Then the user with fewer slots held, then the oldest waiter.
+
+    Queue wait per class is kept for the last WAIT_SAMPLES grants.
+
+    A waiter whose job is cancelled (the current cancellation token) leaves
+    the queue at once with JobCancelled.
+    """
+
+    WAIT_SAMPLES = 1000
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(slots, 1)
+        self.cond = threading.Condition()
+        self.waiting = []
+        self.running = 0
+        self.user_running = defaultdict(int)
+        self.waits = {c: deque(maxlen=self.WAIT_SAMPLES) for c in WORK_CLASSES}
+        self.granted = {c: 0 for c in WORK_CLASSES}
+
+    @contextmanager
+    def slot(self, work_class: str, user_id: str):
+        if work_class not in WORK_CLASSES:
+            raise ValueError(f"Unknown work class: {work_class}")
+        waiter = _Waiter(work_class, user_id)
+        token = cancellation.current()
+        with self.cond:
+            self.waiting.append(waiter)
+            self.cond.notify_all()
+            # Timed wait: aging can reorder the queue without any release
+            while self.running >= self.slots or self._next() is not waiter:
+                if token is not None and token.cancelled:
+                    self.waiting.remove(waiter)
+                    self.cond.notify_all()
+                    raise cancellation.JobCancelled(token.job_id)
+                self.cond.wait(timeout=1.0)
+            self.waiting.remove(waiter)
+            self.running += 1
+            self.user_running[user_id] += 1
+            self.waits[work_class].append(time.monotonic() - waiter.enqueued_at)
+            self.granted[work_class] += 1
+            self.cond.notify_all()
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.running -= 1
+                self.user_running[user_id] -= 1
+                if not self.user_running[user_id]:
+                    del self.user_running[user_id]
+                self.cond.notify_all()
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def _next(self) -> _Waiter:
+        now = time.monotonic()
+        active_users = {w.user_id for w in self.waiting} | set(self.user_running)
+        share = math.ceil(self.slots / max(len(active_users), 1))
+
+        def key(w: _Waiter):
+            held = self.user_running.get(w.user_id, 0)
+            aged = now - w.enqueued_at >= settings.SCHEDULER_AGING_SECONDS
+            urgent = w.work_class == INTERACTIVE or aged
+            return (held >= share, not urgent, held, w.enqueued_at)
+
+        return min(self.waiting, key=key)
+
+    def stats(self) -> dict:
+        with self.cond:
+            now = time.monotonic()
+            classes = {}
+            for work_class in WORK_CLASSES:
+                waits = sorted(self.waits[work_class])
+                queued = [now - w.enqueued_at for w in self.waiting if w.work_class == work_class]
+                classes[work_class] = {
+                    "queued": len(queued),
+                    "oldest_queued_seconds": round(max(queued, default=0.0), 3),
+                    "granted": self.granted[work_class],
+                    "wait_p50_seconds": round(_percentile(waits, 0.50), 3),
+                    "wait_p95_seconds": round(_percentile(waits, 0.95), 3),
+                    "wait_max_seconds": round(waits[-1] if waits else 0.0, 3),
+                }
+            return {
+                "slots": self.slots,
+                "running": self.running,
+                "users_running": len(self.user_running),
+                "classes": classes
+            }
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+class BatchBudget:
+    """
+    Render submits in flight per batch, so one large batch shares a fixed
+    budget instead of filling every render slot. Taken before the render
+    gate, so a batch waiting on its own budget holds no shared slot.
+    Jobs outside a batch are not limited.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = max(slots, 1)
+        self.cond = threading.Condition()
+        self.batches = {}  # batch id -> [slots held, holders and waiters]
+
+    @contextmanager
+    def slot(self, batch_id: str):
+        if batch_id is None:
+            yield
+            return
+        token = cancellation.current()
+        with self.cond:
+            entry = self.batches.setdefault(batch_id, [0, 0])
+            entry[1] += 1
+            try:
+                while entry[0] >= self.slots:
+                    if token is not None and token.cancelled:
+                        raise cancellation.JobCancelled(token.job_id)
+                    self.cond.wait(timeout=1.0)
+            except BaseException:
+                self._leave(batch_id, entry)
+                raise
+            entry[0] += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                entry[0] -= 1
+                self._leave(batch_id, entry)
+
+    def _leave(self, batch_id: str, entry: list):
+        # Called with self.cond held
+        entry[1] -= 1
+        if not entry[1]:
+            del self.batches[batch_id]
+        self.cond.notify_all()
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {"slots_per_batch": self.slots, "active_batches": len(self.batches)}
+
+class WorkScheduler:
+    """
+    Priority gates for shared provider capacity: "render" (Replicate
+    prediction submits) and "plan" (GPT-4o planner calls), plus the
+    per-batch render budget.
+
+        with scheduler.batch_slot(batch_id), scheduler.slot("render", INTERACTIVE, user_id):
+            ...
+    """
+
+    def __init__(self):
+        self.gates = {
+            "render": PriorityGate("render", settings.SCHEDULER_RENDER_SLOTS),
+            "plan": PriorityGate("plan", settings.SCHEDULER_PLAN_SLOTS),
+        }
+        self.batches = BatchBudget(settings.BATCH_RENDER_SLOTS)
+        # Cancelled waiters leave the queues without waiting for a release
+        cancellation.on_cancel(self.wake)
+
+    def slot(self, kind: str, work_class: str, user_id: str):
+        return self.gates[kind].slot(work_class, user_id)
+
+    def batch_slot(self, batch_id: str):
+        return self.batches.slot(batch_id)
+
+    def wake(self):
+        for gate in self.gates.values():
+            gate.wake()
+        self.batches.wake()
+
+    def stats(self) -> dict:
+        stats = {kind: gate.stats() for kind, gate in self.gates.items()}
+        stats["batches"] = self.batches.stats()
+        return stats
+
+scheduler = WorkScheduler()
@@ -1,9 +1,5 @@
 import io
-import numpy as np
-import cv2
 from fastapi import UploadFile
-from PIL import Image
-from pypdf import PdfReader
 from dataclasses import dataclass
 
 @dataclass
@@ -17,11 +13,22 @@ async def segregate_input(content: str = None, file: UploadFile = None) -> Segre
     if not file:
         raise ValueError("File upload required. Pasted text is not supported.")
 
-    filename = file.filename.lower()
+    if file.filename.lower().endswith(".pdf"):
+        content_bytes = await file.read()
+        file.file.seek(0) # Reset pointer
+        return segregate_bytes(file.filename, content_bytes)
+    return segregate_bytes(file.filename, b"")
+
+def segregate_bytes(filename: str, content_bytes: bytes) -> SegregationResult:
+    """
+    Same rules for a file already in memory (batch members). Blocking:
+    the PDF text check parses the first pages.
+    """
+    filename = filename.lower()
     
     # CASE 1 & 2: PDF
     if filename.endswith(".pdf"):
-        return await _analyze_pdf(file)
+        return _analyze_pdf(content_bytes)
     
     # CASE 3: Image (Assumed Handwritten per 'Scenario 3')
     if filename.endswith((".jpg", ".jpeg", ".png", ".bmp", ".webp", ".heic")):
@@ -35,13 +42,20 @@ async def segregate_input(content: str = None, file: UploadFile = None) -> Segre
     
     raise ValueError(f"Unsupported file type: {filename}. Only PDF and Images allowed.")
 
-async def _analyze_pdf(file: UploadFile) -> SegregationResult:
-    # Read first few bytes/pages to check for text layer
-    content_bytes = await file.read()
-    file.file.seek(0) # Reset pointer
-    
+def segregate_file(filename: str, path: str) -> SegregationResult:
+    """
+    Same rules for a stored file, read from disk: only the pages the PDF
+    text check parses are loaded. Blocking.
+    """
+    if filename.lower().endswith(".pdf"):
+        return _analyze_pdf(path)
+    return segregate_bytes(filename, b"")
+
+def _analyze_pdf(source) -> SegregationResult:
+    # Read first few pages to check for text layer (source: bytes or a path)
+    from pypdf import PdfReader
     try:
-        reader = PdfReader(io.BytesIO(content_bytes))
+        reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
         has_text = False
         
         # Check first 3 pages
@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional, Tuple
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.job import Job
+from app.models.page import Page
+
+# Jobs in these states have no reusable input pages
+NOT_EXTRACTED = ["processing", "failed"]
+
+PARTIAL_DIR = "partial"
+PDF_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".heic")
+
+class UploadNotFound(Exception):
+    pass
+
+class UploadOffsetMismatch(Exception):
+    """
+    Chunk did not start where the stored bytes end; the client should
+    resume from `offset`.
+    """
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+def _looks_supported(ext: str, head: bytes) -> bool:
+    """
+    Magic-byte check on the leading bytes, so a bad upload is rejected on
+    its first chunk instead of after the last one.
+    """
+    if ext in PDF_EXTENSIONS:
+        return head.startswith(b"%PDF-")
+    if ext in (".jpg", ".jpeg"):
+        return head.startswith(b"\xff\xd8\xff")
+    if ext == ".png":
+        return head.startswith(b"\x89PNG\r\n\x1a\n")
+    if ext == ".bmp":
+        return head.startswith(b"BM")
+    if ext == ".webp":
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    if ext == ".heic":
+        return head[4:8] == b"ftyp"
+    return False
+
+# Per-process running SHA-256 of in-order chunks: upload_id -> (offset, hasher).
+# Lets finalize skip re-reading the file; rebuilt from disk when missing.
+_running_hashes = {}
+_upload_locks = defaultdict(threading.Lock)
+
+class UploadStore:
+    """
+    Content-addressed upload storage: uploads/<sha256><ext>.
+    Identical files are stored once and shared by every job that
+    references them through jobs.original_file_path.
+    Large files can arrive as resumable chunked uploads (uploads/partial/).
+    """
+
+    @staticmethod
+    def upload_dir() -> str:
+        path = os.path.join(os.getcwd(), settings.UPLOAD_DIR)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def hash_bytes(file_bytes: bytes) -> str:
+        return hashlib.sha256(file_bytes).hexdigest()
+
+    @staticmethod
+    def save(file_bytes: bytes, filename: str, file_hash: str = None) -> Tuple[str, str]:
+        """
+        Returns (file_hash, path). Writes only if the blob is new.
+        The extension is kept because the planner dispatches on it.
+        """
+        file_hash = file_hash or UploadStore.hash_bytes(file_bytes)
+        ext = os.path.splitext(os.path.basename(filename))[1].lower()
+        path = os.path.join(UploadStore.upload_dir(), f"{file_hash}{ext}")
+
+        if os.path.exists(path):
+            os.utime(path)  # Refresh mtime so GC grace restarts
+        else:
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(file_bytes)
+            os.replace(tmp_path, path)
+        return file_hash, path
+
+    # --- Resumable uploads ---
+    # uploads/partial/<upload_id>.part holds the bytes received so far (its
+    # size is the resume offset), <upload_id>.json the session metadata.
+
+    @staticmethod
+    def _partial_paths(upload_id: str) -> Tuple[str, str]:
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise UploadNotFound(upload_id)
+        partial_dir = os.path.join(UploadStore.upload_dir(), PARTIAL_DIR)
+        os.makedirs(partial_dir, exist_ok=True)
+        return (
+            os.path.join(partial_dir, f"{upload_id}.part"),
+            os.path.join(partial_dir, f"{upload_id}.json")
+        )
+
+    @staticmethod
+    def _load_session(upload_id: str, user_id: str) -> dict:
+        part_path, meta_path = UploadStore._partial_paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                session = json.load(f)
+        except FileNotFoundError:
+            raise UploadNotFound(upload_id)
+        if session["user_id"] != user_id:
+            raise UploadNotFound(upload_id)
+        session["offset"] = os.path.getsize(part_path)
+        return session
+
+    @staticmethod
+    def init_upload(user_id: str, filename: str, size: int, sha256: str = None) -> dict:
+        filename = os.path.basename(filename)
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in PDF_EXTENSIONS + IMAGE_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {filename}. Only PDF and Images allowed.")
+        if size <= 0 or size > settings.UPLOAD_MAX_BYTES:
+            raise ValueError(f"Upload size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes")
+
+        upload_id = str(uuid.uuid4())
+        part_path, meta_path = UploadStore._partial_paths(upload_id)
+        session = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": time.time()
+        }
+        open(part_path, "wb").close()
+        with open(meta_path, "w") as f:
+            json.dump(session, f)
+        session["offset"] = 0
+        return session
+
+    @staticmethod
+    def upload_status(upload_id: str, user_id: str) -> dict:
+        return UploadStore._load_session(upload_id, user_id)
+
+    @staticmethod
+    def write_chunk(upload_id: str, user_id: str, offset: int, data: bytes, checksum: str) -> dict:
+        """
+        Append one chunk at `offset` after verifying its SHA-256.
+        Chunks must arrive in order; a retry of an already stored chunk
+        gets UploadOffsetMismatch with the offset to resume from.
+        """
+        if hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise ValueError("Chunk checksum mismatch")
+
+        with _upload_locks[upload_id]:
+            session = UploadStore._load_session(upload_id, user_id)
+            if offset != session["offset"]:
+                raise UploadOffsetMismatch(session["offset"])
+            if offset + len(data) > session["size"]:
+                raise ValueError("Chunk exceeds declared upload size")
+
+            if offset == 0:
+                ext = os.path.splitext(session["filename"])[1].lower()
+                if not _looks_supported(ext, data[:16]):
+                    raise ValueError(f"File content does not match {ext}")
+
+            part_path, meta_path = UploadStore._partial_paths(upload_id)
+            with open(part_path, "ab") as f:
+                f.write(data)
+            os.utime(meta_path)  # Active sessions are not expired by GC
+
+            running = _running_hashes.get(upload_id)
+            if offset == 0:
+                running = (0, hashlib.sha256())
+            if running and running[0] == offset:
+                running[1].update(data)
+                _running_hashes[upload_id] = (offset + len(data), running[1])
+            else:
+                _running_hashes.pop(upload_id, None)
+
+            session["offset"] = offset + len(data)
+            return session
+
+    @staticmethod
+    def finalize_upload(upload_id: str, user_id: str) -> Tuple[str, str, str]:
+        """
+        Move a complete upload into content-addressed storage.
+        Returns (file_hash, path, filename).
+        """
+        with _upload_locks[upload_id]:
+            session = UploadStore._load_session(upload_id, user_id)
+            if session["offset"] != session["size"]:
+                raise UploadOffsetMismatch(session["offset"])
+
+            part_path, meta_path = UploadStore._partial_paths(upload_id)
+            running = _running_hashes.pop(upload_id, None)
+            if running and running[0] == session["size"]:
+                file_hash = running[1].hexdigest()
+            else:
+                hasher = hashlib.sha256()
+                with open(part_path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        hasher.update(block)
+                file_hash = hasher.hexdigest()
+
+            if session["sha256"] and session["sha256"] != file_hash:
+                raise ValueError("Upload checksum mismatch")
+
+            ext = os.path.splitext(session["filename"])[1].lower()
+            path = os.path.join(UploadStore.upload_dir(), f"{file_hash}{ext}")
+            if os.path.exists(path):
+                os.remove(part_path)
+                os.utime(path)
+            else:
+                os.replace(part_path, path)
+            os.remove(meta_path)
+        _upload_locks.pop(upload_id, None)
+        return file_hash, path, session["filename"]
+
+    @staticmethod
+    async def find_extracted_job(db: AsyncSession, file_hash: str) -> Optional[Job]:
+        """
+        Most recent job for the same bytes whose input pages exist.
+        """
+        return (await db.execute(
+            select(Job).where(
+                Job.file_hash == file_hash,
+                Job.status.notin_(NOT_EXTRACTED),
+                Job.total_pages > 0
+            ).order_by(Job.created_at.desc()).limit(1)
+        )).scalars().first()
+
+    @staticmethod
+    async def clone_input_pages(db: AsyncSession, source_job_id: str, job: Job) -> int:
+        """
+        Copy the source job's extracted input pages to a new job:
+        one projected SELECT, one multi-row INSERT.
+        """
+        source_pages = (await db.execute(
+            select(
+                Page.page_number, Page.status, Page.content,
+                Page.char_count, Page.source, Page.structure_map
+            ).where(
+                Page.job_id == source_job_id,
+                Page.page_type == "input"
+            ).order_by(Page.page_number)
+        )).all()
+
+        if not source_pages:
+            return 0
+
+        await db.execute(insert(Page), [
+            {
+                "id": str(uuid.uuid4()),
+                "job_id": job.id,
+                "user_id": job.user_id,
+                "page_number": p.page_number,
+                "status": p.status,
+                "content": p.content,
+                "page_type": "input",
+                "char_count": p.char_count,
+                "source": p.source,
+                "structure_map": p.structure_map,
+            }
+            for p in source_pages
+        ])
+        return len(source_pages)
+
+    @staticmethod
+    def collect_garbage(db: Session, grace_seconds: int = None) -> int:
+        """
+        Delete blobs no job references any more. Reference counts come
+        from jobs.original_file_path; files younger than the grace period
+        are kept (an upload may be saved before its job row commits).
+        """
+        grace_seconds = settings.UPLOAD_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        upload_dir = UploadStore.upload_dir()
+
+        ref_counts = dict(db.query(
+            Job.original_file_path, func.count(Job.id)
+        ).filter(Job.original_file_path.isnot(None)).group_by(Job.original_file_path).all())
+        referenced = {os.path.basename(p) for p, count in ref_counts.items() if count > 0}
+
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        for name in os.listdir(upload_dir):
+            path = os.path.join(upload_dir, name)
+            if name in referenced or not os.path.isfile(path):
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            os.remove(path)
+            removed += 1
+            print(f"Uploads GC: Removed {name}")
+
+        # Abandoned resumable uploads
+        partial_dir = os.path.join(upload_dir, PARTIAL_DIR)
+        if os.path.isdir(partial_dir):
+            session_cutoff = time.time() - settings.UPLOAD_SESSION_TTL_SECONDS
+            for name in os.listdir(partial_dir):
+                path = os.path.join(partial_dir, name)
+                if os.path.getmtime(path) < session_cutoff:
+                    os.remove(path)
+                    _running_hashes.pop(os.path.splitext(name)[0], None)
+                    removed += 1
+                    print(f"Uploads GC: Removed expired upload {name}")
+        return removed
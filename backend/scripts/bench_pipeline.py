@@ -0,0 +1,94 @@
+"""
+End-to-end time of a multi-page scanned job: stage-by-stage vs pipelined.
+
+Stages are simulated with fixed latencies (no providers, no DB) so the
+numbers show what the scheduling alone buys. Run from backend/:
+
+    python -m scripts.bench_pipeline --pages 12
+    python -m scripts.bench_pipeline --pages 30 --plan-base 6 --render 12
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from app.services.pipeline import JobPipeline
+
+class SimulatedPipeline(JobPipeline):
+    def __init__(self, args):
+        super().__init__("bench", {}, "final")
+        self.args = args
+        self.rendered_at = []
+
+    def load_job(self) -> int:
+        return self.args.pages
+
+    def rasterize(self, page_number: int) -> bytes:
+        time.sleep(self.args.raster)
+        return b"jpeg"
+
+    def extract_page(self, page_number: int, image: bytes):
+        time.sleep(self.args.ocr)
+
+    def plan_window(self, images, first_window=False):
+        time.sleep(self.args.plan_base + self.args.plan_per_page * len(images))
+        return ["text"] * len(images)
+
+    def save_window(self, first_page_number: int, contents):
+        return [f"page-{first_page_number + i}" for i in range(len(contents))]
+
+    def render_page(self, page_id: str):
+        # Submission plus prediction time: the page is done when this returns
+        time.sleep(self.args.render)
+        self.rendered_at.append(time.time())
+
+    def finish(self, source_pages: int):
+        pass
+
+    def fail(self, error: Exception):
+        raise error
+
+def run_stage_by_stage(args) -> float:
+    """
+    The pre-pipeline flow: create_job extracts every page (rasterize all,
+    then OCR page by page), /plan rasterizes again and plans the whole
+    document in one call, /render submits every page.
+    """
+    sim = SimulatedPipeline(args)
+    started = time.time()
+    images = [sim.rasterize(n) for n in range(1, args.pages + 1)]
+    for n, image in enumerate(images, 1):
+        sim.extract_page(n, image)
+    images = [sim.rasterize(n) for n in range(1, args.pages + 1)]
+    page_ids = sim.save_window(1, sim.plan_window(images))
+    with ThreadPoolExecutor(settings.PIPELINE_RENDER_WORKERS) as pool:
+        list(pool.map(sim.render_page, page_ids))
+    return max(sim.rendered_at) - started
+
+def run_pipelined(args) -> float:
+    sim = SimulatedPipeline(args)
+    started = time.time()
+    sim.run()
+    return max(sim.rendered_at) - started
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--raster", type=float, default=0.3, help="seconds per page")
+    parser.add_argument("--ocr", type=float, default=0.8, help="seconds per page")
+    parser.add_argument("--plan-base", type=float, default=4.0, help="seconds per planner call")
+    parser.add_argument("--plan-per-page", type=float, default=1.0, help="seconds per source page in a call")
+    parser.add_argument("--render", type=float, default=8.0, help="seconds per prediction")
+    parser.add_argument("--scale", type=float, default=0.1, help="multiply every latency (fast runs)")
+    args = parser.parse_args()
+    for name in ["raster", "ocr", "plan_base", "plan_per_page", "render"]:
+        setattr(args, name, getattr(args, name) * args.scale)
+
+    print(f"{args.pages} scanned pages, window {settings.PIPELINE_WINDOW_PAGES}, "
+          f"render workers {settings.PIPELINE_RENDER_WORKERS}, latency scale {args.scale}")
+    before = run_stage_by_stage(args)
+    print(f"  stage-by-stage: {before / args.scale:6.1f}s")
+    after = run_pipelined(args)
+    print(f"  pipelined:      {after / args.scale:6.1f}s  ({before / after:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Offline benchmark of create -> plan -> render against stub providers
+(scripts/stub_providers.py): real app, real DB (a throwaway SQLite file),
+no network. Reports throughput, p50/p99 latency and peak RSS per phase,
+plus the per-stage histograms (ocr, planner, render_submit, ...) from
+app.core.metrics, and writes everything to bench_results/ as JSON so runs
+can be compared across commits.
+
+Run from backend/:
+    python -m scripts.bench_stages --docs 8 --pages 4
+    python -m scripts.bench_stages --kinds scanned --latency openai=4:12 --errors replicate_run=0.05
+    python -m scripts.bench_stages --compare bench_results/<older>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+JWT_SECRET = "bench-secret"
+
+def configure_environment(workdir: str):
+    """
+    Settings are read at import: this must run before anything under app/ is imported.
+    """
+    os.chdir(workdir)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "SUPABASE_URL": "https://stub.supabase.local",
+        "SUPABASE_KEY": "stub",
+        "OPENAI_API_KEY": "stub",
+        "REPLICATE_WEBHOOK_URL": "",
+        "TRACE_EXPORTER": "",
+        # Provider quotas are not what is being measured
+        "OPENAI_RPM": "100000",
+        "VISION_RPM": "100000",
+        "REPLICATE_RPM": "100000",
+        "SUPABASE_RPM": "100000",
+        "PROVIDER_BURST": "1000",
+    })
+
+def git_revision(repo_dir: str) -> dict:
+    def run(*cmd):
+        try:
+            return subprocess.run(cmd, cwd=repo_dir, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+    return {
+        "commit": run("git", "rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(run("git", "status", "--porcelain", "--untracked-files=no")),
+    }
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+class RssSampler:
+    """
+    Samples resident memory in a background thread; peak() since the last reset().
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.current_peak = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def rss_bytes() -> int:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self.stop.is_set():
+            self.current_peak = max(self.current_peak, self.rss_bytes())
+            time.sleep(self.interval)
+
+    def start(self):
+        self.thread.start()
+
+    def reset(self):
+        self.current_peak = self.rss_bytes()
+
+    def peak(self) -> int:
+        return max(self.current_peak, self.rss_bytes())
+
+def stage_snapshot() -> dict:
+    """
+    {(stage, input_type, provider): {"count", "sum", "buckets": [(le, cumulative)]}}
+    """
+    from app.core import metrics
+    snapshot = {}
+    for family in metrics.STAGE_SECONDS.collect():
+        for sample in family.samples:
+            key = (sample.labels["stage"], sample.labels["input_type"], sample.labels["provider"])
+            entry = snapshot.setdefault(key, {"count": 0, "sum": 0.0, "buckets": []})
+            if sample.name.endswith("_count"):
+                entry["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+            elif sample.name.endswith("_bucket"):
+                entry["buckets"].append((float(sample.labels["le"]), sample.value))
+    return snapshot
+
+def _histogram_quantile(q: float, buckets: list) -> float:
+    # Linear interpolation inside the bucket, like PromQL histogram_quantile
+    total = buckets[-1][1]
+    if total <= 0:
+        return 0.0
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if upper_bound == float("inf"):
+                return lower_bound
+            span = count - lower_count
+            fraction = (rank - lower_count) / span if span else 0.0
+            return lower_bound + (upper_bound - lower_bound) * fraction
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+def stage_breakdown(before: dict, after: dict) -> dict:
+    breakdown = {}
+    for key, entry in after.items():
+        previous = before.get(key, {"count": 0, "sum": 0.0, "buckets": []})
+        count = entry["count"] - previous["count"]
+        if count <= 0:
+            continue
+        prior = dict(previous["buckets"])
+        buckets = [(le, value - prior.get(le, 0.0)) for le, value in sorted(entry["buckets"])]
+        breakdown["/".join(part or "-" for part in key)] = {
+            "count": int(count),
+            "mean": round((entry["sum"] - previous["sum"]) / count, 4),
+            "p50": round(_histogram_quantile(0.5, buckets), 4),
+            "p99": round(_histogram_quantile(0.99, buckets), 4),
+        }
+    return breakdown
+
+class RenderPoller:
+    """
+    The app's lifespan poller does not run under ASGITransport; this
+    stands in for it (poll_pending in a loop) while renders are in flight.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        from app.main import _poll_renders_once
+        while not self.stop.is_set():
+            try:
+                _poll_renders_once()
+            except Exception as e:
+                print(f"Bench Poller Error: {e}")
+            self.stop.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.thread.join()
+
+class StageBench:
+    def __init__(self, args, client, tokens: list, rss: RssSampler):
+        self.args = args
+        self.client = client
+        self.tokens = tokens
+        self.rss = rss
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+
+    def headers(self, doc: dict) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[doc['index'] % len(self.tokens)]}"}
+
+    async def run_phase(self, name: str, docs: list, step) -> dict:
+        """
+        step(doc) -> True on success. Latency per document; throughput over the phase.
+        """
+        latencies, failed = [], 0
+        before = stage_snapshot()
+        self.rss.reset()
+
+        async def one(doc):
+            nonlocal failed
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    ok = await step(doc)
+                except Exception as e:
+                    print(f"  {name} error ({doc['name']}): {e}")
+                    ok = False
+                latencies.append(time.perf_counter() - started)
+                if not ok:
+                    failed += 1
+                    doc["failed"] = name
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(doc) for doc in docs))
+        wall = time.perf_counter() - started
+        pages = sum(doc["pages"] for doc in docs)
+        return {
+            "docs": len(docs),
+            "pages": pages,
+            "failed": failed,
+            "wall_seconds": round(wall, 3),
+            "docs_per_second": round(len(docs) / wall, 3) if wall else 0.0,
+            "pages_per_second": round(pages / wall, 3) if wall else 0.0,
+            "latency": {
+                "p50": round(percentile(latencies, 0.50), 4),
+                "p99": round(percentile(latencies, 0.99), 4),
+                "max": round(max(latencies, default=0.0), 4),
+            },
+            "peak_rss_mb": round(self.rss.peak() / (1024 * 1024), 1),
+            "stages": stage_breakdown(before, stage_snapshot()),
+        }
+
+    async def create(self, doc: dict) -> bool:
+        response = await self.client.post(
+            "/jobs/create",
+            files={"file": (doc["name"], doc["bytes"], "application/pdf")},
+            headers=self.headers(doc)
+        )
+        if response.status_code != 200:
+            print(f"  create {doc['name']}: {response.status_code} {response.text[:200]}")
+            return False
+        body = response.json()
+        doc["job_id"] = body["job_id"]
+        return body.get("status") != "failed"
+
+    async def plan(self, doc: dict) -> bool:
+        response = await self.client.post(f"/jobs/{doc['job_id']}/plan", headers=self.headers(doc))
+        if response.status_code != 200:
+            print(f"  plan {doc['name']}: {response.status_code} {response.text[:200]}")
+            return False
+        return True
+
+    async def render(self, doc: dict) -> bool:
+        """
+        Submit, then wait for the job to reach a terminal render status.
+        """
+        response = await self.client.post(
+            f"/jobs/{doc['job_id']}/render",
+            params={"profile": self.args.profile},
+            headers=self.headers(doc)
+        )
+        if response.status_code != 200:
+            print(f"  render {doc['name']}: {response.status_code} {response.text[:200]}")
+            return False
+        deadline = time.perf_counter() + self.args.timeout
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.args.status_interval)
+            status = (await self.client.get(f"/jobs/{doc['job_id']}/status", headers=self.headers(doc))).json()
+            if status["status"] in ["rendered", "partial", "failed"]:
+                return status["status"] == "rendered"
+        print(f"  render {doc['name']}: timed out")
+        return False
+
+def build_documents(args) -> list:
+    from scripts.synthetic_docs import text_pdf, scanned_pdf
+    makers = {"text": text_pdf, "scanned": scanned_pdf}
+    kinds = args.kinds.split(",")
+    docs = []
+    for index in range(args.docs):
+        kind = kinds[index % len(kinds)]
+        # Distinct seeds: identical bytes would hit the upload dedup cache
+        docs.append({
+            "index": index,
+            "kind": kind,
+            "name": f"{kind}_{index}.pdf",
+            "pages": args.pages,
+            "bytes": makers[kind](args.pages, seed=index),
+        })
+    return docs
+
+async def run_bench(args, stubs, stubbed: dict) -> dict:
+    import httpx
+    from jose import jwt
+    from app.main import app
+    from app.core.database import engine, Base
+    from app.core.migrations import migrate
+
+    migrate(engine, Base)
+    tokens = [
+        jwt.encode(
+            {"sub": f"bench-user-{n}", "aud": "authenticated", "exp": time.time() + 86400},
+            JWT_SECRET, algorithm="HS256"
+        )
+        for n in range(args.users)
+    ]
+    docs = build_documents(args)
+    rss = RssSampler()
+    rss.start()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        bench = StageBench(args, client, tokens, rss)
+        by_kind = {}
+        for kind in sorted({doc["kind"] for doc in docs}):
+            kind_docs = [doc for doc in docs if doc["kind"] == kind]
+            results = {}
+            print(f"{kind}: {len(kind_docs)} docs x {args.pages} pages")
+            results["create"] = await bench.run_phase("create", kind_docs, bench.create)
+            live = [doc for doc in kind_docs if "failed" not in doc]
+            results["plan"] = await bench.run_phase("plan", live, bench.plan)
+            live = [doc for doc in live if "failed" not in doc]
+            with RenderPoller(args.poll_interval):
+                results["render"] = await bench.run_phase("render", live, bench.render)
+            for phase, result in results.items():
+                print(f"  {phase:<7} {result['pages_per_second']:8.2f} pages/s  "
+                      f"p50 {result['latency']['p50']:7.3f}s  p99 {result['latency']['p99']:7.3f}s  "
+                      f"rss {result['peak_rss_mb']:7.1f} MB  failed {result['failed']}")
+            by_kind[kind] = results
+
+    rss.stop.set()
+    return {
+        **git_revision(args.repo_dir),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "args": {k: v for k, v in vars(args).items() if k not in ["compare", "out", "repo_dir"]},
+        "stubs": {**stubs.describe(), **stubbed},
+        "results": by_kind,
+    }
+
+def compare(old: dict, new: dict):
+    """
+    Side-by-side of the headline numbers per kind and phase.
+    """
+    print(f"\nCompare {old.get('commit')} -> {new.get('commit')}")
+    if old.get("args") != new.get("args"):
+        print("  (warning: different arguments, numbers may not be comparable)")
+
+    def delta(a, b, lower_is_better=True):
+        if not a:
+            return "   n/a"
+        change = (b - a) / a * 100
+        worse = change > 0 if lower_is_better else change < 0
+        return f"{change:+6.1f}%{' !' if worse and abs(change) >= 10 else ''}"
+
+    for kind, phases in new["results"].items():
+        for phase, result in phases.items():
+            before = old.get("results", {}).get(kind, {}).get(phase)
+            if not before:
+                continue
+            print(f"  {kind}/{phase:<7} "
+                  f"p50 {delta(before['latency']['p50'], result['latency']['p50'])}  "
+                  f"p99 {delta(before['latency']['p99'], result['latency']['p99'])}  "
+                  f"pages/s {delta(before['pages_per_second'], result['pages_per_second'], False)}  "
+                  f"rss {delta(before['peak_rss_mb'], result['peak_rss_mb'])}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=8, help="documents per run (split across kinds)")
+    parser.add_argument("--pages", type=int, default=4, help="pages per document")
+    parser.add_argument("--kinds", default="text,scanned", help="text, scanned or both")
+    parser.add_argument("--concurrency", type=int, default=4, help="documents in flight per phase")
+    parser.add_argument("--users", type=int, default=2)
+    parser.add_argument("--profile", default="draft")
+    parser.add_argument("--latency", action="append", default=[], metavar="PROVIDER=MEDIAN:P99",
+                        help="e.g. openai=6:20 (seconds, before --scale)")
+    parser.add_argument("--errors", action="append", default=[], metavar="PROVIDER=RATE")
+    parser.add_argument("--throttles", action="append", default=[], metavar="PROVIDER=RATE")
+    parser.add_argument("--scale", type=float, default=0.05, help="multiply every provider latency")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="render poller interval")
+    parser.add_argument("--status-interval", type=float, default=0.1, help="client status poll interval")
+    parser.add_argument("--timeout", type=float, default=300, help="render wait per document")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results", help="directory for the JSON results")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+    args.repo_dir = os.getcwd()
+    out_dir = os.path.abspath(args.out)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+
+    import random
+    random.seed(args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="swrite-bench-")
+    sys.path.insert(0, args.repo_dir)
+    configure_environment(workdir)
+
+    from scripts.stub_providers import StubConfig, install
+    stubs = StubConfig.parse(args.latency, args.errors, args.throttles, scale=args.scale)
+    stubbed = install(stubs)
+    if "poppler" in stubbed["stubbed"]:
+        print("pdftoppm not found: rasterization is stubbed (embedded page images / blank pages)")
+
+    report = asyncio.run(run_bench(args, stubs, stubbed))
+
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(out_dir, f"{stamp}_{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults: {path}")
+
+    if compare_path:
+        with open(compare_path) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Local stand-in for the Replicate predictions API.
+
+Run:
+    uvicorn scripts.fake_replicate:app --port 8001
+
+Then point the backend at it:
+    REPLICATE_BASE_URL=http://localhost:8001 REPLICATE_API_TOKEN=fake
+
+Env knobs:
+    FAKE_REPLICATE_DELAY      seconds until a prediction completes (default 2)
+    FAKE_REPLICATE_FAIL_RATE  fraction of predictions that fail (default 0)
+"""
+import asyncio
+import io
+import os
+import random
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+from PIL import Image, ImageDraw
+
+app = FastAPI(title="Fake Replicate")
+
+DELAY = float(os.getenv("FAKE_REPLICATE_DELAY", "2"))
+FAIL_RATE = float(os.getenv("FAKE_REPLICATE_FAIL_RATE", "0"))
+
+PREDICTIONS = {}
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+async def _finish(prediction_id: str, base_url: str):
+    await asyncio.sleep(DELAY)
+    prediction = PREDICTIONS[prediction_id]
+    if prediction["status"] == "canceled":
+        return
+
+    if random.random() < FAIL_RATE:
+        prediction["status"] = "failed"
+        prediction["error"] = "Fake failure"
+    else:
+        prediction["status"] = "succeeded"
+        prediction["output"] = [f"{base_url}files/{prediction_id}.png"]
+    prediction["completed_at"] = _now()
+
+    webhook = prediction.pop("_webhook", None)
+    if webhook:
+        try:
+            async with httpx.AsyncClient() as client:
+                await client.post(webhook, json=_public(prediction))
+        except Exception as e:
+            print(f"Fake Replicate: webhook delivery failed: {e}")
+
+def _public(prediction: dict) -> dict:
+    return {k: v for k, v in prediction.items() if not k.startswith("_")}
+
+@app.post("/v1/models/{owner}/{name}/predictions", status_code=201)
+async def create_prediction(owner: str, name: str, request: Request):
+    body = await request.json()
+    prediction_id = uuid.uuid4().hex
+    prediction = {
+        "id": prediction_id,
+        "model": f"{owner}/{name}",
+        "version": "fake",
+        "status": "starting",
+        "input": body.get("input", {}),
+        "output": None,
+        "logs": "",
+        "error": None,
+        "metrics": {},
+        "created_at": _now(),
+        "started_at": None,
+        "completed_at": None,
+        "urls": {
+            "get": f"{request.base_url}v1/predictions/{prediction_id}",
+            "cancel": f"{request.base_url}v1/predictions/{prediction_id}/cancel"
+        },
+        "_webhook": body.get("webhook")
+    }
+    PREDICTIONS[prediction_id] = prediction
+    asyncio.create_task(_finish(prediction_id, str(request.base_url)))
+    return _public(prediction)
+
+@app.get("/v1/predictions/{prediction_id}")
+async def get_prediction(prediction_id: str):
+    if prediction_id not in PREDICTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    return _public(PREDICTIONS[prediction_id])
+
+@app.post("/v1/predictions/{prediction_id}/cancel")
+async def cancel_prediction(prediction_id: str):
+    if prediction_id not in PREDICTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    prediction = PREDICTIONS[prediction_id]
+    if prediction["status"] in ["starting", "processing"]:
+        prediction["status"] = "canceled"
+        prediction["completed_at"] = _now()
+    return _public(prediction)
+
+@app.get("/files/{prediction_id}.png")
+async def get_file(prediction_id: str):
+    if prediction_id not in PREDICTIONS:
+        raise HTTPException(status_code=404, detail="Not found")
+    payload = PREDICTIONS[prediction_id]["input"]
+    img = Image.new("RGB", (payload.get("width", 1024), payload.get("height", 1408)), "white")
+    ImageDraw.Draw(img).text((40, 40), payload.get("prompt", "")[:200], fill="black")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return Response(content=buf.getvalue(), media_type="image/png")
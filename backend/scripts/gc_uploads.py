@@ -0,0 +1,23 @@
+"""
+Remove uploaded files no job references (see app/services/uploads.py).
+
+Run from backend/ (e.g. from cron):
+    python -m scripts.gc_uploads              # default grace period
+    python -m scripts.gc_uploads 0            # no grace period
+"""
+import sys
+from app.core.database import SessionLocal
+from app.services.uploads import UploadStore
+import app.models.job, app.models.page, app.models.user, app.models.batch  # Register tables
+
+def main():
+    grace = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    db = SessionLocal()
+    try:
+        removed = UploadStore.collect_garbage(db, grace)
+        print(f"Uploads GC Complete. Removed {removed} file(s).")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
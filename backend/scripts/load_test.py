@@ -0,0 +1,421 @@
+"""
+HTTP load test for one app worker: how many concurrent uploads, status
+polls and retries it sustains before latency, errors or event-loop lag
+give out. Providers are the in-process stubs (scripts/stub_providers.py),
+auth is HS256 tokens signed with a test SUPABASE_JWT_SECRET.
+
+Closed-loop virtual users run a weighted mix of operations; concurrency
+steps up level by level and each level reports throughput, latency per
+operation and event-loop lag. The saturation point is where throughput
+stops growing or the SLO (p99, error rate, loop lag) breaks.
+
+Run from backend/, in-process (ASGITransport, same event loop):
+    python -m scripts.load_test --mix polling-heavy
+    python -m scripts.load_test --mix upload=1,poll=3 --levels 1,4,16,64
+
+Or against a real uvicorn worker over localhost:
+    python -m scripts.load_test serve --port 8765
+    python -m scripts.load_test --url http://127.0.0.1:8765 --mix retry-storm
+
+Mixes: upload-heavy, polling-heavy, retry-storm, or op=weight pairs
+(ops: upload, poll, retry).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+MIXES = {
+    "upload-heavy": {"upload": 0.7, "poll": 0.3},
+    "polling-heavy": {"upload": 0.05, "poll": 0.95},
+    "retry-storm": {"retry": 0.6, "poll": 0.4},
+}
+
+LAG_PATH = "/__load/lag"
+
+def parse_mix(spec: str) -> dict:
+    if spec in MIXES:
+        return MIXES[spec]
+    mix = {}
+    for part in spec.split(","):
+        op, _, weight = part.partition("=")
+        if op not in ["upload", "poll", "retry"]:
+            raise ValueError(f"Unknown operation: {op}")
+        mix[op] = float(weight or 1)
+    return mix
+
+def prepare(args) -> dict:
+    """
+    Throwaway database and workdir, settings and stub providers.
+    Must run before app.main is imported.
+    """
+    from scripts.bench_stages import configure_environment
+    sys.path.insert(0, os.getcwd())
+    configure_environment(tempfile.mkdtemp(prefix="swrite-load-"))
+    os.environ.update({
+        "SUPABASE_JWT_SECRET": args.jwt_secret,
+        "SUPABASE_URL": "",  # No JWKS refresh against a real project
+        "RENDER_POLL_INTERVAL_SECONDS": "1",
+        "RENDER_POLL_STALE_SECONDS": "0",
+    })
+
+    from scripts.stub_providers import StubConfig, install
+    stubs = StubConfig.parse(args.latency, args.errors, args.throttles, scale=args.scale)
+    stubbed = install(stubs)
+
+    from app.core.database import engine, Base
+    from app.core.migrations import migrate
+    import app.main  # noqa: F401 (registers every model)
+    migrate(engine, Base)
+    return {**stubs.describe(), **stubbed}
+
+def _summary(values: list) -> dict:
+    from scripts.bench_stages import percentile
+    return {
+        "p50": round(percentile(values, 0.50), 4),
+        "p95": round(percentile(values, 0.95), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "max": round(max(values, default=0.0), 4),
+    }
+
+class LoopLagMonitor:
+    """
+    Sleeps a fixed interval on the event loop and records how late it
+    wakes up: anything blocking the loop (sync work in async handlers,
+    CPU-heavy parsing) shows up as lag.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    def collect(self, reset: bool = True) -> dict:
+        samples, self.samples = self.samples, ([] if reset else self.samples)
+        summary = _summary([s * 1000 for s in samples])
+        return {"samples": len(samples), **{f"{k}_ms": round(v, 2) for k, v in summary.items()}}
+
+def serve(args):
+    """
+    One uvicorn worker with the stubs installed and the loop lag exposed at LAG_PATH.
+    """
+    import uvicorn
+    prepare(args)
+    from app.main import app
+
+    monitor = LoopLagMonitor()
+    app_lifespan = app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app_):
+        async with app_lifespan(app_):
+            monitor.start()
+            yield
+            monitor.stop()
+
+    def loop_lag(reset: bool = True):
+        return monitor.collect(reset)
+
+    app.router.lifespan_context = lifespan
+    app.add_api_route(LAG_PATH, loop_lag, methods=["GET"])
+    uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level="warning")
+
+class LoadTest:
+    def __init__(self, args, client, monitor: LoopLagMonitor = None):
+        from jose import jwt
+        self.args = args
+        self.client = client
+        self.monitor = monitor
+        self.mix = parse_mix(args.mix)
+        self.tokens = [
+            jwt.encode(
+                {"sub": f"load-user-{n}", "aud": "authenticated", "exp": time.time() + 86400},
+                args.jwt_secret, algorithm="HS256"
+            )
+            for n in range(args.users)
+        ]
+        self.jobs = {n: [] for n in range(args.users)}  # user -> seeded job ids
+        self.documents = []
+        self.next_document = 0
+
+    def headers(self, user: int) -> dict:
+        return {"Authorization": f"Bearer {self.tokens[user]}"}
+
+    def build_documents(self):
+        from scripts.synthetic_docs import text_pdf, scanned_pdf
+        make = scanned_pdf if self.args.upload_kind == "scanned" else text_pdf
+        # Past the pool, uploads repeat bytes and exercise the dedup path
+        self.documents = [make(self.args.upload_pages, seed=1000 + n) for n in range(self.args.document_pool)]
+
+    async def seed(self):
+        """
+        Rendered jobs for every user, so polls and retries have targets.
+        """
+        from scripts.synthetic_docs import text_pdf
+        # At least one per user: every virtual user needs something to poll
+        for n in range(max(self.args.seed_jobs, self.args.users)):
+            user = n % self.args.users
+            response = await self.client.post(
+                "/jobs/create",
+                files={"file": (f"seed_{n}.pdf", text_pdf(2, seed=n), "application/pdf")},
+                headers=self.headers(user)
+            )
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+            (await self.client.post(f"/jobs/{job_id}/plan", headers=self.headers(user))).raise_for_status()
+            (await self.client.post(f"/jobs/{job_id}/render", params={"profile": "draft"},
+                                    headers=self.headers(user))).raise_for_status()
+            self.jobs[user].append(job_id)
+
+        deadline = time.perf_counter() + 120
+        for user, job_ids in self.jobs.items():
+            for job_id in job_ids:
+                while time.perf_counter() < deadline:
+                    status = (await self.client.get(f"/jobs/{job_id}/status", headers=self.headers(user))).json()
+                    if status["status"] in ["rendered", "partial"]:
+                        break
+                    await asyncio.sleep(0.2)
+
+    # --- Operations: return the HTTP status ---
+
+    async def upload(self, user: int, state: dict) -> int:
+        document = self.documents[self.next_document % len(self.documents)]
+        self.next_document += 1
+        response = await self.client.post(
+            "/jobs/create",
+            files={"file": ("load.pdf", document, "application/pdf")},
+            headers=self.headers(user)
+        )
+        if response.status_code == 200:
+            state["own_jobs"].append(response.json()["job_id"])
+        return response.status_code
+
+    async def poll(self, user: int, state: dict) -> int:
+        # Clients remember the ETag per job, like the frontend does
+        candidates = state["own_jobs"][-5:] + self.jobs[user]
+        job_id = random.choice(candidates)
+        headers = self.headers(user)
+        if job_id in state["etags"]:
+            headers["If-None-Match"] = state["etags"][job_id]
+        response = await self.client.get(f"/jobs/{job_id}/status", headers=headers)
+        if "etag" in response.headers:
+            state["etags"][job_id] = response.headers["etag"]
+        return response.status_code
+
+    async def retry(self, user: int, state: dict) -> int:
+        job_id = random.choice(self.jobs[user])
+        page_number = random.randint(1, 2)
+        response = await self.client.post(f"/jobs/{job_id}/pages/{page_number}/retry", headers=self.headers(user))
+        return response.status_code
+
+    async def virtual_user(self, index: int, until: float, records: list):
+        user = index % self.args.users
+        state = {"own_jobs": [], "etags": {}}
+        ops, weights = list(self.mix), list(self.mix.values())
+        while time.perf_counter() < until:
+            op = random.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = await getattr(self, op)(user, state)
+            except Exception:
+                status = 0
+            records.append((op, time.perf_counter() - started, status))
+            if self.args.think_time:
+                await asyncio.sleep(random.expovariate(1 / self.args.think_time))
+
+    async def lag(self):
+        if self.monitor:
+            return self.monitor.collect()
+        response = await self.client.get(LAG_PATH, params={"reset": True})
+        return response.json() if response.status_code == 200 else None
+
+    async def run_level(self, concurrency: int) -> dict:
+        records = []
+        await self.lag()  # Reset
+        started = time.perf_counter()
+        until = started + self.args.step_seconds
+        await asyncio.gather(*(self.virtual_user(i, until, records) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+
+        operations = {}
+        for op in self.mix:
+            rows = [r for r in records if r[0] == op]
+            if not rows:
+                continue
+            operations[op] = {
+                "count": len(rows),
+                "rps": round(len(rows) / wall, 2),
+                "errors": sum(1 for r in rows if r[2] == 0 or r[2] >= 500),
+                "rejected": sum(1 for r in rows if 400 <= r[2] < 500),
+                "latency": _summary([r[1] for r in rows]),
+            }
+        errors = sum(1 for r in records if r[2] == 0 or r[2] >= 500)
+        return {
+            "concurrency": concurrency,
+            "requests": len(records),
+            "rps": round(len(records) / wall, 2),
+            "error_rate": round(errors / len(records), 4) if records else 0.0,
+            "latency": _summary([r[1] for r in records]),
+            "operations": operations,
+            "loop_lag": await self.lag(),
+        }
+
+def find_saturation(levels: list, args) -> dict:
+    """
+    Throughput plateau: doubling concurrency bought under 10% more requests/s.
+    SLO breach: p99 latency, error rate or loop lag over the limits.
+    """
+    plateau, breach, best = None, None, None
+    for level in levels:
+        if best and plateau is None and level["rps"] < best["rps"] * 1.1:
+            plateau = best["concurrency"]
+        if best is None or level["rps"] > best["rps"]:
+            best = level
+        reasons = []
+        if level["latency"]["p99"] > args.slo_p99:
+            reasons.append(f"p99 {level['latency']['p99']:.3f}s > {args.slo_p99}s")
+        if level["error_rate"] > args.slo_error_rate:
+            reasons.append(f"error rate {level['error_rate']:.2%} > {args.slo_error_rate:.2%}")
+        lag = level["loop_lag"]
+        if lag and lag["p99_ms"] > args.slo_lag_ms:
+            reasons.append(f"loop lag p99 {lag['p99_ms']}ms > {args.slo_lag_ms}ms")
+        if reasons and breach is None:
+            breach = {"concurrency": level["concurrency"], "reasons": reasons}
+    return {
+        "max_rps": best["rps"] if best else 0.0,
+        "max_rps_concurrency": best["concurrency"] if best else None,
+        "throughput_plateau_at": plateau,
+        "slo_breached_at": breach,
+    }
+
+def report(line: str = ""):
+    # The app prints per request; the harness writes past any redirect
+    print(line, file=sys.__stdout__, flush=True)
+
+async def run(args, stubs: dict) -> dict:
+    import httpx
+    limits = httpx.Limits(max_connections=max(args.levels) + 10, max_keepalive_connections=max(args.levels) + 10)
+    monitor = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.request_timeout, limits=limits)
+        lifespan = contextlib.nullcontext()
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=args.request_timeout
+        )
+        # ASGITransport skips lifespan: run it for the render poller and event bus
+        lifespan = app.router.lifespan_context(app)
+        monitor = LoopLagMonitor()
+
+    async with client, lifespan:
+        if monitor:
+            monitor.start()
+        test = LoadTest(args, client, monitor)
+        test.build_documents()
+        report(f"Seeding {max(args.seed_jobs, args.users)} rendered jobs...")
+        await test.seed()
+        report(f"Mix {test.mix}, {args.step_seconds}s per level")
+        report(f"{'conc':>5} {'rps':>8} {'p50':>8} {'p99':>8} {'err':>7} {'lag p99':>9}")
+
+        levels = []
+        for concurrency in args.levels:
+            level = await test.run_level(concurrency)
+            levels.append(level)
+            lag = level["loop_lag"]
+            report(f"{concurrency:>5} {level['rps']:>8.1f} {level['latency']['p50']:>7.3f}s "
+                   f"{level['latency']['p99']:>7.3f}s {level['error_rate']:>7.2%} "
+                   f"{(str(lag['p99_ms']) + 'ms') if lag else 'n/a':>9}")
+            if args.stop_at_saturation and find_saturation(levels, args)["slo_breached_at"]:
+                break
+        if monitor:
+            monitor.stop()
+
+    from scripts.bench_stages import git_revision
+    return {
+        **git_revision(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "args": {k: v for k, v in vars(args).items() if k not in ["out", "command"]},
+        "stubs": stubs,
+        "levels": levels,
+        "saturation": find_saturation(levels, args),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve"])
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    parser.add_argument("--host", default="127.0.0.1", help="serve: bind address")
+    parser.add_argument("--port", type=int, default=8765, help="serve: port")
+    parser.add_argument("--mix", default="polling-heavy", help=f"{', '.join(MIXES)} or op=weight,...")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="concurrency steps")
+    parser.add_argument("--step-seconds", type=float, default=10)
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's requests")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--seed-jobs", type=int, default=8)
+    parser.add_argument("--upload-pages", type=int, default=2)
+    parser.add_argument("--upload-kind", default="text", choices=["text", "scanned"])
+    parser.add_argument("--document-pool", type=int, default=200, help="distinct upload documents")
+    parser.add_argument("--latency", action="append", default=[], metavar="PROVIDER=MEDIAN:P99")
+    parser.add_argument("--errors", action="append", default=[], metavar="PROVIDER=RATE")
+    parser.add_argument("--throttles", action="append", default=[], metavar="PROVIDER=RATE")
+    parser.add_argument("--scale", type=float, default=0.05, help="multiply every provider latency")
+    parser.add_argument("--jwt-secret", default=os.getenv("LOAD_JWT_SECRET", "bench-secret"))
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--slo-p99", type=float, default=1.0, help="seconds")
+    parser.add_argument("--slo-error-rate", type=float, default=0.01)
+    parser.add_argument("--slo-lag-ms", type=float, default=50)
+    parser.add_argument("--stop-at-saturation", action="store_true", help="stop at the first SLO breach")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own output")
+    parser.add_argument("--out", default="load_results")
+    args = parser.parse_args()
+    args.levels = [int(n) for n in args.levels.split(",")]
+    out_dir = os.path.abspath(args.out)
+    random.seed(0)
+
+    if args.command == "serve":
+        return serve(args)
+
+    stubs = prepare(args) if not args.url else {}
+
+    quiet = open(os.devnull, "w") if not args.verbose else None
+    with (contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext()):
+        result = asyncio.run(run(args, stubs))
+
+    saturation = result["saturation"]
+    report(f"\nMax {saturation['max_rps']} req/s at concurrency {saturation['max_rps_concurrency']}")
+    report(f"Throughput plateau at concurrency: {saturation['throughput_plateau_at'] or 'not reached'}")
+    breach = saturation["slo_breached_at"]
+    report(f"SLO breached at concurrency: "
+           f"{breach['concurrency'] if breach else 'not reached'}{' (' + '; '.join(breach['reasons']) + ')' if breach else ''}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(out_dir, f"{stamp}_{result['commit']}_{args.mix.replace(',', '_').replace('=', '')}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    report(f"Results: {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Versioned schema migrations (see app/core/migrations.py).
+
+Run from backend/:
+    python -m scripts.migrate          # apply pending versions
+    python -m scripts.migrate status   # show current/latest version
+"""
+import sys
+from app.core.database import engine, Base
+from app.core.migrations import migrate, current_version, LATEST_VERSION
+import app.models.job, app.models.page, app.models.user, app.models.batch, app.models.provider_state  # Register tables
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        print(f"Schema version: {current_version(engine)} (latest {LATEST_VERSION})")
+        return
+
+    print("Connecting to DB...")
+    applied = migrate(engine, Base)
+    print(f"Migration Complete. Applied {applied} version(s), now at {current_version(engine)}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+def migrate():
+    print("Connecting to DB...")
+    engine = create_engine(settings.DATABASE_URL)
+    
+    with engine.connect() as conn:
+        print("Running Page Versioning Migration...")
+        try:
+            conn.execute(text("ALTER TABLE pages ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now();"))
+            print("Added 'updated_at' to Pages.")
+            
+        except Exception as e:
+            print(f"Error: {e}")
+        
+        conn.commit()
+        print("Migration Complete.")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,28 @@
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+def migrate():
+    print("Connecting to DB...")
+    engine = create_engine(settings.DATABASE_URL)
+    
+    with engine.connect() as conn:
+        print("Running Async Render Migration...")
+        try:
+            conn.execute(text("ALTER TABLE pages ADD COLUMN IF NOT EXISTS prediction_id VARCHAR;"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pages_prediction_id ON pages (prediction_id);"))
+            print("Added 'prediction_id' to Pages.")
+            
+            conn.execute(text("ALTER TABLE pages ADD COLUMN IF NOT EXISTS prediction_submitted_at TIMESTAMPTZ;"))
+            print("Added 'prediction_submitted_at' to Pages.")
+            
+            conn.execute(text("ALTER TABLE pages ADD COLUMN IF NOT EXISTS system_attempts INTEGER DEFAULT 0;"))
+            print("Added 'system_attempts' to Pages.")
+            
+        except Exception as e:
+            print(f"Error: {e}")
+        
+        conn.commit()
+        print("Migration Complete.")
+
+if __name__ == "__main__":
+    migrate()
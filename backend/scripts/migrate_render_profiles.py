@@ -0,0 +1,25 @@
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+
+def migrate():
+    print("Connecting to DB...")
+    engine = create_engine(settings.DATABASE_URL)
+    
+    with engine.connect() as conn:
+        print("Running Render Profiles Migration...")
+        try:
+            conn.execute(text("ALTER TABLE pages ADD COLUMN IF NOT EXISTS render_profile VARCHAR;"))
+            print("Added 'render_profile' to Pages.")
+            
+            # Everything rendered before profiles existed was a final render
+            conn.execute(text("UPDATE pages SET render_profile = 'final' WHERE render_seed IS NOT NULL AND render_profile IS NULL;"))
+            print("Backfilled 'render_profile'.")
+            
+        except Exception as e:
+            print(f"Error: {e}")
+        
+        conn.commit()
+        print("Migration Complete.")
+
+if __name__ == "__main__":
+    migrate()
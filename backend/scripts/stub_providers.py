@@ -0,0 +1,279 @@
+"""
+In-process fakes for Google Vision, OpenAI, Replicate and Supabase Storage,
+for benchmarks and load tests. Nothing leaves the process.
+
+    from scripts.stub_providers import StubConfig, install
+    install(StubConfig.parse(["openai=2:6", "replicate_run=8:20"], errors=["vision=0.02"]))
+
+Each provider has a latency distribution (lognormal from median and p99,
+in seconds), an error rate (HTTP 500) and a throttle rate (HTTP 429 with
+Retry-After), so the limiter, circuit breaker and retries run for real.
+
+Providers:
+    vision         document_text_detection
+    openai         chat.completions.create (planner)
+    replicate      predictions.create / get (API round trip)
+    replicate_run  time from prediction create to completion
+    supabase       storage upload (and the Replicate image download)
+    poppler        rasterization; only stubbed when pdftoppm is missing
+"""
+import io
+import json
+import math
+import random
+import shutil
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from PIL import Image
+
+DEFAULT_LATENCY = {
+    "vision": (0.6, 2.0),
+    "openai": (6.0, 20.0),
+    "replicate": (0.3, 1.0),
+    "replicate_run": (8.0, 20.0),
+    "supabase": (0.2, 0.8),
+    "poppler": (0.15, 0.4),
+}
+
+class Latency:
+    def __init__(self, median: float, p99: float):
+        self.median = median
+        self.sigma = math.log(max(p99, median) / median) / 2.326 if median > 0 else 0.0
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return self.median * math.exp(self.sigma * random.gauss(0, 1))
+
+class ProviderProfile:
+    def __init__(self, median: float, p99: float, error_rate: float = 0.0, throttle_rate: float = 0.0):
+        self.latency = Latency(median, p99)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self.errors = 0
+
+    def describe(self) -> dict:
+        return {
+            "median": self.latency.median,
+            "sigma": round(self.latency.sigma, 3),
+            "error_rate": self.error_rate,
+            "throttle_rate": self.throttle_rate,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+class StubConfig:
+    def __init__(self, profiles: dict, scale: float = 1.0, retry_after: float = 1.0):
+        self.profiles = profiles
+        self.scale = scale
+        self.retry_after = retry_after
+
+    @staticmethod
+    def parse(latency=(), errors=(), throttles=(), scale: float = 1.0, retry_after: float = 1.0) -> "StubConfig":
+        """
+        latency: ["openai=2:6", ...] median:p99 seconds
+        errors / throttles: ["vision=0.05", ...] fraction of calls
+        """
+        medians = dict(DEFAULT_LATENCY)
+        for spec in latency:
+            name, _, value = spec.partition("=")
+            median, _, p99 = value.partition(":")
+            medians[name] = (float(median), float(p99 or median))
+        error_rates = {k: float(v) for k, _, v in (s.partition("=") for s in errors)}
+        throttle_rates = {k: float(v) for k, _, v in (s.partition("=") for s in throttles)}
+        for name in list(error_rates) + list(throttle_rates) + list(medians):
+            if name not in DEFAULT_LATENCY:
+                raise ValueError(f"Unknown provider: {name}")
+        profiles = {
+            name: ProviderProfile(
+                median * scale, p99 * scale,
+                error_rates.get(name, 0.0), throttle_rates.get(name, 0.0)
+            )
+            for name, (median, p99) in medians.items()
+        }
+        return StubConfig(profiles, scale, retry_after * scale)
+
+    def describe(self) -> dict:
+        return {
+            "scale": self.scale,
+            "providers": {name: p.describe() for name, p in self.profiles.items()},
+        }
+
+class StubProviderError(Exception):
+    """
+    Looks like an SDK error to ratelimit._classify_error.
+    """
+
+    def __init__(self, provider: str, status: int, retry_after: float = None):
+        super().__init__(f"stub {provider} error {status}")
+        self.status_code = status
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status, headers=headers)
+
+_config = StubConfig.parse()
+
+def _call(provider: str, sleep: bool = True):
+    profile = _config.profiles[provider]
+    profile.calls += 1
+    if sleep:
+        time.sleep(profile.latency.sample())
+    roll = random.random()
+    if roll < profile.throttle_rate:
+        profile.errors += 1
+        raise StubProviderError(provider, 429, _config.retry_after)
+    if roll < profile.throttle_rate + profile.error_rate:
+        profile.errors += 1
+        raise StubProviderError(provider, 500)
+
+def _png(width: int = 64, height: int = 64) -> bytes:
+    buf = io.BytesIO()
+    Image.new("L", (width, height), 255).save(buf, format="PNG")
+    return buf.getvalue()
+
+# --- Google Vision ---
+
+class FakeVisionClient:
+    def document_text_detection(self, image=None):
+        _call("vision")
+        size = len(getattr(image, "content", b"") or b"")
+        return SimpleNamespace(
+            error=SimpleNamespace(message=""),
+            full_text_annotation=SimpleNamespace(text=f"Stub OCR text ({size} bytes)\n" * 20)
+        )
+
+# --- OpenAI ---
+
+class FakeOpenAI:
+    def __init__(self, api_key=None, max_retries=None, **kwargs):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, **kwargs):
+        _call("openai")
+        user_content = messages[-1]["content"]
+        # Source pages are the image parts minus the trailing handwriting reference
+        sources = max(sum(1 for part in user_content if part.get("type") == "image_url") - 1, 1)
+        pages = [{"page": n, "content": f"Stub planned page {n}\n" * 15} for n in range(1, sources + 1)]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps({"pages": pages})))],
+            usage=SimpleNamespace(prompt_tokens=800 * sources + 200, completion_tokens=300 * sources)
+        )
+
+# --- Replicate ---
+
+class FakePredictions:
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def create(self, model=None, input=None, **kwargs):
+        _call("replicate")
+        prediction_id = uuid.uuid4().hex
+        with self.lock:
+            self.items[prediction_id] = {
+                "done_at": time.time() + _config.profiles["replicate_run"].latency.sample(),
+                "failed": None,
+                "canceled": False,
+            }
+        return SimpleNamespace(id=prediction_id, status="starting")
+
+    def get(self, prediction_id: str):
+        _call("replicate")
+        with self.lock:
+            item = self.items.get(prediction_id)
+        if item is None:
+            raise StubProviderError("replicate", 404)
+        if item["canceled"]:
+            return SimpleNamespace(id=prediction_id, status="canceled", output=None, error=None)
+        if time.time() < item["done_at"]:
+            return SimpleNamespace(id=prediction_id, status="processing", output=None, error=None)
+        if item["failed"] is None:
+            run = _config.profiles["replicate_run"]
+            item["failed"] = random.random() < run.error_rate
+            run.calls += 1
+            run.errors += int(item["failed"])
+        if item["failed"]:
+            return SimpleNamespace(id=prediction_id, status="failed", output=None, error="stub failure")
+        return SimpleNamespace(
+            id=prediction_id, status="succeeded",
+            output=[f"https://stub.replicate.delivery/{prediction_id}.png"], error=None
+        )
+
+    def cancel(self, prediction_id: str):
+        _call("replicate")
+        with self.lock:
+            if prediction_id in self.items:
+                self.items[prediction_id]["canceled"] = True
+        return SimpleNamespace(id=prediction_id, status="canceled")
+
+# --- Supabase Storage (and image downloads) ---
+
+class FakeHttpx:
+    """
+    Stands in for the module-level httpx.get / httpx.post used by the renderer.
+    """
+    PNG = None
+
+    @staticmethod
+    def get(url, **kwargs):
+        _call("supabase")
+        FakeHttpx.PNG = FakeHttpx.PNG or _png()
+        return SimpleNamespace(status_code=200, content=FakeHttpx.PNG, text="", raise_for_status=lambda: None)
+
+    @staticmethod
+    def post(url, content=None, headers=None, **kwargs):
+        _call("supabase")
+        return SimpleNamespace(status_code=200, content=b"{}", text="{}", raise_for_status=lambda: None)
+
+# --- Rasterization (only without poppler) ---
+
+def _fake_pages(pdf_bytes: bytes, first_page: int = None, last_page: int = None) -> list:
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    first = (first_page or 1) - 1
+    last = last_page or len(reader.pages)
+    images = []
+    for page in reader.pages[first:last]:
+        _call("poppler")
+        try:
+            images.append(page.images[0].image.convert("RGB"))
+        except Exception:
+            images.append(Image.new("RGB", (827, 1169), "white"))
+    return images
+
+def _fake_convert_from_bytes(pdf_bytes, first_page=None, last_page=None, **kwargs):
+    return _fake_pages(pdf_bytes, first_page, last_page)
+
+def _fake_convert_from_path(path, first_page=None, last_page=None, **kwargs):
+    with open(path, "rb") as f:
+        return _fake_pages(f.read(), first_page, last_page)
+
+def install(config: StubConfig) -> dict:
+    """
+    Point the app's provider clients at the fakes. Import after settings
+    are in place (the app modules read them at import).
+    Returns what was stubbed.
+    """
+    global _config
+    _config = config
+
+    # The services import the SDKs where they are used: patch the SDK modules
+    import openai
+    import pdf2image
+    import replicate
+    from google.cloud import vision
+    from app.services import renderer
+
+    vision.ImageAnnotatorClient = FakeVisionClient
+    openai.OpenAI = FakeOpenAI
+    replicate.predictions = FakePredictions()
+    renderer.httpx = FakeHttpx
+
+    stubbed = ["vision", "openai", "replicate", "supabase"]
+    if not shutil.which("pdftoppm"):
+        pdf2image.convert_from_bytes = _fake_convert_from_bytes
+        pdf2image.convert_from_path = _fake_convert_from_path
+        stubbed.append("poppler")
+    return {"stubbed": stubbed}
@@ -0,0 +1,54 @@
+"""
+Synthetic input documents for benchmarks (same reportlab approach as
+create_test_pdf.py, but in memory and any number of pages).
+
+    text_pdf(pages)     PDF with a text layer   -> segregated as text_pdf
+    scanned_pdf(pages)  image-only PDF           -> segregated as scanned_pdf
+"""
+import io
+import random
+from PIL import Image, ImageDraw
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+WORDS = (
+    "the quick brown fox jumps over the lazy dog while handwriting engines "
+    "lay out every paragraph across margins lines and pages of notes"
+).split()
+
+def paragraph_lines(page_number: int, lines: int = 30, seed: int = 0) -> list:
+    rng = random.Random(seed * 100003 + page_number)
+    out = [f"Page {page_number}"]
+    for _ in range(lines - 1):
+        out.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))))
+    return out
+
+def text_pdf(pages: int, seed: int = 0) -> bytes:
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for n in range(1, pages + 1):
+        y = 800
+        for line in paragraph_lines(n, seed=seed):
+            c.drawString(60, y, line)
+            y -= 24
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+def scanned_pdf(pages: int, seed: int = 0, dpi: int = 100) -> bytes:
+    """
+    Each page is a grayscale bitmap of text: no text layer, like a scan.
+    """
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    images = []
+    for n in range(1, pages + 1):
+        img = Image.new("L", (width, height), 250)
+        draw = ImageDraw.Draw(img)
+        y = dpi // 2
+        for line in paragraph_lines(n, seed=seed):
+            draw.text((dpi // 2, y), line, fill=20)
+            y += dpi // 3
+        images.append(img)
+    buf = io.BytesIO()
+    images[0].save(buf, format="PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    return buf.getvalue()
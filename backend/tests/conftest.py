@@ -0,0 +1,72 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+import uvicorn
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Settings are read at import: configure before anything under app/ is imported
+WORKDIR = tempfile.mkdtemp(prefix="swrite-tests-")
+FAKE_REPLICATE_PORT = _free_port()
+BACKEND_PORT = _free_port()
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(WORKDIR, 'tests.db')}",
+    "SUPABASE_URL": "https://storage.test",
+    "SUPABASE_KEY": "test",
+    "SUPABASE_JWT_SECRET": "test-secret",
+    "REPLICATE_API_TOKEN": "fake",
+    "REPLICATE_BASE_URL": f"http://127.0.0.1:{FAKE_REPLICATE_PORT}",
+    "REPLICATE_WEBHOOK_URL": "",
+    "REPLICATE_WEBHOOK_SECRET": "",
+    "TRACE_EXPORTER": "",
+    "FAKE_REPLICATE_DELAY": "0.2",
+    "PAGE_WRITE_FLUSH_MS": "50",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"Server on port {port} did not start")
+        time.sleep(0.05)
+    return server
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    The test database, migrated to the latest version.
+    """
+    import app.main  # Register every model
+    from app.core.database import engine, Base
+    from app.core.migrations import migrate
+
+    migrate(engine, Base)
+    return engine
+
+@pytest.fixture(scope="session")
+def servers(database):
+    """
+    The fake Replicate (scripts/fake_replicate.py) and the backend, each
+    on a local port, so predictions and webhooks go over real HTTP.
+    """
+    from app.main import app
+    from scripts import fake_replicate
+
+    fake = _serve(fake_replicate.app, FAKE_REPLICATE_PORT)
+    backend = _serve(app, BACKEND_PORT)
+    yield {
+        "replicate": f"http://127.0.0.1:{FAKE_REPLICATE_PORT}",
+        "backend": f"http://127.0.0.1:{BACKEND_PORT}",
+    }
+    fake.should_exit = backend.should_exit = True
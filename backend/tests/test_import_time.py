@@ -0,0 +1,61 @@
+"""
+Import-time budget for app.main (worker cold start): importing it in a
+fresh interpreter stays under IMPORT_BUDGET_SECONDS (median of several
+runs), loads no provider SDKs / imaging modules and touches no database.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.0"))
+RUNS = 5
+
+# Loaded lazily by the services that call them
+HEAVY_MODULES = [
+    "openai",
+    "google.cloud.vision",
+    "replicate",
+    "pdf2image",
+    "pypdf",
+    "cv2",
+    "numpy",
+    "requests",
+]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _probe() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    # An unreachable database proves nothing connects at import
+    env["DATABASE_URL"] = "sqlite:////nonexistent-import-check/swrite.db"
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, f"importing app.main failed:\n{result.stderr[-2000:]}"
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+@pytest.fixture(scope="module")
+def probes():
+    return [_probe() for _ in range(RUNS)]
+
+def test_import_within_budget(probes):
+    median = statistics.median(p["seconds"] for p in probes)
+    assert median <= BUDGET_SECONDS, f"import app.main took {median:.3f}s, budget {BUDGET_SECONDS:.2f}s"
+
+@pytest.mark.parametrize("name", HEAVY_MODULES)
+def test_heavy_module_not_imported(probes, name):
+    loaded = [m for m in probes[0]["modules"] if m == name or m.startswith(name + ".")]
+    assert not loaded, f"{name} is imported at startup (import it where it is used)"
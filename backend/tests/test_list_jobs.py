@@ -0,0 +1,47 @@
+"""
+GET /jobs keyset pagination: following next_cursor visits every job once.
+"""
+import time
+import uuid
+
+import httpx
+from jose import jwt
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job import Job
+from app.models.user import User
+
+def _token(user_id: str) -> str:
+    claims = {"sub": user_id, "aud": "authenticated", "exp": time.time() + 3600}
+    return jwt.encode(claims, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+def test_cursor_walks_every_job_once(servers):
+    user_id = str(uuid.uuid4())
+    job_ids = [f"j{i}-{uuid.uuid4()}" for i in range(7)]
+    db = SessionLocal()
+    try:
+        db.add(User(id=user_id, email=f"{user_id}@test"))
+        db.flush()
+        # One commit: several jobs share a created_at second
+        db.add_all(Job(id=job_id, user_id=user_id, status="planned", input_type="text_pdf") for job_id in job_ids)
+        db.commit()
+    finally:
+        db.close()
+
+    seen = []
+    cursor = None
+    headers = {"Authorization": f"Bearer {_token(user_id)}"}
+    for _ in range(len(job_ids) + 1):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = httpx.get(f"{servers['backend']}/jobs", params=params, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        seen += [job["job_id"] for job in body["jobs"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert cursor is None
+    assert sorted(seen) == sorted(job_ids)
+    assert len(seen) == len(set(seen))
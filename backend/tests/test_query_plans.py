@@ -0,0 +1,74 @@
+"""
+Query-plan regression tests for the hot queries: EXPLAIN each one against
+the test database and require the index it was built for.
+"""
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select, func, text, tuple_
+
+from app.models.job import Job
+from app.models.page import Page
+
+JOB = "00000000-0000-0000-0000-000000000000"
+USER = "user"
+
+# (name, statement, acceptable indexes)
+HOT_QUERIES = [
+    ("status: job lookup",
+     select(Job.id, Job.status).where(Job.id == JOB, Job.user_id == USER),
+     ["pk", "ix_jobs_id", "sqlite_autoindex_jobs", "jobs_pkey"]),
+    ("status: etag aggregate",
+     select(Page.status, func.count(Page.id), func.max(Page.updated_at))
+     .where(Page.job_id == JOB).group_by(Page.status),
+     ["ix_pages_job_status_updated"]),
+    ("status: page list",
+     select(Page.page_number, Page.status).where(Page.job_id == JOB).order_by(Page.page_number),
+     ["ix_pages_job_status_updated", "ix_pages_job_type_number"]),
+    ("render/export: handwritten pages in order",
+     select(Page.id).where(Page.job_id == JOB, Page.page_type == "handwritten").order_by(Page.page_number),
+     ["ix_pages_job_type_number"]),
+    ("render: unrendered handwritten pages",
+     select(Page.id).where(
+         Page.job_id == JOB,
+         Page.page_type == "handwritten",
+         Page.status.notin_(["rendered", "approved"])
+     ).order_by(Page.page_number),
+     ["ix_pages_job_unrendered", "ix_pages_job_type_number"]),
+    ("approve/retry: page lookup",
+     select(Page.id).where(Page.job_id == JOB, Page.page_type == "handwritten", Page.page_number == 1),
+     ["ix_pages_job_type_number"]),
+    ("webhook: prediction lookup",
+     select(Page.id).where(Page.prediction_id == "prediction"),
+     ["ix_pages_prediction_id"]),
+    ("poller: stale in-flight predictions",
+     select(Page.id).where(
+         Page.status == "rendering",
+         Page.prediction_id.isnot(None),
+         Page.prediction_submitted_at < datetime(2000, 1, 1, tzinfo=timezone.utc)
+     ),
+     ["ix_pages_rendering_submitted"]),
+    ("list jobs: keyset page",
+     select(Job.id).where(
+         Job.user_id == USER,
+         tuple_(Job.created_at, Job.id) < tuple_(datetime(2000, 1, 1), JOB)
+     ).order_by(Job.created_at.desc(), Job.id.desc()).limit(21),
+     ["ix_jobs_user_created"]),
+]
+
+def _explain(engine, statement) -> str:
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+            return "\n".join(row[-1] for row in rows)
+        # Tiny tables make seq scans "cheapest"; we want to see index choice
+        conn.execute(text("SET enable_seqscan = off"))
+        rows = conn.execute(text(f"EXPLAIN {sql}")).all()
+        return "\n".join(row[0] for row in rows)
+
+@pytest.mark.parametrize("statement,indexes", [q[1:] for q in HOT_QUERIES], ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_index(database, statement, indexes):
+    plan = _explain(database, statement)
+    uses_pk = "pk" in indexes and ("PRIMARY KEY" in plan or "_pkey" in plan)
+    assert uses_pk or any(index in plan for index in indexes), f"expected one of {indexes}:\n{plan}"
@@ -0,0 +1,139 @@
+"""
+Render path against the fake Replicate server: submit -> webhook or poll
+-> complete, and system retries of failed predictions.
+"""
+import time
+import uuid
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.job import Job
+from app.models.page import Page
+from app.models.user import User
+from app.services.page_writes import page_writes
+from app.services.renderer import HandwritingRenderer, MAX_SYSTEM_RETRIES
+from scripts import fake_replicate
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    """
+    Supabase Storage accepts every upload; image downloads go to the fake.
+    """
+    post = httpx.post
+
+    def fake_post(url, *args, **kwargs):
+        if url.startswith(settings.SUPABASE_URL):
+            return httpx.Response(200, json={"Key": url})
+        return post(url, *args, **kwargs)
+
+    monkeypatch.setattr(httpx, "post", fake_post)
+
+@pytest.fixture
+def page_id(servers):
+    db = SessionLocal()
+    try:
+        user_id = str(uuid.uuid4())
+        job_id = str(uuid.uuid4())
+        page_id = str(uuid.uuid4())
+        db.add(User(id=user_id, email=f"{user_id}@test"))
+        db.flush()
+        db.add(Job(id=job_id, user_id=user_id, status="planned", input_type="text_pdf", pages_pending=1))
+        db.flush()
+        db.add(Page(
+            id=page_id, job_id=job_id, user_id=user_id, page_number=1, page_type="handwritten",
+            content="The quick brown fox", char_count=19, status="planned"
+        ))
+        db.commit()
+        return page_id
+    finally:
+        db.close()
+
+def _render(page_id: str):
+    db = SessionLocal()
+    try:
+        page = db.get(Page, page_id)
+        HandwritingRenderer.render_page(page, db, profile="draft")
+    finally:
+        db.close()
+    page_writes.flush()
+
+def _load(page_id: str) -> Page:
+    db = SessionLocal()
+    try:
+        page = db.get(Page, page_id)
+        page.job  # Loaded while the session is open
+        return page
+    finally:
+        db.close()
+
+def _wait_for(page_id: str, statuses, timeout: float = 10.0) -> Page:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        page_writes.flush()
+        page = _load(page_id)
+        if page.status in statuses:
+            return page
+        time.sleep(0.1)
+    raise AssertionError(f"Page still {page.status}, expected one of {statuses}")
+
+def _predictions_for(prediction_ids) -> list:
+    return [fake_replicate.PREDICTIONS[p] for p in prediction_ids]
+
+def test_webhook_completes_prediction(servers, page_id, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICATE_WEBHOOK_URL", f"{servers['backend']}/webhooks/replicate")
+    _render(page_id)
+    page = _load(page_id)
+    assert page.status == "rendering"
+    prediction_id = page.prediction_id
+    assert fake_replicate.PREDICTIONS[prediction_id]["_webhook"] == settings.REPLICATE_WEBHOOK_URL
+
+    page = _wait_for(page_id, ["rendered"])
+    assert page.image_url.endswith(f"/{page.job_id}/page_1.png")
+    assert page.prediction_id == prediction_id
+    assert (page.job.status, page.job.pages_rendered, page.job.pages_rendering) == ("rendered", 1, 0)
+
+def test_poll_completes_prediction(servers, page_id, monkeypatch):
+    monkeypatch.setattr(fake_replicate, "DELAY", 0.1)
+    _render(page_id)
+    assert _load(page_id).status == "rendering"
+
+    deadline = time.time() + 10
+    while _load(page_id).status == "rendering" and time.time() < deadline:
+        time.sleep(0.2)
+        db = SessionLocal()
+        try:
+            HandwritingRenderer.poll_pending(db)
+        finally:
+            db.close()
+        page_writes.flush()
+    assert _load(page_id).status == "rendered"
+
+def test_failed_prediction_is_retried_then_fails(servers, page_id, monkeypatch):
+    monkeypatch.setattr(settings, "REPLICATE_WEBHOOK_URL", f"{servers['backend']}/webhooks/replicate")
+    monkeypatch.setattr(fake_replicate, "FAIL_RATE", 1.0)
+    before = set(fake_replicate.PREDICTIONS)
+    _render(page_id)
+
+    page = _wait_for(page_id, ["failed_system"])
+    created = set(fake_replicate.PREDICTIONS) - before
+    assert len(created) == MAX_SYSTEM_RETRIES
+    # System retries reuse the locked seed
+    seeds = {p["input"]["seed"] for p in _predictions_for(created)}
+    assert seeds == {page.render_seed}
+    assert page.system_attempts == MAX_SYSTEM_RETRIES
+    assert (page.job.pages_failed, page.job.pages_rendering) == (1, 0)
+
+def test_spent_retry_budget_reports_prediction_error(servers, page_id):
+    db = SessionLocal()
+    try:
+        page = db.get(Page, page_id)
+        page.system_attempts = MAX_SYSTEM_RETRIES
+        with pytest.raises(Exception, match="failed \\(system\\): Fake failure"):
+            HandwritingRenderer._submit_prediction(page, db, last_error="Fake failure")
+        assert page.status == "failed_system"
+    finally:
+        db.close()
+    page_writes.flush()